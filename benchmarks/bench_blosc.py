@@ -0,0 +1,122 @@
+"""
+Compare blosc settings (compressor, level and shuffle) on data like what
+ndio moves around: uint8 EM images, and uint32 and uint64 annotations.
+For each kind of data, report the compression ratio and speeds of every
+combination, and pick the one that would move the data fastest over a
+network of `--bandwidth` MB/s, counting the time to compress, send and
+decompress it.
+
+Run with `python benchmarks/bench_blosc.py --help` for the options.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import itertools
+import timeit
+
+import blosc
+import numpy
+
+from ndio.convert import blosc as ndblosc
+
+SHUFFLES = {
+    'none': blosc.NOSHUFFLE,
+    'byte': blosc.SHUFFLE,
+    'bit': getattr(blosc, 'BITSHUFFLE', None)
+}
+
+
+def em_image(shape, rng):
+    """
+    Smooth structure plus shot noise, like an EM image.
+    """
+    z, y, x = numpy.indices(shape)
+    smooth = (numpy.sin(x / 17.0) + numpy.cos(y / 23.0) +
+              numpy.sin((x + y + 3 * z) / 41.0))
+    image = 128 + 30 * smooth + rng.normal(0, 3, size=shape)
+    return numpy.clip(image, 0, 255).astype(numpy.uint8)
+
+
+def annotation(shape, rng, dtype, fill=0.2):
+    """
+    Blobs of a few hundred labels on a mostly empty background, like a
+    segmentation or a sparse annotation.
+    """
+    labels = numpy.zeros(shape, dtype=dtype)
+    z, y, x = [numpy.arange(n)[:, None, None].swapaxes(0, i)
+               for i, n in enumerate(shape)]
+    target = fill * labels.size
+    label = 1
+    while numpy.count_nonzero(labels) < target and label < 1000:
+        c = [rng.randint(0, n) for n in shape]
+        r = rng.randint(4, max(shape) // 4)
+        blob = ((z - c[0]) * 4) ** 2 + (y - c[1]) ** 2 + (x - c[2]) ** 2 < \
+            r * r
+        labels[blob] = label + (2 ** 40 if dtype == numpy.uint64 else 0)
+        label += 1
+    return labels
+
+
+def _measure(array, options, repeat):
+    packed = ndblosc.from_array(array, **options)
+    pack = min(timeit.repeat(lambda: ndblosc.from_array(array, **options),
+                             number=1, repeat=repeat))
+    unpack = min(timeit.repeat(lambda: ndblosc.to_array(packed),
+                               number=1, repeat=repeat))
+    return array.nbytes / len(packed), array.nbytes / pack / 1e6, \
+        array.nbytes / unpack / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shape', default='16,512,512',
+                        help="zyx shape of the test blocks")
+    parser.add_argument('--cnames', default=','.join(blosc.cnames))
+    parser.add_argument('--clevels', default='1,5,9')
+    parser.add_argument('--shuffles', default='none,byte,bit')
+    parser.add_argument('--nthreads', type=int, default=None,
+                        help="blosc threads (default: blosc's own)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--bandwidth', type=float, default=100,
+                        help="network speed to pick settings for, in MB/s")
+    args = parser.parse_args()
+
+    if args.nthreads:
+        ndblosc.set_options(nthreads=args.nthreads)
+    shape = tuple(int(s) for s in args.shape.split(','))
+    rng = numpy.random.RandomState(0)
+    datasets = [
+        ('uint8 EM', em_image(shape, rng)),
+        ('uint32 labels', annotation(shape, rng, numpy.uint32)),
+        ('uint64 labels', annotation(shape, rng, numpy.uint64)),
+    ]
+    shuffles = [s for s in args.shuffles.split(',')
+                if SHUFFLES.get(s) is not None]
+
+    for name, array in datasets:
+        print("{} {} ({:.1f} MB):".format(name, shape, array.nbytes / 1e6))
+        print("  {:>8} {:>6} {:>7} {:>8} {:>12} {:>12} {:>12}".format(
+            'cname', 'clevel', 'shuffle', 'ratio', 'pack MB/s',
+            'unpack MB/s', 'total MB/s'))
+        results = []
+        for cname, clevel, shuffle in itertools.product(
+                args.cnames.split(','),
+                [int(c) for c in args.clevels.split(',')], shuffles):
+            options = {'cname': cname, 'clevel': clevel,
+                       'shuffle': SHUFFLES[shuffle]}
+            ratio, pack, unpack = _measure(array, options, args.repeat)
+            # Pack, send and unpack one megabyte, one after the other.
+            total = 1 / (1 / pack + 1 / (ratio * args.bandwidth) +
+                         1 / unpack)
+            results.append((total, ratio, cname, clevel, shuffle))
+            print("  {:>8} {:>6} {:>7} {:>8.2f} {:>12.1f} {:>12.1f} "
+                  "{:>12.1f}".format(cname, clevel, shuffle, ratio, pack,
+                                     unpack, total))
+
+        pick = max(results)
+        print("  pick: cname={}, clevel={}, shuffle={} ({:.1f} MB/s, "
+              "ratio {:.2f})\n".format(pick[2], pick[3], pick[4], pick[0],
+                                       pick[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare the cost of decoding cutout responses: HDF5 through a temporary file
+(the old Python 3 path), HDF5 in memory, and blosc.
+
+Run with `python benchmarks/bench_decode.py`.
+"""
+from __future__ import absolute_import, print_function
+import tempfile
+import timeit
+from io import BytesIO
+
+import blosc
+import h5py
+import numpy
+
+from ndio.remote import cutout_codecs
+
+SHAPES = [(16, 256, 256), (16, 1024, 1024), (64, 1024, 1024)]
+CHANNEL = 'image'
+
+
+def encode_hdf5(array):
+    buf = BytesIO()
+    with h5py.File(buf, 'w') as h5file:
+        h5file.create_group(CHANNEL).create_dataset('CUTOUT', data=array)
+    return buf.getvalue()
+
+
+def decode_hdf5_tempfile(content):
+    with tempfile.NamedTemporaryFile() as tmpfile:
+        tmpfile.write(content)
+        tmpfile.seek(0)
+        with h5py.File(tmpfile.name, 'r') as h5file:
+            return h5file.get(CHANNEL).get('CUTOUT')[:]
+
+
+def main(repeat=5):
+    rng = numpy.random.RandomState(0)
+    for shape in SHAPES:
+        # Low-entropy data, so that blosc has something to compress.
+        array = rng.randint(0, 4, size=shape).astype(numpy.uint8) + 100
+        hdf5 = encode_hdf5(array)
+        packed = blosc.pack_array(array[numpy.newaxis])
+        cases = [
+            ('hdf5 via tempfile', lambda: decode_hdf5_tempfile(hdf5),
+             len(hdf5)),
+            ('hdf5 in memory',
+             lambda: cutout_codecs.decode_hdf5(hdf5, CHANNEL), len(hdf5)),
+            ('blosc', lambda: cutout_codecs.decode_blosc(packed),
+             len(packed)),
+        ]
+        print("{} ({:.1f} MB):".format(shape, array.nbytes / 1e6))
+        for name, fn, nbytes in cases:
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+            print("  {:>18}: {:8.2f} ms, {:8.1f} MB on the wire".format(
+                name, 1000 * best, nbytes / 1e6))
+
+
+if __name__ == '__main__':
+    main()
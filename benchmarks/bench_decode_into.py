@@ -0,0 +1,134 @@
+"""
+Compare the two ways of decoding blosc cutout blocks into a larger volume:
+`decode_blosc` followed by a copy into the block's slab (how blocks used to
+be assembled), and `decode_blosc_into`, which decodes straight into the
+slab. For each, report the decode speed and the memory allocated on top of
+the volume itself, as a multiple of one block.
+
+Blocks are encoded the way the server encodes them: pickled by Python 2
+(`--format py2`, the default), or by this Python (`--format py3`).
+
+Run with `python benchmarks/bench_decode_into.py --help` for the options.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import struct
+import time
+
+import blosc
+import numpy
+
+from ndio.remote import cutout_codecs
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 can't measure the memory of one piece of code.
+    tracemalloc = None
+
+
+def _py2_pickle(array):
+    """
+    Pickle an array the way Python 2 does, with protocol 2, so that its
+    data is a BINSTRING that Python 3 has to read as latin1.
+    """
+    dtype = array.dtype.str
+    dims = b''.join(b'J' + struct.pack('<i', n) for n in array.shape)
+    data = array.tobytes()
+    return b''.join([
+        b'\x80\x02cnumpy.core.multiarray\n_reconstruct\nq\x01',
+        b'cnumpy\nndarray\nq\x02K\x00\x85U\x01b\x87Rq\x03',
+        b'(K\x01(', dims, b'tcnumpy\ndtype\nq\x04',
+        b'U', struct.pack('<B', len(dtype) - 1), dtype[1:].encode('ascii'),
+        b'K\x00K\x01\x87Rq\x05(K\x03U\x01', dtype[:1].encode('ascii'),
+        b'NNNJ\xff\xff\xff\xffJ\xff\xff\xff\xffK\x00tb',
+        b'\x89T', struct.pack('<i', len(data)), data, b'tb.'
+    ])
+
+
+def _blocks(shape, block, dtype, fmt):
+    # Smooth, noisy data, which compresses about as well as real images.
+    rng = numpy.random.RandomState(0)
+    z, y, x = numpy.indices(block)
+    payloads = []
+    for k in range(0, shape[0], block[0]):
+        for j in range(0, shape[1], block[1]):
+            for i in range(0, shape[2], block[2]):
+                data = ((x + 2 * y + 3 * z + i + j + k) % 200 +
+                        rng.randint(0, 32, size=block)).astype(dtype)
+                data = data[numpy.newaxis]
+                if fmt == 'py2':
+                    payload = blosc.compress(_py2_pickle(data), typesize=1)
+                else:
+                    payload = blosc.pack_array(data)
+                index = (slice(k, k + block[0]), slice(j, j + block[1]),
+                         slice(i, i + block[2]))
+                payloads.append((index, payload))
+    return payloads
+
+
+def _unpack(payload, out):
+    out[...] = cutout_codecs.decode_blosc(payload)
+
+
+def _into(payload, out):
+    cutout_codecs.decode_blosc_into(payload, out)
+
+
+def _run(method, payloads, shape, dtype, repeat):
+    vol = numpy.zeros(shape, dtype=dtype)
+    # Once untimed, to set up any buffers that are kept between blocks.
+    for index, payload in payloads:
+        method(payload, vol[index])
+
+    start = time.time()
+    for _ in range(repeat):
+        for index, payload in payloads:
+            method(payload, vol[index])
+    elapsed = time.time() - start
+
+    if tracemalloc is None:
+        return vol, elapsed, float('nan')
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for index, payload in payloads:
+        method(payload, vol[index])
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return vol, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shape', default='64,1024,1024',
+                        help="zyx shape of the volume")
+    parser.add_argument('--block', default='16,512,512',
+                        help="zyx shape of the blocks")
+    parser.add_argument('--dtypes', default='uint8,uint32')
+    parser.add_argument('--format', default='py2', choices=['py2', 'py3'],
+                        help="how the server pickled the blocks")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    shape = tuple(int(s) for s in args.shape.split(','))
+    block = tuple(int(s) for s in args.block.split(','))
+
+    print("{:>7} {:>7} {:>10} {:>16}".format(
+        'dtype', 'method', 'MB/s', 'peak / block'))
+    for dtype in args.dtypes.split(','):
+        payloads = _blocks(shape, block, dtype, args.format)
+        block_bytes = numpy.prod(block) * numpy.dtype(dtype).itemsize
+        results = {}
+        for name, method in [('unpack', _unpack), ('into', _into)]:
+            vol, elapsed, peak = _run(method, payloads, shape, dtype,
+                                      args.repeat)
+            results[name] = vol
+            print("{:>7} {:>7} {:>10.1f} {:>16.2f}".format(
+                dtype, name,
+                vol.nbytes * args.repeat / elapsed / 1e6,
+                peak / block_bytes))
+        assert (results['unpack'] == results['into']).all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare the per-request latency of one-off `requests.get` calls against the
+pooled session that `ndio.remote.remote_utils` shares between remotes.
+
+Requests go to a local `ndio.testing.FakeNDStore`, so the numbers measure
+connection setup and client overhead, not the network.
+
+Run with `python benchmarks/bench_sessions.py [n_requests]`.
+"""
+from __future__ import absolute_import, print_function
+import sys
+import time
+
+import numpy
+import requests
+
+from ndio.remote.remote_utils import remote_utils
+from ndio.testing import FakeNDStore
+
+
+def _timed(get, url, n):
+    times = []
+    for _ in range(n):
+        start = time.time()
+        get(url)
+        times.append(time.time() - start)
+    times.sort()
+    return times
+
+
+def _report(name, times):
+    print("{:>24}: mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms".format(
+        name,
+        1000 * sum(times) / len(times),
+        1000 * times[len(times) // 2],
+        1000 * times[int(len(times) * 0.99)]))
+
+
+def main(n=500):
+    with FakeNDStore() as server:
+        server.add_channel('token', 'image',
+                           numpy.zeros((64, 64, 16), numpy.uint8))
+        url = 'http://{}/nd/sd/token/info/'.format(server.hostname)
+        ru = remote_utils('placeholder')
+        _report('requests.get', _timed(requests.get, url, n))
+        _report('remote_utils (pooled)', _timed(ru.get_url, url, n))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
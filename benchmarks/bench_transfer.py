@@ -0,0 +1,172 @@
+"""
+Measure end-to-end `get_cutout` and `post_cutout` performance against a
+local `ndio.testing.FakeNDStore`: throughput, per-call latency percentiles
+and the client's peak memory, across cutout sizes, download formats and
+numbers of workers.
+
+The server runs in its own process, so that its work and its memory don't
+count against the client. Give it some `--latency` and `--bandwidth` to
+look more like a real network. Peak memory is measured with tracemalloc,
+which slows the client down; pass `--no-memory` for timings alone.
+
+Run with `python benchmarks/bench_transfer.py --help` for the options.
+"""
+from __future__ import absolute_import, division, print_function
+import argparse
+import itertools
+import multiprocessing
+import time
+
+import numpy
+
+from ndio.remote.neurodata import neurodata
+from ndio.testing import FakeNDStore
+
+TOKEN = 'bench'
+CHANNEL = 'image'
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 can only report the peak of the whole process, ever.
+    tracemalloc = None
+    import resource
+
+
+def _volume(shape):
+    # Smooth, noisy data compresses about as well as real EM images do,
+    # unlike zeros (too well) or uniform noise (not at all).
+    rng = numpy.random.RandomState(0)
+    x = numpy.arange(shape[0], dtype=numpy.uint8)[:, None, None]
+    y = numpy.arange(shape[1], dtype=numpy.uint8)[None, :, None]
+    z = numpy.arange(shape[2], dtype=numpy.uint8)[None, None, :]
+    vol = (x // 2 + y + 3 * z) % 200
+    vol += rng.randint(0, 32, size=shape).astype(numpy.uint8)
+    return vol
+
+
+def _serve(queue, shape, latency, bandwidth, error_rate):
+    store = FakeNDStore(latency=latency, bandwidth=bandwidth,
+                        error_rate=error_rate, seed=0)
+    store.add_channel(TOKEN, CHANNEL, _volume(shape),
+                      cube_dimension=(512, 512, 16))
+    queue.put(store.hostname)
+    store.serve_forever()
+
+
+class _PeakMemory(object):
+    """
+    Measure the peak memory allocated while inside the `with` block.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.peak = float('nan')
+
+    def __enter__(self):
+        if self.enabled and tracemalloc is not None:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.enabled:
+            return
+        if tracemalloc is not None:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            # ru_maxrss is in kilobytes on Linux.
+            self.peak = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentile(times, p):
+    return times[min(len(times) - 1, int(len(times) * p))]
+
+
+def _run(op, nd, size, repeat, memory=True):
+    x, y, z = size
+    times = []
+    with _PeakMemory(memory) as mem:
+        if op == 'get':
+            for _ in range(repeat):
+                start = time.time()
+                nd.get_cutout(TOKEN, CHANNEL, 0, x, 0, y, 0, z,
+                              resolution=0)
+                times.append(time.time() - start)
+        else:
+            data = _volume(size)
+            for _ in range(repeat):
+                start = time.time()
+                nd.post_cutout(TOKEN, CHANNEL, 0, 0, 0, data,
+                               resolution=0)
+                times.append(time.time() - start)
+    times.sort()
+    return times, mem.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='256,512,1024',
+                        help="xy sizes of the (square) cutouts")
+    parser.add_argument('--depth', type=int, default=32,
+                        help="z size of the cutouts")
+    parser.add_argument('--codecs', default='blosc,hdf5',
+                        help="download formats to compare")
+    parser.add_argument('--workers', default='1,4,16',
+                        help="max_workers values to compare")
+    parser.add_argument('--ops', default='get,post')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0,
+                        help="seconds of server latency per request")
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help="server bandwidth, in bytes per second")
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help="fraction of cutout requests that fail")
+    parser.add_argument('--chunk-threshold', type=float, default=1e6,
+                        help="passed to the remote; smaller means more, "
+                             "smaller requests")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="don't measure peak memory")
+    args = parser.parse_args()
+
+    sizes = [(int(s), int(s), args.depth) for s in args.sizes.split(',')]
+    shape = (max(s[0] for s in sizes), max(s[1] for s in sizes), args.depth)
+
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve,
+                                     args=(queue, shape, args.latency,
+                                           args.bandwidth, args.error_rate))
+    server.daemon = True
+    server.start()
+    hostname = queue.get()
+
+    print("{:>5} {:>6} {:>18} {:>7} {:>10} {:>9} {:>9} {:>9} {:>10}".format(
+        'op', 'codec', 'size', 'workers', 'MB/s',
+        'p50 ms', 'p90 ms', 'p99 ms', 'peak MB'))
+    try:
+        for op, codec, size, workers in itertools.product(
+                args.ops.split(','), args.codecs.split(','), sizes,
+                [int(w) for w in args.workers.split(',')]):
+            if op == 'post' and codec != args.codecs.split(',')[0]:
+                # Uploads don't depend on the download format.
+                continue
+            nd = neurodata(hostname=hostname, protocol='http',
+                           codec=codec, max_workers=workers,
+                           chunk_threshold=args.chunk_threshold)
+            times, peak = _run(op, nd, size, args.repeat, args.memory)
+            mb = numpy.prod(size) / 1e6
+            print("{:>5} {:>6} {:>18} {:>7} {:>10.1f} {:>9.1f} {:>9.1f} "
+                  "{:>9.1f} {:>10.1f}".format(
+                      op, codec if op == 'get' else '-', str(size), workers,
+                      mb * len(times) / sum(times),
+                      1000 * _percentile(times, 0.5),
+                      1000 * _percentile(times, 0.9),
+                      1000 * _percentile(times, 0.99),
+                      peak / 1e6))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from __future__ import absolute_import
-import requests
+from .remote_utils import session
 
 
 class Remote(object):
@@ -31,6 +31,14 @@ class Remote(object):
             endpoint = "/" + endpoint
         return self.protocol + "://" + self.hostname + endpoint
 
+    @property
+    def _session(self):
+        """
+        The pooled `requests.Session` of the calling thread, shared with
+        `remote_utils`.
+        """
+        return session()
+
     def ping(self, endpoint=''):
         """
         Ping the server to make sure that you can access the base URL.
@@ -40,5 +48,5 @@ class Remote(object):
         Returns:
             `boolean` Successful access of server (or status code)
         """
-        r = requests.get(self.url() + "/" + endpoint)
+        r = self._session.get(self.url() + "/" + endpoint)
         return r.status_code
@@ -9,3 +9,13 @@ from .Remote import Remote
 from .grute import *
 from .neurodata import *
 from .ndingest import *
+from .cache import BlockCache
+from .remote_volume import RemoteVolume
+from .slice_reader import SliceReader
+from .sparse import SparseCutout
+from .tracing import Tracer
+from .adaptive import AdaptiveTuner
+
+import six
+if six.PY3:
+    from .aio import async_neurodata
@@ -0,0 +1,276 @@
+"""
+Tune the size of cutout requests, and how many are in flight, from how the
+server is coping:
+
+    nd = neurodata(adaptive=True, max_workers=16)
+    nd.get_cutout('tok', 'image', 0, 8192, 0, 8192, 1, 257)
+    nd.data._tuner.state()     # what it settled on
+
+Blocks are always whole multiples of the dataset's cube dimensions. After
+every window of requests, the tuner looks at how long they took and
+whether any of them had to be retried (after a timeout, a dropped
+connection or a 5xx), and then:
+
+    * halves the number of requests in flight if any were retried, and
+      otherwise adds one, up to `max_workers`, unless that made the
+      throughput drop (AIMD, as TCP does with its window);
+    * halves the blocks if requests were retried or took longer than
+      `target_seconds`, and doubles them if they took less than half of
+      that, up to `max_voxels` voxels per request.
+
+Blocks are planned lazily, so new sizes take effect in the middle of a
+transfer. What the tuner learns is kept for later transfers of the remote.
+"""
+from __future__ import absolute_import
+import threading
+import time
+
+import numpy
+
+from ndio.utils.planner import Block
+
+DEFAULT_TARGET_SECONDS = 2.0
+DEFAULT_WINDOW = 8
+DEFAULT_MAX_VOXELS = 1E9 / 16
+
+
+class AdaptiveTuner(object):
+    """
+    Picks the block size and the concurrency of chunked transfers. One
+    tuner can be shared by several remotes that talk to the same server.
+    """
+
+    def __init__(self, max_workers=8, min_workers=1,
+                 target_seconds=DEFAULT_TARGET_SECONDS,
+                 max_voxels=DEFAULT_MAX_VOXELS,
+                 window=DEFAULT_WINDOW):
+        """
+        Arguments:
+            max_workers (int : 8): The most requests to have in flight
+            min_workers (int : 1): The fewest requests to have in flight
+            target_seconds (float : 2): How long a request should take
+            max_voxels (int : 1e9 / 16): The most voxels to ask for in one
+                request
+            window (int : 8): How many requests to finish between changes.
+                The window is never shorter than the number in flight.
+        """
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.target_seconds = target_seconds
+        self.max_voxels = max_voxels
+        self.window = window
+
+        self.scale = None
+        self._cube = None
+        self.concurrency = float(max(self.min_workers, self.max_workers // 2))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._latencies = []
+        self._voxels = 0
+        self._retries = 0
+        self._window_start = None
+        self._throughput = None
+        self._grew = False
+        self._totals = {'requests': 0, 'retries': 0, 'voxels': 0}
+
+    # SECTION:
+    # Block sizes
+
+    def block_size(self, cube, initial=None):
+        """
+        Get the size of the next block to request.
+
+        Arguments:
+            cube (int[3]): The cube dimensions of the dataset
+            initial (int[3] : None): The block size to start from, if the
+                tuner hasn't picked one yet. Defaults to one cube.
+
+        Returns:
+            int[3]: The xyz block size, a multiple of `cube`
+        """
+        with self._cond:
+            self._cube = cube
+            if self.scale is None:
+                initial = initial or cube
+                self.scale = [max(1, int(b) // int(c))
+                              for b, c in zip(initial[:3], cube)]
+            return [int(c) * s for c, s in zip(cube, self.scale)]
+
+    def iter_blocks(self, start, stop, origin, cube, initial=None):
+        """
+        Plan the blocks of an (x, y, z) box, picking the size of each one
+        as it is needed. Slabs of z are planned one at a time, rows of y one
+        at a time within them, and blocks of x one at a time within those.
+        Every block lines up with the grid of the dataset's cubes.
+
+        Arguments:
+            start (int[3]): The lower corner of the box
+            stop (int[3]): The upper corner of the box (exclusive)
+            origin (int[3]): The image offset of the dataset
+            cube (int[3]): The cube dimensions of the dataset
+            initial (int[3] : None): As for `block_size`
+
+        Returns:
+            generator of Block: The blocks, as from
+                `ndio.utils.planner.iter_blocks`
+        """
+        def steps(axis, lo, hi):
+            while lo < hi:
+                size = self.block_size(cube, initial)[axis]
+                edge = origin[axis] + \
+                    ((lo - origin[axis]) // size + 1) * size
+                yield lo, min(hi, edge)
+                lo = min(hi, edge)
+
+        for z in steps(2, start[2], stop[2]):
+            for y in steps(1, start[1], stop[1]):
+                for x in steps(0, start[0], stop[0]):
+                    bounds = (x, y, z)
+                    yield Block(bounds, tuple(
+                        slice(lo - s, hi - s)
+                        for (lo, hi), s in zip(bounds, start)))
+
+    # SECTION:
+    # Concurrency
+
+    def acquire(self):
+        """
+        Wait until another request may be sent.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._cond:
+            while self._in_flight >= int(self.concurrency):
+                self._cond.wait()
+            self._in_flight += 1
+            if self._window_start is None:
+                self._window_start = time.time()
+
+    def release(self, bounds=None, seconds=None):
+        """
+        Mark a request as finished, and count it if it succeeded.
+
+        Arguments:
+            bounds (tuple : None): The (start, stop) along each axis of the
+                block the request was for. None if it failed (or never
+                started).
+            seconds (float : None): How long it took
+
+        Returns:
+            None
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if bounds is not None:
+                voxels = int(numpy.prod([hi - lo for lo, hi in bounds]))
+                self._latencies.append(seconds)
+                self._voxels += voxels
+                self._totals['requests'] += 1
+                self._totals['voxels'] += voxels
+                if len(self._latencies) >= max(self.window,
+                                               int(self.concurrency)):
+                    self._adjust()
+            self._cond.notify_all()
+
+    def retried(self, error=None, attempt=None):
+        """
+        Count a request that failed and is about to be retried. This is the
+        `on_retry` hook of a remote's `Retry` policy.
+
+        Arguments:
+            error (Exception : None): Why it failed
+            attempt (int : None): The number of the attempt that failed
+
+        Returns:
+            None
+        """
+        with self._cond:
+            self._retries += 1
+            self._totals['retries'] += 1
+
+    def _adjust(self):
+        """
+        Change the concurrency and the block size after a window of
+        requests. Called with the lock held.
+        """
+        now = time.time()
+        latency = float(numpy.median(self._latencies))
+        throughput = self._voxels / max(now - self._window_start, 1e-6)
+
+        if self._retries:
+            self.concurrency = max(self.min_workers, self.concurrency / 2)
+            self._resize(0.5)
+            self._grew = False
+        else:
+            if self._grew and self._throughput is not None and \
+                    throughput < 0.9 * self._throughput:
+                # The last step didn't help, so the server is as busy as
+                # it should be.
+                self.concurrency = max(self.min_workers,
+                                       self.concurrency - 1)
+                self._grew = False
+            elif self.concurrency < self.max_workers:
+                self.concurrency = min(self.max_workers,
+                                       self.concurrency + 1)
+                self._grew = True
+            if latency > self.target_seconds:
+                self._resize(0.5)
+            elif latency < self.target_seconds / 2:
+                self._resize(2)
+
+        self._throughput = throughput
+        self._window_start = now
+        self._latencies = []
+        self._voxels = 0
+        self._retries = 0
+
+    def _resize(self, factor):
+        """
+        Double (or halve) the blocks along the axis where they are
+        shortest (or longest).
+        """
+        if self.scale is None:
+            return
+        if factor > 1:
+            voxels = numpy.prod(self.scale) * numpy.prod(self._cube)
+            if 2 * voxels > self.max_voxels:
+                return
+            axis = self.scale.index(min(self.scale))
+            self.scale[axis] *= 2
+        else:
+            axis = self.scale.index(max(self.scale))
+            self.scale[axis] = max(1, self.scale[axis] // 2)
+
+    def state(self):
+        """
+        Get what the tuner has settled on, and what it has seen.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: The block `scale` (in cubes along x, y and z), the
+                `concurrency`, the `in_flight` requests, the `throughput`
+                of the last window (voxels per second), and the total
+                `requests`, `retries` and `voxels`
+        """
+        with self._cond:
+            state = dict(self._totals)
+            state.update({
+                'scale': list(self.scale) if self.scale else None,
+                'concurrency': int(self.concurrency),
+                'in_flight': self._in_flight,
+                'throughput': self._throughput
+            })
+            return state
+
+    def __repr__(self):
+        """
+        Show the tuner's current block scale and concurrency.
+        """
+        return "AdaptiveTuner(scale={}, concurrency={})".format(
+            self.scale, int(self.concurrency))
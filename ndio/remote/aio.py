@@ -0,0 +1,560 @@
+"""
+An asyncio counterpart to the `neurodata` remote, for services that run
+ndio inside an event loop. Its methods are coroutines, so that thousands
+of block requests can be in flight from one process without blocking the
+loop:
+
+    async with async_neurodata(max_requests=256) as nd:
+        info = await nd.get_proj_info('kasthuri11')
+        cutout = await nd.get_cutout('kasthuri11', 'image',
+                                     0, 4096, 0, 4096, 1, 65, resolution=1)
+
+Requests are sent with aiohttp if it is installed. If it isn't, they are
+sent with `requests` on a pool of `max_requests` threads instead, which
+keeps the loop free but costs a thread per request in flight. Either way,
+decoding and compressing blocks run on a pool of `max_workers` threads.
+
+Blocks are planned, encoded and decoded exactly as by the `neurodata`
+remote, and project info is shared with it through the same cache.
+
+This module needs Python 3.5 or newer.
+"""
+import asyncio
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import six
+
+from . import cutout_codecs
+from .data import data
+from .errors import RemoteDataNotFoundError, RemoteDataUploadError
+from .neuroRemote import DEFAULT_HOSTNAME
+from .neuroRemote import DEFAULT_PROTOCOL
+from .neuroRemote import DEFAULT_BLOCK_SIZE
+from .retry import is_retryable, status_error
+from .tracing import span, url_template
+from ndio.utils.planner import grid, iter_blocks
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULT_MAX_REQUESTS = 64
+
+
+class _response(object):
+    """
+    The parts of a response that ndio reads, whichever transport sent it.
+    """
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class _aiohttp_transport(object):
+    """
+    Sends requests with one aiohttp session, limited to `max_requests`
+    connections in all and `max_host_requests` to each host.
+    """
+
+    errors = () if aiohttp is None else (aiohttp.ClientConnectionError,
+                                         aiohttp.ClientPayloadError,
+                                         asyncio.TimeoutError)
+
+    def __init__(self, user_token, max_requests, max_host_requests=None,
+                 timeout=None, tracer=None):
+        self._headers = {'Authorization': 'Token {}'.format(user_token)}
+        self._max_requests = max_requests
+        self._max_host_requests = max_host_requests or 0
+        self._timeout = timeout
+        self._tracer = tracer
+        self._session = None
+
+    async def request(self, method, url, data=None, headers=None):
+        if self._session is None:
+            # aiohttp sessions belong to the loop they are made on, so this
+            # waits for the first request.
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._max_requests,
+                    limit_per_host=self._max_host_requests,
+                    ssl=False),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                headers=self._headers)
+        with span(self._tracer, 'http', method=method, url=url,
+                  template=self._tracer and url_template(url),
+                  bytes_sent=len(data) if data else 0) as event:
+            async with self._session.request(method, url, data=data,
+                                             headers=headers) as r:
+                content = await r.read()
+            event['status'] = r.status
+            event['bytes_received'] = len(content)
+        return _response(r.status, content)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class _thread_transport(object):
+    """
+    Sends requests through a sync remote's `remote_utils`, on a pool of
+    threads, for when aiohttp isn't installed.
+    """
+
+    errors = ()
+
+    def __init__(self, remote_utils, max_requests):
+        self._remote_utils = remote_utils
+        self._executor = ThreadPoolExecutor(max_requests)
+
+    async def request(self, method, url, data=None, headers=None):
+        if method == 'GET':
+            send = functools.partial(self._remote_utils.get_url, url)
+        else:
+            send = functools.partial(self._remote_utils.post_url, url,
+                                     data=data, headers=headers)
+        r = await asyncio.get_event_loop().run_in_executor(self._executor,
+                                                           send)
+        return _response(r.status_code, r.content)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class async_neurodata(object):
+    """
+    An asyncio remote for cutouts, uploads and project info. It takes the
+    same arguments as `neurodata`, and a few more.
+    """
+
+    def __init__(self,
+                 user_token='placeholder',
+                 hostname=DEFAULT_HOSTNAME,
+                 protocol=DEFAULT_PROTOCOL,
+                 meta_root="http://lims.neurodata.io/",
+                 meta_protocol=DEFAULT_PROTOCOL, **kwargs):
+        """
+        Initializer for the async_neurodata remote.
+
+        Arguments:
+            user_token (str: 'placeholder'): Authentication token for user
+            hostname (str: "openconnecto.me"): The hostname to connect to
+            protocol (str: "https"): The protocol (http or https) to use
+            meta_root (str: "http://lims.neurodata.io/"): The metadata server
+            meta_protocol (str: "https"): The protocol to use for the md
+                server
+            max_requests (int: 64): The number of requests that may be in
+                flight at a time, across every call of this remote.
+            transport (str: None): 'aiohttp' or 'threads', to send requests
+                with. If None, aiohttp is used if it is installed.
+            max_workers (int: 8): The number of threads that decode and
+                compress blocks.
+            (all others as in `neurodata`, of which `max_host_requests`,
+                `timeout`, `retries`, `backoff`, `chunk_threshold`, `codec`,
+                `blosc_options`, `info_cache` and `tracer` are used)
+        """
+        self.data = data(user_token,
+                         hostname,
+                         protocol,
+                         meta_root,
+                         meta_protocol, **kwargs)
+        self._max_requests = kwargs.get('max_requests', DEFAULT_MAX_REQUESTS)
+        transport = kwargs.get('transport', None)
+        if transport is None:
+            transport = 'threads' if aiohttp is None else 'aiohttp'
+        if transport == 'aiohttp':
+            if aiohttp is None:
+                raise ImportError("The aiohttp transport needs aiohttp.")
+            self._transport = _aiohttp_transport(
+                user_token, self._max_requests,
+                kwargs.get('max_host_requests', None),
+                kwargs.get('timeout', None), self.data._tracer)
+        elif transport == 'threads':
+            self._transport = _thread_transport(self.data.remote_utils,
+                                                self._max_requests)
+        else:
+            raise ValueError("transport must be 'aiohttp' or 'threads'.")
+        self._executor = ThreadPoolExecutor(max(1, self.data._max_workers))
+        self._slots = None
+
+    async def __aenter__(self):
+        """
+        Use the remote for the length of an `async with` block.
+        """
+        return self
+
+    async def __aexit__(self, *args):
+        """
+        Close the remote at the end of an `async with` block.
+        """
+        await self.close()
+
+    async def close(self):
+        """
+        Close this remote's connections and threads.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        await self._transport.close()
+        self._executor.shutdown(wait=False)
+
+    # SECTION:
+    # Requests
+
+    async def _request(self, method, url, data=None, headers=None):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_requests)
+        async with self._slots:
+            return await self._transport.request(method, url, data=data,
+                                                 headers=headers)
+
+    async def _retry(self, func):
+        """
+        Await `func()` until it succeeds, with the retry policy of the sync
+        remote.
+        """
+        retry = self.data._retry
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                if attempt >= retry.retries or not (
+                        isinstance(e, self._transport.errors) or
+                        is_retryable(e, retry.status_codes)):
+                    raise
+            await asyncio.sleep(retry.delay(attempt))
+            attempt += 1
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, func, *args)
+
+    @staticmethod
+    async def _gather(coroutines):
+        """
+        Run coroutines at the same time. If any of them fails, the rest are
+        cancelled and the error is raised.
+        """
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+
+    async def _map(self, func, items):
+        """
+        Await `func(item)` for every item, with up to `max_requests` calls at
+        a time. Items are only taken from `items` as there is room for them,
+        so it can be a generator. If any call fails, the rest are cancelled
+        and the error is raised.
+        """
+        items = iter(items)
+
+        async def worker():
+            # Workers share the iterator, which is safe on a single loop.
+            for item in items:
+                await func(item)
+
+        await self._gather(worker() for _ in range(self._max_requests))
+
+    # SECTION:
+    # Metadata
+
+    async def get_proj_info(self, token, refresh=False):
+        """
+        Return the project info for a given token. Project info is cached for
+        a few minutes (see `InfoCache`), so repeated calls are cheap.
+
+        Arguments:
+            token (str): Token to return information for
+            refresh (bool : False): Skip the cache and ask the server
+
+        Returns:
+            JSON: representation of proj_info
+        """
+        url = self.data._info_url(token)
+        cache = self.data._info_cache()
+        if not refresh:
+            info = cache.get(url)
+            if info is not None:
+                return info
+
+        r = await self._request('GET', url)
+        info = r.json()
+        if r.status_code == 200:
+            cache.set(url, info)
+        return info
+
+    async def reserve_ids(self, token, channel, quantity):
+        """
+        Requests a list of next-available-IDs from the server.
+
+        Arguments:
+            quantity (int): The number of IDs to reserve
+
+        Returns:
+            int[quantity]: List of IDs you've been granted
+        """
+        url = self.data.url("{}/{}/reserve/{}/".format(token, channel,
+                                                       quantity))
+        r = await self._request('GET', url)
+        if r.status_code != 200:
+            raise RemoteDataNotFoundError('Invalid req: {}'.format(
+                                          r.status_code))
+        out = r.json()
+        return [out[0] + i for i in range(out[1])]
+
+    # SECTION:
+    # Data Download
+
+    async def get_cutout(self, token, channel,
+                         x_start, x_stop,
+                         y_start, y_stop,
+                         z_start, z_stop,
+                         t_start=0, t_stop=1,
+                         resolution=1,
+                         block_size=DEFAULT_BLOCK_SIZE,
+                         neariso=False):
+        """
+        Get volumetric cutout data from the neurodata server.
+
+        Arguments:
+            (as in `neurodata.get_cutout`)
+
+        Returns:
+            numpy.ndarray: Downloaded data, in (x, y, z) order, or in
+                (x, y, z, t) order if more than one timepoint was requested.
+        """
+        info = await self.get_proj_info(token)
+        origin, cube = grid(info, resolution)
+        if block_size is None:
+            block_size = cube
+
+        # As in the sync remote: the server sends at least 16 slices.
+        z_slices = max(z_stop - z_start, 16)
+        size = (x_stop - x_start) * (y_stop - y_start) * z_slices * 4
+        timeseries = (t_stop - t_start) > 1
+        if timeseries:
+            size *= t_stop - t_start
+
+        start = (x_start, y_start, z_start, t_start)
+        stop = (x_stop, y_stop, z_stop, t_stop)
+        if size < self.data._chunk_threshold:
+            blocks = [tuple(zip(start, stop))]
+        else:
+            t_block = block_size[3] if len(block_size) > 3 else 1
+            blocks = (b.bounds for b in iter_blocks(
+                start, stop, tuple(origin) + (0,),
+                tuple(block_size[:3]) + (t_block,)))
+
+        shape = (z_stop - z_start, y_stop - y_start, x_stop - x_start)
+        if timeseries:
+            shape = (t_stop - t_start,) + shape
+        vol = numpy.zeros(shape,
+                          dtype=info['channels'][channel]['datatype'])
+
+        def slab(b):
+            index = tuple(slice(lo - s, hi - s)
+                          for (lo, hi), s in zip(b[2::-1], start[2::-1]))
+            if timeseries:
+                index = (slice(b[3][0] - t_start, b[3][1] - t_start),) + index
+            return vol[index]
+
+        await self._map(
+            lambda b: self._get_block(token, channel, resolution, b, slab(b),
+                                      neariso),
+            blocks)
+
+        # zyx to xyz, or tzyx to xyzt
+        return numpy.transpose(vol)
+
+    async def _get_block(self, token, channel, resolution, b, out,
+                         neariso=False):
+        """
+        Download one block and decode it into `out`, negotiating the codec
+        as the sync remote does.
+        """
+        codec = self.data._codec
+        if codec is not None:
+            return await self._get_encoded(codec, token, channel,
+                                           resolution, b, out, neariso)
+        try:
+            await self._get_encoded(cutout_codecs.BLOSC, token, channel,
+                                    resolution, b, out, neariso)
+        except Exception as e:
+            # Anything else (a bad token, bounds or key, or a server that is
+            # down) would fail as HDF5 too.
+            if not cutout_codecs.unsupported(e):
+                raise
+            await self._get_encoded(cutout_codecs.HDF5, token, channel,
+                                    resolution, b, out, neariso)
+            self.data._codec = cutout_codecs.HDF5
+            return
+        self.data._codec = cutout_codecs.BLOSC
+
+    async def _get_encoded(self, codec, token, channel, resolution, b, out,
+                           neariso=False):
+        url = self.data._cutout_url(codec, token, channel, resolution,
+                                    *(b[0] + b[1] + b[2] + b[3]),
+                                    neariso=neariso)
+
+        async def fetch():
+            r = await self._request('GET', url)
+            if r.status_code != 200:
+                raise status_error(IOError,
+                                   "Bad server response for {}: {}: {}".format(
+                                       url, r.status_code, r.text),
+                                   r.status_code)
+            return r.content
+
+        content = await self._retry(fetch)
+        tracer = self.data._tracer
+
+        def decode():
+            with span(tracer, 'decode', codec=codec,
+                      bytes_received=len(content)):
+                try:
+                    return cutout_codecs.DECODERS_INTO[codec](content,
+                                                              channel, out)
+                except Exception as e:
+                    six.raise_from(cutout_codecs.DecodeError(
+                        "Couldn't decode the {} cutout from {}: {}".format(
+                            codec, url, e)), e)
+
+        return await self._run(decode)
+
+    # SECTION:
+    # Data Upload
+
+    async def post_cutout(self, token, channel,
+                          x_start,
+                          y_start,
+                          z_start,
+                          data,
+                          resolution=0,
+                          block_size=DEFAULT_BLOCK_SIZE,
+                          t_start=0,
+                          skip_empty=False):
+        """
+        Post a cutout to the server.
+
+        Arguments:
+            (as in `neurodata.post_cutout`, without `manifest`)
+
+        Returns:
+            bool: True on success
+
+        Raises:
+            RemoteDataUploadError: if there's an issue during upload.
+        """
+        info = await self.get_proj_info(token)
+        datatype = info['channels'][channel]['datatype']
+        if data.dtype.name != datatype:
+            data = data.astype(datatype)
+
+        # xyz to zyx, or xyzt to tzyx
+        data = numpy.transpose(data)
+        if data.ndim == 3:
+            t_start = None
+
+        if skip_empty and not data.any():
+            return True
+
+        # Even a failed upload may have written some of the cubes.
+        try:
+            return await self._post_cutout(info, token, channel,
+                                           x_start, y_start, z_start, data,
+                                           resolution, block_size, t_start,
+                                           skip_empty)
+        finally:
+            start = (x_start, y_start, z_start)
+            await self._run(
+                self.data._invalidate_cached, token, channel, resolution,
+                start, [s + n for s, n in zip(start, data.shape[::-1])],
+                t_start,
+                None if t_start is None else t_start + data.shape[0])
+
+    async def _post_cutout(self, info, token, channel,
+                           x_start, y_start, z_start, data,
+                           resolution, block_size, t_start, skip_empty):
+        """
+        Upload a zyx (or tzyx) cutout for `post_cutout`, at once or in
+        blocks.
+        """
+        # Python 3 can't write blosc that the server reads.
+        codec = cutout_codecs.NPZ
+        start = (x_start, y_start, z_start)
+        if t_start is not None:
+            start += (t_start,)
+        stop = [a + n for a, n in zip(start, data.shape[::-1])]
+        if data.size < self.data._chunk_threshold and not skip_empty:
+            blocks = [tuple(zip(start, stop))]
+        else:
+            origin, cube = grid(info, resolution)
+            if block_size is None:
+                block_size = cube
+            t_block = block_size[3] if len(block_size) > 3 else 1
+            block_size = [max(c, (b // c) * c)
+                          for b, c in zip(block_size, cube)]
+            origin = tuple(origin)
+            if t_start is not None:
+                block_size.append(t_block)
+                origin += (0,)
+            blocks = (b.bounds
+                      for b in iter_blocks(start, stop, origin, block_size))
+
+        encode = self.data._encoder(codec)
+
+        # At most `max_requests` blocks are encoded or held at a time.
+        async def post(b):
+            index = tuple(slice(lo - s, hi - s)
+                          for (lo, hi), s in zip(b, start))[::-1]
+            subvol = data[index]
+            if skip_empty and not subvol.any():
+                return
+            payload = await self._run(encode, subvol)
+            await self._post_encoded(codec, token, channel,
+                                     b[0][0], b[1][0], b[2][0],
+                                     subvol.shape, payload, resolution,
+                                     b[3][0] if len(b) > 3 else None)
+
+        await self._map(post, blocks)
+        return True
+
+    async def _post_encoded(self, codec, token, channel,
+                            x_start, y_start, z_start,
+                            shape, payload, resolution, t_start=None):
+        url = self.data._upload_url(codec, token, channel,
+                                    x_start, y_start, z_start,
+                                    shape, resolution, t_start)
+
+        async def post():
+            r = await self._request('POST', url, data=payload, headers={
+                'Content-Type': 'application/octet-stream'
+            })
+            if r.status_code != 200:
+                raise status_error(RemoteDataUploadError, r.text,
+                                   r.status_code)
+            return True
+
+        return await self._retry(post)
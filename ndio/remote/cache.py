@@ -0,0 +1,252 @@
+from __future__ import absolute_import
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+
+from ndio.convert import blosc as ndblosc
+
+DEFAULT_CACHE_SIZE = 4 * 1024 ** 3
+CACHE_EXT = '.blosc'
+# Once full, the cache is trimmed to this fraction of its size, so that the
+# directory is only walked every so often rather than on every put.
+LOW_WATER = 0.9
+
+# os.replace overwrites atomically on every platform, but is Python 3 only.
+_replace = getattr(os, 'replace', os.rename)
+
+
+class BlockCache(object):
+    """
+    A persistent, size-bounded cache of downloaded cutout blocks.
+
+    Blocks are stored blosc-compressed, one file per block, under `path`. The
+    file name is a hash of everything that identifies the block (host, token,
+    channel, resolution, bounds and neariso), so any number of processes can
+    share one cache directory: files are written to a temporary name and
+    atomically renamed into place, and readers and evictors treat a file
+    that disappears underneath them as a miss.
+
+    When the cache grows past `max_bytes`, the least recently used blocks are
+    removed until it is back under `LOW_WATER` of that size. A block's "use"
+    time is its file's modification time, which is refreshed on every hit.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_SIZE):
+        """
+        Arguments:
+            path (str): The directory to keep cached blocks in. It is created
+                if it doesn't exist.
+            max_bytes (int : 4GiB): The size, on disk, that the cache may
+                grow to before blocks are evicted.
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._bytes = self._scan()[1]
+
+    def key(self, host, token, channel, resolution, bounds, neariso=False):
+        """
+        Get the cache key of a block.
+
+        Arguments:
+            host (str): The hostname the block is downloaded from
+            token (str): Token of the block
+            channel (str): Channel of the block
+            resolution (int): Resolution of the block
+            bounds (tuple): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the block
+            neariso (bool : False): Whether the block is a neariso cutout
+
+        Returns:
+            str: The key
+        """
+        ident = "{}/{}/{}/{}/{}/{}".format(
+            host, token, channel, resolution,
+            ",".join("{}:{}".format(*b) for b in bounds),
+            "neariso" if neariso else "")
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + CACHE_EXT)
+
+    def get(self, key):
+        """
+        Get a block from the cache.
+
+        Arguments:
+            key (str): The key of the block, from `key()`
+
+        Returns:
+            numpy.ndarray: The block, or None if it is not in the cache
+        """
+        filename = self._file(key)
+        try:
+            with open(filename, 'rb') as f:
+                packed = f.read()
+            os.utime(filename, None)
+        except (IOError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return ndblosc.to_array(packed)
+
+    def put(self, key, array):
+        """
+        Store a block in the cache, evicting old blocks if it is now too big.
+
+        Arguments:
+            key (str): The key of the block, from `key()`
+            array (numpy.ndarray): The block
+
+        Returns:
+            None
+        """
+        filename = self._file(key)
+        directory = os.path.dirname(filename)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        packed = ndblosc.from_array(array)
+        try:
+            replaced = os.stat(filename).st_size
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(packed)
+            _replace(tmp, filename)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        with self._lock:
+            self._bytes += len(packed) - replaced
+            full = self._bytes > self.max_bytes
+        if full:
+            self.evict(int(LOW_WATER * self.max_bytes))
+
+    def remove(self, key):
+        """
+        Remove a block from the cache, if it is there.
+
+        Arguments:
+            key (str): The key of the block, from `key()`
+
+        Returns:
+            bool: Whether the block was in the cache
+        """
+        filename = self._file(key)
+        try:
+            size = os.stat(filename).st_size
+            os.remove(filename)
+        except OSError:
+            return False
+        with self._lock:
+            self._bytes -= size
+        return True
+
+    def _scan(self):
+        """
+        List every block in the cache.
+
+        Returns:
+            ([(mtime, size, filename), ...], total_size)
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(CACHE_EXT):
+                    continue
+                filename = os.path.join(root, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, filename))
+                total += st.st_size
+        return entries, total
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used blocks until the cache fits in
+        `max_bytes`. This looks at the directory itself, so blocks added by
+        other processes are counted too.
+
+        Arguments:
+            max_bytes (int : None): The size to shrink to. Defaults to the
+                size the cache was created with.
+
+        Returns:
+            int: The number of bytes removed
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries, total = self._scan()
+        removed = 0
+        for _, size, filename in sorted(entries):
+            if total - removed <= max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                # Another process got to it first.
+                pass
+            removed += size
+
+        with self._lock:
+            self._bytes = total - removed
+        return removed
+
+    def clear(self):
+        """
+        Remove every block from the cache and reset the statistics.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self.evict(0)
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Get the hit/miss statistics of this cache (for this process only).
+
+        Arguments:
+            None
+
+        Returns:
+            dict: hits, misses, hit_rate and bytes (the approximate size of
+                the cache on disk)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'bytes': self._bytes
+            }
@@ -0,0 +1,262 @@
+"""
+Encoders and decoders for the cutout formats that ndstore speaks.
+
+Every decoder takes the body of a cutout response and returns the cutout
+as a zyx numpy array. Every encoder takes a zyx numpy array and returns the
+body of an upload request.
+"""
+from __future__ import absolute_import
+import struct
+import sys
+import threading
+import zlib
+from io import BytesIO
+
+import blosc
+import h5py
+import numpy
+import six
+from six.moves import cPickle as pickle
+
+from ndio.convert import blosc as ndblosc
+
+BLOSC = 'blosc'
+HDF5 = 'hdf5'
+NPZ = 'npz'
+CODECS = (BLOSC, HDF5)
+
+# Responses that mean the server can't send a cutout in the format asked
+# for, rather than that the cutout itself is wrong.
+UNSUPPORTED_STATUS_CODES = frozenset([406, 415, 501])
+
+# The pickle opcodes that can hold the raw data of a pickled array, and the
+# format of the length that follows them: (SHORT_)BINSTRING (Python 2),
+# (SHORT_)BINBYTES, BINBYTES8 and BYTEARRAY8 (protocol 5, which stores the
+# array's memory order after it instead of before).
+_PICKLE_DATA = [(b'T', '<i'), (b'U', '<B'), (b'B', '<I'), (b'C', '<B'),
+                (b'\x8e', '<Q'), (b'\x96', '<Q')]
+_PICKLE_NEWFALSE = b'\x89'
+_PICKLE_ORDER_C = b'\x8c\x01C'
+# How far into a pickle to look for the start of the data.
+_PICKLE_HEADER = 4096
+# Each thread keeps a decompression buffer up to this size between blocks.
+_SCRATCH_BYTES = 64 * 1024 ** 2
+_scratch = threading.local()
+
+
+class DecodeError(ValueError):
+    """
+    A cutout response that couldn't be decoded in the format it was asked
+    for.
+    """
+
+    pass
+
+
+def unsupported(e):
+    """
+    Decide whether a failed cutout request might work in another format.
+
+    Arguments:
+        e (Exception): The error the request raised
+
+    Returns:
+        bool: True if the response couldn't be decoded, or the server
+            doesn't speak the format
+    """
+    return isinstance(e, DecodeError) or \
+        getattr(e, 'status_code', None) in UNSUPPORTED_STATUS_CODES
+
+
+def decode_blosc(content, channel=None):
+    """
+    Decode a blosc cutout. ndstore packs cutouts with `blosc.pack_array`,
+    which pickles them. The server runs Python 2, so on Python 3 the pickle
+    may need to be read as latin1.
+
+    Arguments:
+        content (bytes): The response body
+        channel (str : None): Unused, for a common signature with
+            `decode_hdf5`
+
+    Returns:
+        numpy.ndarray: The cutout, in zyx order
+    """
+    try:
+        array = blosc.unpack_array(content)
+    except UnicodeDecodeError:
+        if six.PY2:
+            raise
+        # blosc.unpack_array(content, encoding=...) would work too, but it
+        # walks the whole array in Python looking for strings.
+        array = pickle.loads(blosc.decompress(content), encoding='latin1')
+
+    # This will need modification for >3D blocks
+    return array[0]
+
+
+def _scratch_buffer(nbytes):
+    """
+    Get a buffer of at least `nbytes` to decompress into. Small ones are
+    kept for the next block decoded on the same thread.
+    """
+    buf = getattr(_scratch, 'buf', None)
+    if buf is not None and buf.size >= nbytes:
+        return buf
+    buf = numpy.empty(nbytes, dtype=numpy.uint8)
+    if nbytes <= _SCRATCH_BYTES:
+        _scratch.buf = buf
+    return buf
+
+
+def _pickled_data(buf, size, nbytes, dtype):
+    """
+    Find the raw data of a C-ordered array of `nbytes` bytes in a pickle,
+    without unpickling it.
+
+    Returns:
+        int: The offset of the data, or None if it isn't there
+    """
+    header = buf[:min(size, _PICKLE_HEADER)].tobytes()
+    for opcode, fmt in _PICKLE_DATA:
+        if fmt == '<B' and nbytes > 255:
+            continue
+        marker = opcode + struct.pack(fmt, nbytes)
+        i = header.find(marker)
+        if i < 0:
+            continue
+        start = i + len(marker)
+        if start + nbytes > size:
+            continue
+        trailer = buf[start + nbytes:size].tobytes()
+        if opcode == b'\x96':
+            if _PICKLE_ORDER_C not in trailer:
+                continue
+        elif header[i - 1:i] != _PICKLE_NEWFALSE:
+            continue
+        if dtype.str[1:].encode('ascii') not in header[:i] + trailer:
+            continue
+        return start
+    return None
+
+
+def decode_blosc_into(content, out):
+    """
+    Decode a blosc cutout straight into an existing array, such as the
+    slab of a larger volume that the cutout belongs in.
+
+    `blosc.unpack_array` decompresses the pickled array, and then unpickles
+    it into a second copy. Instead, this decompresses into a buffer that
+    each thread reuses, finds the array's data inside the pickle, and copies
+    it into `out`, so the cutout is never allocated on its own. Anything
+    that doesn't look like a plain C-ordered array of `out`'s datatype and
+    size is decoded with `decode_blosc` instead.
+
+    Arguments:
+        content (bytes): The response body
+        out (numpy.ndarray): Where to put the cutout, in zyx (or tzyx)
+            order. It may be a non-contiguous view.
+
+    Returns:
+        numpy.ndarray: out
+    """
+    start = None
+    # blosc.get_cbuffer_sizes is missing from older versions of blosc.
+    sizes = getattr(blosc, 'get_cbuffer_sizes', None)
+    if sizes is not None and (out.dtype.itemsize == 1 or
+                              sys.byteorder == 'little'):
+        size = sizes(content)[0]
+        buf = _scratch_buffer(size)
+        blosc.decompress_ptr(content, buf.ctypes.data)
+        start = _pickled_data(buf, size, out.nbytes, out.dtype)
+    if start is None:
+        out[...] = decode_blosc(content).reshape(out.shape)
+    else:
+        out[...] = buf[start:start + out.nbytes].view(
+            out.dtype).reshape(out.shape)
+    return out
+
+
+def decode_hdf5(content, channel):
+    """
+    Decode an HDF5 cutout in memory, without writing it to disk.
+
+    Arguments:
+        content (bytes): The response body
+        channel (str): The channel the cutout was taken from
+
+    Returns:
+        numpy.ndarray: The cutout, in zyx order
+    """
+    with h5py.File(BytesIO(content), 'r') as h5file:
+        return h5file.get(channel).get('CUTOUT')[:]
+
+
+def decode_hdf5_into(content, channel, out):
+    """
+    Decode an HDF5 cutout straight into an existing array. A contiguous
+    `out` is read into directly, without an intermediate copy.
+
+    Arguments:
+        content (bytes): The response body
+        channel (str): The channel the cutout was taken from
+        out (numpy.ndarray): Where to put the cutout, in zyx order
+
+    Returns:
+        numpy.ndarray: out
+    """
+    with h5py.File(BytesIO(content), 'r') as h5file:
+        dset = h5file.get(channel).get('CUTOUT')
+        if out.flags.c_contiguous and dset.size == out.size and \
+                dset.dtype == out.dtype:
+            dset.read_direct(out.reshape(dset.shape))
+        else:
+            out[...] = dset[:].reshape(out.shape)
+    return out
+
+
+DECODERS = {
+    BLOSC: decode_blosc,
+    HDF5: decode_hdf5
+}
+
+DECODERS_INTO = {
+    BLOSC: lambda content, channel, out: decode_blosc_into(content, out),
+    HDF5: decode_hdf5_into
+}
+
+
+def encode_blosc(data, **options):
+    """
+    Encode a cutout for a blosc upload.
+
+    Arguments:
+        data (numpy.ndarray): The cutout, in zyx order
+        cname, clevel, shuffle: Override the options of
+            `ndio.convert.blosc.set_options`
+
+    Returns:
+        bytes: The request body
+    """
+    return ndblosc.from_array(numpy.expand_dims(data, axis=0), **options)
+
+
+def encode_npz(data):
+    """
+    Encode a cutout for an npz upload (a zlib-compressed .npy file).
+
+    Arguments:
+        data (numpy.ndarray): The cutout, in zyx order
+
+    Returns:
+        bytes: The request body
+    """
+    buf = BytesIO()
+    numpy.save(buf, numpy.expand_dims(data, axis=0))
+    return zlib.compress(buf.getvalue())
+
+
+ENCODERS = {
+    BLOSC: encode_blosc,
+    NPZ: encode_npz
+}
@@ -3,12 +3,26 @@ import ndio
 import requests
 import os
 import numpy
-from io import BytesIO
-import zlib
 import tempfile
 import blosc
 import h5py
+import threading
+import time
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import wait, FIRST_COMPLETED
 from .remote_utils import remote_utils
+from . import cutout_codecs
+from .manifest import TransferManifest
+from .slice_reader import SliceReader
+from .sparse import SparseCutout
+from ndio.convert import blosc as ndblosc
+from ndio.utils.downsample import downsample, fit_shape
+from .retry import status_error
+from .tracing import span, url_template
+from .adaptive import AdaptiveTuner
+from .inflight import InFlightRequests
 
 from .Remote import Remote
 from .errors import *
@@ -62,12 +76,86 @@ class data(neuroRemote, metadata):
                 Default is 1e9 / 4, or a 0.25GiB.
             suffix (str: "ocp"): The URL suffix to specify ndstore/microns. If
                 you aren't sure what to do with this, don't specify one.
+            max_workers (int: 8): The number of blocks of a chunked cutout to
+                download at the same time. Set to 1 to download serially.
+            max_host_requests (int: None): The maximum number of requests
+                that may be in flight to a single host at a time. If None,
+                only `max_workers` limits concurrency.
+            pool_size (int: 16): The number of persistent connections to keep
+                open to each host. Remotes with the same `pool_size` and
+                `keep_alive` share their connections.
+            keep_alive (bool: True): Whether to reuse connections between
+                requests.
+            timeout (float: None): The number of seconds to wait for the
+                server on each request. If None, wait forever.
+            retries (int: 3): How many times to retry a request that failed
+                with a connection error, a timeout or a status code that
+                means "try again later" (such as 503). Retries back off
+                exponentially, with jitter.
+            backoff (float: 0.5): The longest wait, in seconds, before the
+                first retry. Each later retry may wait twice as long.
+            tracer (Tracer: None): An `ndio.remote.Tracer` to send events to
+                for every request, download, decode and upload, to find out
+                where the time goes. If None, nothing is traced.
+            block_cache (BlockCache: None): An `ndio.remote.cache.BlockCache`
+                to keep downloaded blocks in. Cube-aligned blocks of later
+                cutouts are read from it instead of from the server. Cubes
+                that this remote uploads to are dropped from it.
+            info_cache (InfoCache: None): An `ndio.remote.metadata.InfoCache`
+                to keep project info in. If None, the cache shared by all
+                remotes is used.
+            codec (str: None): The cutout format to download, 'blosc' or
+                'hdf5'. If None, blosc is tried first and HDF5 is used if
+                the server or this python can't handle it.
+            blosc_options (dict: None): The cname, clevel and shuffle to
+                compress blosc uploads with, instead of the options set
+                with `ndio.convert.blosc.set_options`.
+            slice_prefetch (int: None): If set, `get_xy_slice` and
+                `get_image` read whole slabs of z and prefetch the next ones
+                in the direction of the scan, keeping up to this many bytes
+                of them in memory. See `ndio.remote.SliceReader`.
+            adaptive (bool: False): Pick the block size and the number of
+                requests in flight of chunked transfers from how fast the
+                server answers and how often requests have to be retried,
+                instead of using `block_size` and `max_workers` as they are.
+                `max_workers` becomes the most requests in flight. Pass an
+                `ndio.remote.AdaptiveTuner` to tune it yourself, or to share
+                one between remotes.
+            dedup (bool: True): When threads ask for the same block at the
+                same time, send one request and give each a copy.
+            coalesce (float: None): If set, a request for a small block
+                waits this many seconds for requests for neighbouring
+                blocks, and blocks that line up are downloaded in one
+                request. See `ndio.remote.inflight`.
         """
         super(data, self).__init__(user_token,
                                    hostname,
                                    protocol,
                                    meta_root,
                                    meta_protocol, **kwargs)
+        self._block_cache = kwargs.get('block_cache', None)
+        self._codec = kwargs.get('codec', None)
+        if self._codec is None and six.PY2:
+            self._codec = cutout_codecs.BLOSC
+        if self._codec not in (None,) + cutout_codecs.CODECS:
+            raise ValueError("codec must be one of {}.".format(
+                             cutout_codecs.CODECS))
+        self._blosc_options = kwargs.get('blosc_options', None) or {}
+        ndblosc.resolve_options(**self._blosc_options)
+        self._slice_reader = None
+        if kwargs.get('slice_prefetch', None):
+            self._slice_reader = SliceReader(self, kwargs['slice_prefetch'])
+        self._tuner = kwargs.get('adaptive', None) or None
+        if self._tuner is True:
+            self._tuner = AdaptiveTuner(self._max_workers,
+                                        max_voxels=self._chunk_threshold / 4)
+        if self._tuner is not None:
+            self._retry.on_retry = self._tuner.retried
+        self._inflight = None
+        if kwargs.get('dedup', True) or kwargs.get('coalesce', None):
+            self._inflight = InFlightRequests(
+                kwargs.get('coalesce', None),
+                max_voxels=self._chunk_threshold / 4)
 
     # SECTION:
     # Data Download
@@ -143,6 +231,12 @@ class data(neuroRemote, metadata):
         Returns:
             str: binary image data
         """
+        if self._slice_reader is not None:
+            return self._slice_reader.get_xy_slice(token, channel,
+                                                   x_start, x_stop,
+                                                   y_start, y_stop,
+                                                   z_index, resolution)
+
         vol = self.get_cutout(token, channel, x_start, x_stop, y_start,
                               y_stop, z_index, z_index + 1, resolution)
 
@@ -164,6 +258,89 @@ class data(neuroRemote, metadata):
                                  z_index,
                                  resolution)
 
+    def get_xy_slices(self, token, channel, bbox_xy, z_indices,
+                      resolution=0,
+                      block_size=None,
+                      neariso=False):
+        """
+        Get several xy slices at once, in any order. The server sends at
+        least a cube's depth of z for every cutout, so the slices are
+        grouped by the cube-aligned slab of z they fall in, and each slab
+        is downloaded once (the slabs side by side, up to `max_workers` at a
+        time) instead of once per slice.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            bbox_xy (tuple): ((x_start, x_stop), (y_start, y_stop)) of the
+                slices
+            z_indices (int[]): The z-slices to get. They may repeat.
+            resolution (int : 0): Resolution level
+            block_size (int[3] : None): The size of the blocks to download
+                each slab in, along x and y. Slabs are always one cube deep.
+                If None, the slabs are downloaded a cube at a time.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            numpy.ndarray: The slices, in (x, y, i) order, where slice `i`
+                is `z_indices[i]`
+        """
+        (x_start, x_stop), (y_start, y_stop) = bbox_xy
+        info = self.get_proj_info(token)
+        if channel not in info['channels']:
+            raise RemoteDataNotFoundError("Channel " + channel +
+                                          " is not available.")
+        dtype = info['channels'][channel]['datatype']
+        origin = self.get_image_offset(token, resolution)
+        cube = self.get_block_size(token, resolution)
+        if block_size is None:
+            block_size = cube
+        depth = cube[2]
+
+        z_indices = [int(z) for z in z_indices]
+        out = numpy.zeros((len(z_indices), y_stop - y_start,
+                           x_stop - x_start), dtype=dtype)
+
+        # slab -> [(index in the result, z)]
+        slabs = {}
+        for i, z in enumerate(z_indices):
+            slabs.setdefault((z - origin[2]) // depth, []).append((i, z))
+
+        dl_func = self._dl_func()
+        if self._block_cache is not None:
+            dl_func = self._cached_dl_func(dl_func, origin, cube)
+
+        from ndio.utils import planner
+        tasks = []
+        for slab, wanted in sorted(slabs.items()):
+            # Only the z's between the first and last wanted slice of the
+            # slab are sent back; the server reads the whole slab anyway.
+            z_lo = min(z for _, z in wanted)
+            z_hi = max(z for _, z in wanted) + 1
+            for b in planner.iter_blocks(
+                    (x_start, y_start, z_lo), (x_stop, y_stop, z_hi),
+                    origin, (block_size[0], block_size[1], depth)):
+                tasks.append((b.bounds, wanted))
+
+        def fetch(task):
+            b, wanted = task
+            data = dl_func(token, channel, resolution,
+                           b[0][0], b[0][1],
+                           b[1][0], b[1][1],
+                           b[2][0], b[2][1],
+                           0, 1,
+                           neariso=neariso)
+            if data.ndim == 4:
+                data = data[0]
+            for i, z in wanted:
+                out[i,
+                    b[1][0] - y_start: b[1][1] - y_start,
+                    b[0][0] - x_start: b[0][1] - x_start] = data[z - b[2][0]]
+
+        self._map_blocks(fetch, tasks, bounds=lambda task: task[0])
+        return numpy.transpose(out, (2, 1, 0))
+
     def get_volume(self, token, channel,
                    x_start, x_stop,
                    y_start, y_stop,
@@ -200,6 +377,120 @@ class data(neuroRemote, metadata):
                                         neariso=neariso)
         return volume
 
+    def pick_resolution(self, token, shape, bbox=None):
+        """
+        Find the coarsest resolution that still has at least `shape` voxels
+        in a box, so that the box can be downloaded at that resolution and
+        shrunk to `shape` without losing any detail that `shape` can show.
+
+        Arguments:
+            token (str): The token to inspect
+            shape (int[3]): The xyz shape wanted
+            bbox (tuple : None): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the box, at the finest resolution of
+                the dataset. Defaults to the whole dataset.
+
+        Returns:
+            (int, tuple): The resolution, and the bbox at that resolution
+
+        Raises:
+            ValueError: If `shape` is bigger than the box
+        """
+        picked = None
+        for resolution, box in self._resolution_boxes(token, bbox):
+            if all(b[1] - b[0] >= s for b, s in zip(box, shape)):
+                picked = (resolution, box)
+        if picked is None:
+            raise ValueError("The box is smaller than {}.".format(
+                             tuple(shape)))
+        return picked
+
+    def _resolution_boxes(self, token, bbox=None):
+        """
+        Get a box at every resolution of a dataset.
+
+        Arguments:
+            token (str): The token to inspect
+            bbox (tuple : None): The box at the finest resolution, as for
+                `pick_resolution`
+
+        Returns:
+            list: (resolution, bbox) pairs, finest first. The boxes are
+                rounded outwards, and clipped to the dataset.
+        """
+        dataset = self.get_proj_info(token)['dataset']
+        resolutions = sorted(int(r) for r in dataset['imagesize'])
+        base = str(resolutions[0])
+        size = dataset['imagesize'][base]
+        offset = dataset['offset'][base]
+        if bbox is None:
+            bbox = [(o, o + n) for o, n in zip(offset, size)]
+
+        boxes = []
+        for resolution in resolutions:
+            res = str(resolution)
+            box = []
+            for (start, stop), n, o, n_r, o_r in zip(
+                    bbox, size, offset, dataset['imagesize'][res],
+                    dataset['offset'][res]):
+                lo = o_r + (start - o) * n_r // n
+                hi = o_r - (-(stop - o) * n_r // n)
+                hi = min(max(hi, lo + 1), o_r + n_r)
+                box.append((lo, hi))
+            boxes.append((resolution, tuple(box)))
+        return boxes
+
+    def get_overview(self, token, channel,
+                     shape=None,
+                     max_bytes=None,
+                     bbox=None,
+                     method=None,
+                     block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Get a box (by default, the whole dataset) shrunk to a given shape or
+        size, for overviews and thumbnails. The box is downloaded at the
+        coarsest resolution that has enough voxels (see `pick_resolution`),
+        and shrunk the rest of the way here.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            shape (int[3] : None): The xyz shape of the result
+            max_bytes (int : None): Instead of `shape`, the most bytes the
+                result may take. The box is shrunk evenly along every axis.
+            bbox (tuple : None): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the box, at the finest resolution of
+                the dataset. Defaults to the whole dataset.
+            method (str : None): 'mean' or 'mode', as for
+                `ndio.utils.downsample.downsample`. Defaults to 'mode' for
+                annotation channels and 'mean' for the rest.
+            block_size (int[3]): As for `get_cutout`
+
+        Returns:
+            numpy.ndarray: The overview, in (x, y, z) order
+        """
+        if (shape is None) == (max_bytes is None):
+            raise ValueError("Pass one of shape or max_bytes.")
+        channel_info = self.get_proj_info(token)['channels'][channel]
+        if shape is None:
+            box = self._resolution_boxes(token, bbox)[0][1]
+            itemsize = numpy.dtype(channel_info['datatype']).itemsize
+            shape = fit_shape([b[1] - b[0] for b in box],
+                              max_bytes // itemsize)
+        if method is None:
+            method = 'mode' \
+                if channel_info.get('channel_type') == self.ANNOTATION \
+                else 'mean'
+
+        resolution, box = self.pick_resolution(token, shape, bbox)
+        cutout = self.get_cutout(token, channel,
+                                 box[0][0], box[0][1],
+                                 box[1][0], box[1][1],
+                                 box[2][0], box[2][1],
+                                 resolution=resolution,
+                                 block_size=block_size)
+        return downsample(cutout, shape, method)
+
     def get_cutout(self, token, channel,
                    x_start, x_stop,
                    y_start, y_stop,
@@ -220,12 +511,14 @@ class data(neuroRemote, metadata):
             block_size (int[3]): Block size of this dataset. If not provided,
                 ndio uses the metadata of this tokenchannel to set. If you find
                 that your downloads are timing out or otherwise failing, it may
-                be wise to start off by making this smaller.
+                be wise to start off by making this smaller. A fourth entry
+                sets how many timepoints each block spans (default 1).
             neariso (bool : False): Passes the 'neariso' param to the cutout.
                 If you don't know what this means, ignore it!
 
         Returns:
-            numpy.ndarray: Downloaded data.
+            numpy.ndarray: Downloaded data, in (x, y, z) order, or in
+                (x, y, z, t) order if more than one timepoint was requested.
         """
         if block_size is None:
             # look up block size from metadata
@@ -241,23 +534,68 @@ class data(neuroRemote, metadata):
 
         # Calculate size of the data to be downloaded.
         size = (x_stop - x_start) * (y_stop - y_start) * z_slices * 4
-
-        # Switch which download function to use based on which libraries are
-        # available in this version of python.
-        if six.PY2:
-            dl_func = self._get_cutout_blosc_no_chunking
-        elif six.PY3:
-            dl_func = self._get_cutout_no_chunking
-        else:
-            raise ValueError("Invalid Python version.")
-
-        if size < self._chunk_threshold:
+        timeseries = (t_stop - t_start) > 1
+        if timeseries:
+            size *= t_stop - t_start
+
+        dl_func = self._dl_func()
+
+        if self._block_cache is not None:
+            cube = self.get_block_size(token, resolution)
+            if block_size is DEFAULT_BLOCK_SIZE:
+                # Unless asked for other blocks, split the cutout along the
+                # dataset's cubes, so that the whole cubes inside it can be
+                # read from (and stored to) the cache.
+                block_size = cube
+            dl_func = self._cached_dl_func(dl_func, origin, cube)
+
+        if size < self._chunk_threshold and self._block_cache is None:
             vol = dl_func(token, channel, resolution,
                           x_start, x_stop,
                           y_start, y_stop,
                           z_start, z_stop,
                           t_start, t_stop,
                           neariso=neariso)
+            if timeseries:
+                # tzyx to xyzt
+                return numpy.transpose(vol)
+            if vol.ndim == 4:
+                # A single timepoint of a timeseries channel
+                vol = vol[0]
+            vol = numpy.rollaxis(vol, 1)
+            vol = numpy.rollaxis(vol, 2)
+            return vol
+        elif timeseries:
+            from ndio.utils.planner import iter_blocks
+            t_block = block_size[3] if len(block_size) > 3 else 1
+            blocks = [b.bounds for b in iter_blocks(
+                (x_start, y_start, z_start, t_start),
+                (x_stop, y_stop, z_stop, t_stop),
+                tuple(origin) + (0,),
+                tuple(block_size[:3]) + (t_block,))]
+
+            vol = self._get_cutout_with_chunking(dl_func, blocks,
+                                                 token, channel, resolution,
+                                                 x_start, x_stop,
+                                                 y_start, y_stop,
+                                                 z_start, z_stop,
+                                                 t_start, t_stop,
+                                                 neariso=neariso)
+            return numpy.transpose(vol)
+        elif self._tuner is not None and self._block_cache is None:
+            blocks = (b.bounds for b in self._tuner.iter_blocks(
+                (x_start, y_start, z_start), (x_stop, y_stop, z_stop),
+                origin, self.get_block_size(token, resolution),
+                initial=block_size))
+
+            vol = self._get_cutout_with_chunking(dl_func, blocks,
+                                                 token, channel, resolution,
+                                                 x_start, x_stop,
+                                                 y_start, y_stop,
+                                                 z_start, z_stop,
+                                                 neariso=neariso,
+                                                 t_range=(t_start, t_stop))
+
             vol = numpy.rollaxis(vol, 1)
             vol = numpy.rollaxis(vol, 2)
             return vol
@@ -268,67 +606,837 @@ class data(neuroRemote, metadata):
                                    z_start, z_stop,
                                    origin, block_size)
 
-            vol = numpy.zeros(((z_stop - z_start),
-                               (y_stop - y_start),
-                               (x_stop - x_start)))
-            for b in blocks:
+            vol = self._get_cutout_with_chunking(dl_func, blocks,
+                                                 token, channel, resolution,
+                                                 x_start, x_stop,
+                                                 y_start, y_stop,
+                                                 z_start, z_stop,
+                                                 neariso=neariso,
+                                                 t_range=(t_start, t_stop))
+
+            vol = numpy.rollaxis(vol, 1)
+            vol = numpy.rollaxis(vol, 2)
+            return vol
+
+    def get_cutouts(self, token, channels,
+                    x_start, x_stop,
+                    y_start, y_stop,
+                    z_start, z_stop,
+                    resolution=1,
+                    block_size=DEFAULT_BLOCK_SIZE,
+                    neariso=False,
+                    stack=False):
+        """
+        Get the same cutout from several channels of a token at once. The
+        cutout is planned once, and the blocks of every channel share one
+        pool of `max_workers` downloads, so the channels download side by
+        side instead of one after the other.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channels (str[]): The channels to download
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            resolution (int : 1): Resolution level
+            block_size (int[3]): As for `get_cutout`
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+            stack (bool : False): Return one (x, y, z, channel) array instead
+                of a dict. All of the channels must have the same datatype.
+
+        Returns:
+            dict: Each channel's cutout, in (x, y, z) order, by channel name
+                (or a numpy.ndarray, if `stack` is True)
+
+        Raises:
+            ValueError: if `stack` is True and the datatypes don't match.
+        """
+        info = self.get_proj_info(token)
+        dtypes = []
+        for channel in channels:
+            if channel not in info['channels']:
+                raise RemoteDataNotFoundError("Channel " + channel +
+                                              " is not available.")
+            dtypes.append(
+                numpy.dtype(info['channels'][channel]['datatype']))
+
+        shape = ((z_stop - z_start), (y_stop - y_start), (x_stop - x_start))
+        if stack:
+            if len(set(dtypes)) > 1:
+                raise ValueError("Can't stack channels with different "
+                                 "datatypes: {}.".format(
+                                     ", ".join(d.name for d in dtypes)))
+            stacked = numpy.zeros((len(channels),) + shape,
+                                  dtype=dtypes[0] if dtypes else 'uint8')
+            outs = dict(zip(channels, stacked))
+        else:
+            outs = dict((c, numpy.zeros(shape, dtype=d))
+                        for c, d in zip(channels, dtypes))
+
+        if block_size is None:
+            block_size = self.get_block_size(token, resolution)
+        origin = self.get_image_offset(token, resolution)
+        dl_func = self._dl_func()
+        if self._block_cache is not None:
+            cube = self.get_block_size(token, resolution)
+            if block_size is DEFAULT_BLOCK_SIZE:
+                block_size = cube
+            dl_func = self._cached_dl_func(dl_func, origin, cube)
+
+        size = (x_stop - x_start) * (y_stop - y_start) * \
+            max(z_stop - z_start, 16) * 4
+        if size < self._chunk_threshold and self._block_cache is None:
+            blocks = [((x_start, x_stop), (y_start, y_stop),
+                       (z_start, z_stop))]
+        else:
+            from ndio.utils.parallel import block_compute
+            blocks = block_compute(x_start, x_stop,
+                                   y_start, y_stop,
+                                   z_start, z_stop,
+                                   origin, block_size)
+
+        def fetch(channel, b):
+            dl_func(token, channel, resolution,
+                    b[0][0], b[0][1],
+                    b[1][0], b[1][1],
+                    b[2][0], b[2][1],
+                    0, 1,
+                    neariso=neariso,
+                    out=outs[channel][b[2][0] - z_start: b[2][1] - z_start,
+                                      b[1][0] - y_start: b[1][1] - y_start,
+                                      b[0][0] - x_start: b[0][1] - x_start])
+
+        # Channels are interleaved, so they all fill in at the same rate.
+        self._map_blocks(lambda task: fetch(*task),
+                         [(c, b) for b in blocks for c in channels],
+                         bounds=lambda task: task[1])
+
+        if stack:
+            # (channel, z, y, x) to (x, y, z, channel)
+            return numpy.transpose(stacked)
+        return dict((c, numpy.transpose(v)) for c, v in outs.items())
+
+    def get_sparse_cutout(self, token, channel,
+                          x_start, x_stop,
+                          y_start, y_stop,
+                          z_start, z_stop,
+                          resolution=1,
+                          block_size=None,
+                          neariso=False):
+        """
+        Get a cutout of a mostly empty channel (such as an annotation
+        channel) without ever holding it densely. It is downloaded block by
+        block, and each block is kept only if it has any non-zero voxels, so
+        memory grows with the labelled part of the cutout, not its size.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            resolution (int : 1): Resolution level
+            block_size (int[3] : None): The size of the blocks to download
+                and keep. Smaller blocks make the result sparser, but take
+                more requests. If None, uses the cube dimensions of the
+                dataset.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            ndio.remote.SparseCutout: The non-empty blocks, and an occupancy
+                mask of the block grid
+        """
+        from ndio.utils import planner
+        info = self.get_proj_info(token)
+        if channel not in info['channels']:
+            raise RemoteDataNotFoundError("Channel " + channel +
+                                          " is not available.")
+        dtype = info['channels'][channel]['datatype']
+        if block_size is None:
+            block_size = self.get_block_size(token, resolution)
+        origin = self.get_image_offset(token, resolution)
+
+        dl_func = self._dl_func()
+        if self._block_cache is not None:
+            dl_func = self._cached_dl_func(
+                dl_func, origin, self.get_block_size(token, resolution))
+
+        start = (x_start, y_start, z_start)
+        stop = (x_stop, y_stop, z_stop)
+        sparse = SparseCutout(list(zip(start, stop)), dtype,
+                              planner.plan_edges(start, stop,
+                                                 origin, block_size))
+        lock = threading.Lock()
+
+        def fetch(b):
+            data = dl_func(token, channel, resolution,
+                           b[0][0], b[0][1],
+                           b[1][0], b[1][1],
+                           b[2][0], b[2][1],
+                           0, 1,
+                           neariso=neariso)
+            if data.ndim == 4:
+                data = data[0]
+            if data.any():
+                block = numpy.ascontiguousarray(numpy.transpose(data))
+                with lock:
+                    sparse.add(b, block)
+
+        self._map_blocks(fetch, [b.bounds for b in planner.iter_blocks(
+            start, stop, origin, block_size)])
+        return sparse
+
+    def iter_timepoints(self, token, channel,
+                        x_start, x_stop,
+                        y_start, y_stop,
+                        z_start, z_stop,
+                        t_start, t_stop,
+                        t_batch=1,
+                        resolution=1,
+                        block_size=DEFAULT_BLOCK_SIZE,
+                        read_ahead=1,
+                        neariso=False):
+        """
+        Download a timeseries a few timepoints at a time, yielding each batch
+        of frames as soon as it is ready, so that a long movie can be
+        processed without holding all of it. The next `read_ahead` batches
+        are downloaded while the consumer works on the current one.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            t_batch (int : 1): How many timepoints to yield at a time
+            resolution (int : 1): Resolution level
+            block_size (int[3]): As for `get_cutout`, for each batch
+            read_ahead (int : 1): How many batches to download ahead of the
+                consumer
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            generator: of (t_start, t_stop, numpy.ndarray) for each batch.
+                The arrays are in (x, y, z, t) order, even for a batch of
+                one timepoint.
+        """
+        if t_batch < 1:
+            raise ValueError("t_batch must be at least 1.")
+
+        def fetch(t0, t1):
+            vol = self.get_cutout(token, channel,
+                                  x_start, x_stop,
+                                  y_start, y_stop,
+                                  z_start, z_stop,
+                                  t0, t1,
+                                  resolution=resolution,
+                                  block_size=block_size,
+                                  neariso=neariso)
+            if vol.ndim == 3:
+                vol = vol[..., numpy.newaxis]
+            return t0, t1, vol
+
+        batches = ((t, min(t + t_batch, t_stop))
+                   for t in range(t_start, t_stop, t_batch))
+        executor = ThreadPoolExecutor(max(1, read_ahead))
+        pending = collections.deque()
+        try:
+            for t0, t1 in itertools.islice(batches, max(1, read_ahead)):
+                pending.append(executor.submit(fetch, t0, t1))
+
+            while pending:
+                result = pending.popleft().result()
+                for t0, t1 in itertools.islice(batches, 1):
+                    pending.append(executor.submit(fetch, t0, t1))
+                yield result
+        finally:
+            for f in pending:
+                f.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_cutout_blocks(self, token, channel, bbox,
+                           resolution=1,
+                           block_shape=DEFAULT_BLOCK_SIZE,
+                           order='zyx',
+                           read_ahead=None,
+                           neariso=False):
+        """
+        Download a cutout one block at a time, yielding each block as soon as
+        it is ready instead of assembling the whole volume. At most
+        `read_ahead` blocks are downloaded or held at once, so this can walk
+        volumes much larger than memory.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            bbox (tuple): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the whole cutout
+            resolution (int : 1): Resolution level
+            block_shape (int[3]): The xyz size of the blocks to download. If
+                None, uses the cube dimensions of the dataset.
+            order (str : 'zyx'): The order to yield blocks in. 'zyx' walks z
+                slowest (slab by slab) and 'xyz' walks x slowest. 'arrival'
+                yields blocks in whatever order they finish downloading.
+            read_ahead (int : None): The most blocks to download ahead of the
+                consumer. Defaults to twice `max_workers`.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            generator: of (bbox, numpy.ndarray) pairs. Each array is in
+                (x, y, z) order, like `get_cutout`.
+        """
+        if order not in ('zyx', 'xyz', 'arrival'):
+            raise ValueError("order must be 'zyx', 'xyz' or 'arrival'.")
+
+        (x_start, x_stop), (y_start, y_stop), (z_start, z_stop) = bbox
+        if block_shape is None:
+            block_shape = self.get_block_size(token, resolution)
+        origin = self.get_image_offset(token, resolution)
+
+        dl_func = self._dl_func()
+        if self._block_cache is not None:
+            dl_func = self._cached_dl_func(
+                dl_func, origin, self.get_block_size(token, resolution))
+
+        # Blocks are planned as they are needed, so that a huge cutout
+        # doesn't have to be planned before its first block is fetched.
+        from ndio.utils import planner
+        start = (x_start, y_start, z_start)
+        stop = (x_stop, y_stop, z_stop)
+        if order == 'xyz':
+            blocks = (b.bounds for b in planner.iter_blocks(
+                start, stop, origin, block_shape[:3]))
+        else:
+            blocks = (b.bounds[::-1] for b in planner.iter_blocks(
+                start[::-1], stop[::-1], origin[::-1], block_shape[2::-1]))
+
+        def fetch(b):
+            data = dl_func(token, channel, resolution,
+                           b[0][0], b[0][1],
+                           b[1][0], b[1][1],
+                           b[2][0], b[2][1],
+                           0, 1,
+                           neariso=neariso)
+            if data.ndim == 4:
+                # The first timepoint of a timeseries channel
+                data = data[0]
+            return b, data.transpose()
+
+        read_ahead = read_ahead or 2 * self._max_workers
+        executor = ThreadPoolExecutor(max(1, self._max_workers))
+        pending = collections.deque()
+        blocks = iter(blocks)
+        try:
+            for b in itertools.islice(blocks, read_ahead):
+                pending.append(executor.submit(fetch, b))
+
+            while pending:
+                if order == 'arrival':
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    f = done.pop()
+                    pending.remove(f)
+                else:
+                    f = pending.popleft()
+                result = f.result()
+                # Free this slot before handing the block to the consumer.
+                for b in itertools.islice(blocks, 1):
+                    pending.append(executor.submit(fetch, b))
+                yield result
+        finally:
+            for f in pending:
+                f.cancel()
+            executor.shutdown(wait=False)
+
+    def _dl_func(self, shared=True):
+        """
+        Get the no-chunking download function for the cutout format this
+        remote uses.
+
+        Arguments:
+            shared (bool : True): Whether to share (and merge) requests
+                with other threads, if this remote does
+
+        Returns:
+            function: The download function
+        """
+        if self._codec == cutout_codecs.BLOSC:
+            dl_func = self._get_cutout_blosc_no_chunking
+        elif self._codec == cutout_codecs.HDF5:
+            dl_func = self._get_cutout_no_chunking
+        elif self._codec is None:
+            dl_func = self._get_cutout_negotiated
+        else:
+            raise ValueError("Invalid codec {}.".format(self._codec))
+        if shared and self._inflight is not None:
+            return self._inflight.wrap(dl_func)
+        return dl_func
+
+    def _cached_dl_func(self, dl_func, origin, block_size):
+        """
+        Wrap a no-chunking download function so that it reads whole,
+        cube-aligned blocks from the block cache, and stores them there
+        after a miss. Any other block is passed straight to `dl_func`.
+
+        Arguments:
+            dl_func (function): The no-chunking download function to wrap
+            origin (int[3]): The image offset of the dataset
+            block_size (int[3]): The cube dimensions of the dataset
+
+        Returns:
+            function: A function with the same signature as `dl_func`
+        """
+        cache = self._block_cache
+
+        def cached(token, channel, resolution,
+                   x_start, x_stop, y_start, y_stop,
+                   z_start, z_stop, t_start, t_stop,
+                   neariso=False, out=None):
+            bounds = ((x_start, x_stop), (y_start, y_stop), (z_start, z_stop))
+            aligned = all(
+                (b[1] - b[0]) == bs and (b[0] - o) % bs == 0
+                for b, o, bs in zip(bounds, origin, block_size)
+            )
+            if not aligned or t_stop - t_start != 1:
+                return dl_func(token, channel, resolution,
+                               x_start, x_stop, y_start, y_stop,
+                               z_start, z_stop, t_start, t_stop,
+                               neariso=neariso, out=out)
+
+            key = self._cache_key(token, channel, resolution, bounds,
+                                  t_start, neariso)
+            data = cache.get(key)
+            if data is None:
+                data = dl_func(token, channel, resolution,
+                               x_start, x_stop, y_start, y_stop,
+                               z_start, z_stop, t_start, t_stop,
+                               neariso=neariso, out=out)
+                cache.put(key, data)
+            elif out is not None:
+                with span(self._tracer, 'assemble'):
+                    out[...] = data.reshape(out.shape)
+                return out
+            return data
+
+        return cached
+
+    def _cache_key(self, token, channel, resolution, bounds, t, neariso):
+        if t != 0:
+            bounds += ((t, t + 1),)
+        return self._block_cache.key(self.hostname, token, channel,
+                                     resolution, bounds, neariso)
+
+    def _invalidate_cached(self, token, channel, resolution, start, stop,
+                           t_start=None, t_stop=None):
+        """
+        Drop every cached cube that overlaps a box, after uploading to it.
+
+        Arguments:
+            token (str)
+            channel (str)
+            resolution (int)
+            start (int[3]): The lower xyz corner of the box
+            stop (int[3]): The upper xyz corner of the box (exclusive)
+            t_start (int : None): The first timepoint of the box, or None if
+                it isn't a timeseries
+            t_stop (int : None): The last timepoint (exclusive)
 
+        Returns:
+            None
+        """
+        if self._block_cache is None:
+            return
+        origin = self.get_image_offset(token, resolution)
+        cube = self.get_block_size(token, resolution)
+        axes = []
+        for lo, hi, o, c in zip(start, stop, origin, cube):
+            first = o + (lo - o) // c * c
+            axes.append([(e, e + c) for e in range(first, hi, c)])
+        times = range(t_start, t_stop) if t_start is not None else [0]
+        for bounds in itertools.product(*axes):
+            for t in times:
+                for neariso in (False, True):
+                    self._block_cache.remove(self._cache_key(
+                        token, channel, resolution, bounds, t, neariso))
+
+    def _get_cutout_with_chunking(self, dl_func, blocks,
+                                  token, channel, resolution,
+                                  x_start, x_stop, y_start, y_stop,
+                                  z_start, z_stop,
+                                  t_start=None, t_stop=None,
+                                  neariso=False,
+                                  out=None, on_block=None,
+                                  t_range=(0, 1)):
+        """
+        Download a list of blocks (as returned by `block_compute`) with up to
+        `max_workers` requests at a time, and write each one into its place in
+        a zyx volume as soon as it arrives.
+
+        If `t_start` and `t_stop` are given, the blocks are (x, y, z, t)
+        blocks, and the volume is a tzyx timeseries instead.
+
+        Arguments:
+            dl_func (function): The no-chunking download function to use
+            blocks (list): The blocks to download
+            token (str): Token to identify data to download
+            channel (str): Channel
+            resolution (int): Resolution level
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+            out (array : None): A zyx-indexed array to write the blocks into
+                (for instance, a transposed `numpy.memmap`). If None, a new
+                array is allocated.
+            on_block (function : None): Called with each block once it has
+                been written into the volume
+            t_range (tuple : (0, 1)): The (start, stop) timepoint to
+                download (x, y, z) blocks at
+
+        Returns:
+            numpy.ndarray: The assembled volume, in zyx (or tzyx) order.
+        """
+        timeseries = t_start is not None
+        shape = ((z_stop - z_start), (y_stop - y_start), (x_stop - x_start))
+        if timeseries:
+            shape = (t_stop - t_start,) + shape
+        # Blocks are decoded straight into their place in the output, so
+        # it is allocated up front with the channel's datatype. If that
+        # isn't known, it is allocated by whichever block lands first, so
+        # that it takes the dtype of the downloaded data.
+        vol = out
+        if vol is None:
+            channels = self.get_proj_info(token).get('channels', {})
+            if channel in channels:
+                vol = numpy.zeros(shape,
+                                  dtype=channels[channel]['datatype'])
+        out = {} if vol is None else {'vol': vol}
+        out_lock = threading.Lock()
+
+        def fetch(b):
+            t = b[3] if timeseries else t_range
+            index = (slice(b[2][0] - z_start, b[2][1] - z_start),
+                     slice(b[1][0] - y_start, b[1][1] - y_start),
+                     slice(b[0][0] - x_start, b[0][1] - x_start))
+            if timeseries:
+                index = (slice(t[0] - t_start, t[1] - t_start),) + index
+
+            if isinstance(out.get('vol'), numpy.ndarray):
+                # Blocks never overlap, so they can be written without the
+                # lock. The decoders reshape each block to fit its place, so
+                # a (1, z, y, x) timepoint lands in a zyx volume as is.
+                dl_func(token, channel, resolution,
+                        b[0][0], b[0][1],
+                        b[1][0], b[1][1],
+                        b[2][0], b[2][1],
+                        t[0], t[1],
+                        neariso=neariso, out=out['vol'][index])
+            else:
                 data = dl_func(token, channel, resolution,
                                b[0][0], b[0][1],
                                b[1][0], b[1][1],
                                b[2][0], b[2][1],
-                               0, 1,
+                               t[0], t[1],
                                neariso=neariso)
+                with out_lock:
+                    if 'vol' not in out:
+                        out['vol'] = numpy.zeros(shape, dtype=data.dtype)
+                # Make the block's shape match its place in the output: a
+                # single timepoint of a timeseries channel comes back tzyx.
+                if timeseries and data.ndim == 3:
+                    data = data[numpy.newaxis]
+                elif not timeseries and data.ndim == 4:
+                    data = data[0]
+                with span(self._tracer, 'assemble'):
+                    out['vol'][index] = data
+            if on_block is not None:
+                on_block(b)
+
+        self._map_blocks(fetch, blocks)
+
+        if 'vol' not in out:
+            return numpy.zeros(shape)
+        return out['vol']
+
+    def _map_blocks(self, func, blocks, bounds=None):
+        """
+        Call `func` on every block, with up to `max_workers` calls at a time.
+        If any call fails, the blocks that haven't started are cancelled and
+        the error is raised.
 
-                if b == blocks[0]:  # first block
-                    vol = numpy.zeros(((z_stop - z_start),
-                                       (y_stop - y_start),
-                                       (x_stop - x_start)), dtype=data.dtype)
+        Arguments:
+            func (function): Called with each block
+            blocks (list): The blocks
+            bounds (function : None): Gets the bounds of a block, if the
+                blocks aren't bounds themselves
 
-                vol[b[2][0] - z_start: b[2][1] - z_start,
-                    b[1][0] - y_start: b[1][1] - y_start,
-                    b[0][0] - x_start: b[0][1] - x_start] = data
+        Returns:
+            None
+        """
+        if self._tuner is not None:
+            return self._map_blocks_adaptive(func, blocks, bounds)
+        if self._max_workers <= 1 or len(blocks) <= 1:
+            for b in blocks:
+                func(b)
+            return
+
+        with ThreadPoolExecutor(self._max_workers) as executor:
+            futures = [executor.submit(func, b) for b in blocks]
+            try:
+                for f in as_completed(futures):
+                    f.result()
+            except Exception:
+                for f in futures:
+                    f.cancel()
+                raise
+
+    def _map_blocks_adaptive(self, func, blocks, bounds=None):
+        """
+        `_map_blocks`, with as many calls at a time as the tuner allows.
+        Each block is taken from `blocks` only once there is room for it,
+        so blocks planned by the tuner get the size it picked last.
 
-            vol = numpy.rollaxis(vol, 1)
-            vol = numpy.rollaxis(vol, 2)
-            return vol
+        Arguments:
+            (as for `_map_blocks`, but `blocks` may be any iterable)
 
-    def _get_cutout_no_chunking(self, token, channel, resolution,
-                                x_start, x_stop, y_start, y_stop,
-                                z_start, z_stop, t_start, t_stop,
-                                neariso=False):
-        url = self.url() + "{}/{}/hdf5/{}/{},{}/{},{}/{},{}/{},{}".format(
-            token, channel, resolution,
-            x_start, x_stop,
-            y_start, y_stop,
-            z_start, z_stop,
-            t_start, t_stop,
-        )
+        Returns:
+            None
+        """
+        tuner = self._tuner
+
+        def timed(b):
+            started = time.time()
+            try:
+                func(b)
+            except Exception:
+                tuner.release()
+                raise
+            tuner.release(bounds(b) if bounds else b, time.time() - started)
+
+        running = set()
+        with ThreadPoolExecutor(tuner.max_workers) as executor:
+            try:
+                for b in blocks:
+                    tuner.acquire()
+                    running.add(executor.submit(timed, b))
+                    for f in [f for f in running if f.done()]:
+                        running.discard(f)
+                        f.result()
+                for f in as_completed(running):
+                    f.result()
+            except Exception:
+                for f in running:
+                    if f.cancel():
+                        tuner.release()
+                raise
+
+    def download_to_file(self, token, channel,
+                         x_start, x_stop,
+                         y_start, y_stop,
+                         z_start, z_stop,
+                         filename,
+                         resolution=1,
+                         block_size=DEFAULT_BLOCK_SIZE,
+                         neariso=False,
+                         file_format=None,
+                         dataset_name='CUTOUT',
+                         manifest=None):
+        """
+        Download a cutout straight into a file, one block at a time, so that
+        cutouts much larger than memory can be downloaded. The file holds the
+        data in (x, y, z) order, like `get_cutout` returns it.
 
-        if neariso:
-            url += "neariso/"
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            filename (str): The file to write to. It is overwritten, unless
+                the download is being resumed.
+            resolution (int : 1): Resolution level
+            block_size (int[3]): The xyz size of the blocks to download. If
+                None, uses the cube dimensions of the dataset.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+            file_format (str : None): 'npy' for a numpy .npy file (open it
+                with `numpy.load(filename, mmap_mode='r')`), 'hdf5' for a
+                chunked HDF5 dataset, or 'raw' for a headerless
+                Fortran-ordered `numpy.memmap`. If None, it is guessed from
+                the extension of `filename` ('raw' if unrecognized).
+            dataset_name (str : 'CUTOUT'): The HDF5 dataset to write to
+            manifest (str : None): A file to record finished blocks in. If
+                the download is interrupted, calling `download_to_file` again
+                with the same arguments downloads only the missing blocks.
+                The manifest is deleted once the download is complete.
 
-        req = self.remote_utils.get_url(url)
-        if req.status_code is not 200:
-            raise IOError("Bad server response for {}: {}: {}".format(
-                          url,
-                          req.status_code,
-                          req.text))
+        Returns:
+            str: The filename
+        """
+        filename = os.path.expanduser(filename)
+        if file_format is None:
+            ext = os.path.splitext(filename)[1].lower()
+            file_format = {
+                '.npy': 'npy',
+                '.h5': 'hdf5',
+                '.hdf5': 'hdf5'
+            }.get(ext, 'raw')
+
+        if block_size is None:
+            block_size = self.get_block_size(token, resolution)
+        origin = self.get_image_offset(token, resolution)
+        dtype = numpy.dtype(
+            self.get_proj_info(token)['channels'][channel]['datatype'])
+        shape = ((x_stop - x_start), (y_stop - y_start), (z_stop - z_start))
+
+        from ndio.utils.parallel import block_compute
+        blocks = block_compute(x_start, x_stop,
+                               y_start, y_stop,
+                               z_start, z_stop,
+                               origin, block_size)
+
+        if file_format not in ('npy', 'hdf5', 'raw'):
+            raise ValueError("file_format must be 'npy', 'hdf5' or 'raw'.")
+
+        progress = None
+        if manifest is not None:
+            transfer = {
+                'download': self.url(),
+                'token': token,
+                'channel': channel,
+                'resolution': resolution,
+                'bounds': [[x_start, x_stop],
+                           [y_start, y_stop],
+                           [z_start, z_stop]],
+                'origin': list(origin),
+                'block_size': list(block_size),
+                'neariso': neariso,
+                'filename': os.path.abspath(filename),
+                'file_format': file_format,
+                'dataset_name': dataset_name
+            }
+            progress = TransferManifest(manifest, transfer)
+            if progress.resumed and not os.path.exists(filename):
+                # The blocks it lists went down with the file.
+                progress.remove()
+                progress = TransferManifest(manifest, transfer)
+
+        resume = progress is not None and progress.resumed
+        if progress is not None:
+            blocks = progress.pending(blocks)
+
+        def download(out, flush=None):
+            done = None
+            if progress is not None:
+                def done(b):
+                    if flush is not None:
+                        flush()
+                    progress.mark(b)
+
+            self._get_cutout_with_chunking(self._dl_func(), blocks,
+                                           token, channel, resolution,
+                                           x_start, x_stop,
+                                           y_start, y_stop,
+                                           z_start, z_stop,
+                                           neariso=neariso, out=out,
+                                           on_block=done)
+
+        mode = 'r+' if resume else 'w+'
+        if file_format == 'npy':
+            # A Fortran-ordered xyz array is laid out exactly like the
+            # C-ordered zyx blocks we download, so they go in without copies.
+            mm = numpy.lib.format.open_memmap(filename, mode=mode,
+                                              dtype=dtype, shape=shape,
+                                              fortran_order=True)
+            download(mm.T)
+            mm.flush()
+            del mm
+        elif file_format == 'raw':
+            mm = numpy.memmap(filename, mode=mode, dtype=dtype, shape=shape,
+                              order='F')
+            download(mm.T)
+            mm.flush()
+            del mm
+        else:
+            chunks = tuple(min(b, n) for b, n in zip(block_size, shape))
+            with h5py.File(filename, 'a' if resume else 'w') as h5file:
+                if resume:
+                    dset = h5file[dataset_name]
+                else:
+                    dset = h5file.create_dataset(dataset_name, shape=shape,
+                                                 dtype=dtype, chunks=chunks)
+                download(_zyx_view(dset), flush=h5file.flush)
+
+        if progress is not None:
+            progress.remove()
+        return filename
 
-        with tempfile.NamedTemporaryFile() as tmpfile:
-            tmpfile.write(req.content)
-            tmpfile.seek(0)
-            h5file = h5py.File(tmpfile.name, "r")
-            return h5file.get(channel).get('CUTOUT')[:]
-        raise IOError("Failed to make tempfile.")
+    def _get_cutout_no_chunking(self, token, channel, resolution,
+                                x_start, x_stop, y_start, y_stop,
+                                z_start, z_stop, t_start, t_stop,
+                                neariso=False, out=None):
+        return self._get_cutout_encoded(cutout_codecs.HDF5,
+                                        token, channel, resolution,
+                                        x_start, x_stop, y_start, y_stop,
+                                        z_start, z_stop, t_start, t_stop,
+                                        neariso=neariso, out=out)
 
     def _get_cutout_blosc_no_chunking(self, token, channel, resolution,
                                       x_start, x_stop, y_start, y_stop,
                                       z_start, z_stop, t_start, t_stop,
-                                      neariso=False):
+                                      neariso=False, out=None):
+        return self._get_cutout_encoded(cutout_codecs.BLOSC,
+                                        token, channel, resolution,
+                                        x_start, x_stop, y_start, y_stop,
+                                        z_start, z_stop, t_start, t_stop,
+                                        neariso=neariso, out=out)
+
+    def _get_cutout_negotiated(self, token, channel, resolution,
+                               x_start, x_stop, y_start, y_stop,
+                               z_start, z_stop, t_start, t_stop,
+                               neariso=False, out=None):
+        """
+        Download a cutout as blosc if this server and python can handle it,
+        falling back to HDF5 otherwise. Whichever works first is used for
+        every later cutout from this remote.
+        """
+        args = (token, channel, resolution,
+                x_start, x_stop, y_start, y_stop,
+                z_start, z_stop, t_start, t_stop)
+        if self._codec is not None:
+            return self._dl_func(shared=False)(*args, neariso=neariso,
+                                               out=out)
+
+        try:
+            vol = self._get_cutout_blosc_no_chunking(*args, neariso=neariso,
+                                                     out=out)
+        except Exception as e:
+            # Anything else (a bad token, bounds or key, or a server that is
+            # down) would fail as HDF5 too.
+            if not cutout_codecs.unsupported(e):
+                raise
+            vol = self._get_cutout_no_chunking(*args, neariso=neariso,
+                                               out=out)
+            self._codec = cutout_codecs.HDF5
+            return vol
+
+        self._codec = cutout_codecs.BLOSC
+        return vol
 
-        url = self.url() + "{}/{}/blosc/{}/{},{}/{},{}/{},{}/{},{}/".format(
-            token, channel, resolution,
+    def _cutout_url(self, codec, token, channel, resolution,
+                    x_start, x_stop, y_start, y_stop,
+                    z_start, z_stop, t_start, t_stop,
+                    neariso=False):
+        """
+        Get the url to download a cutout from, in the given format.
+
+        Arguments:
+            codec (str): 'blosc' or 'hdf5'
+            (all others as in `get_cutout`)
+
+        Returns:
+            str: The url
+        """
+        url = self.url() + "{}/{}/{}/{}/{},{}/{},{}/{},{}/{},{}/".format(
+            token, channel, codec, resolution,
             x_start, x_stop,
             y_start, y_stop,
             z_start, z_stop,
@@ -337,18 +1445,62 @@ class data(neuroRemote, metadata):
 
         if neariso:
             url += "neariso/"
+        return url
 
-        req = self.remote_utils.get_url(url)
-        if req.status_code is not 200:
-            raise IOError("Bad server response for {}: {}: {}".format(
-                          url,
-                          req.status_code,
-                          req.text))
+    def _get_cutout_encoded(self, codec, token, channel, resolution,
+                            x_start, x_stop, y_start, y_stop,
+                            z_start, z_stop, t_start, t_stop,
+                            neariso=False, out=None):
+        """
+        Download a cutout in one request, in the given format, and decode it
+        in memory.
 
-        # This will need modification for >3D blocks
-        return blosc.unpack_array(req.content)[0]
+        Arguments:
+            codec (str): 'blosc' or 'hdf5'
+            out (numpy.ndarray : None): A zyx (or tzyx) array to decode the
+                cutout straight into, such as its slab of a larger volume
+            (all others as in `get_cutout`)
 
-        raise IOError("Failed to retrieve blosc cutout.")
+        Returns:
+            numpy.ndarray: The cutout, in zyx order (`out`, if given)
+        """
+        url = self._cutout_url(codec, token, channel, resolution,
+                               x_start, x_stop, y_start, y_stop,
+                               z_start, z_stop, t_start, t_stop,
+                               neariso=neariso)
+        attempts = [0]
+
+        def fetch():
+            attempts[0] += 1
+            req = self.remote_utils.get_url(url)
+            if req.status_code is not 200:
+                raise status_error(IOError,
+                                   "Bad server response for {}: {}: {}".format(
+                                       url,
+                                       req.status_code,
+                                       req.text),
+                                   req.status_code)
+            return req.content
+
+        tracer = self._tracer
+        with span(tracer, 'download', codec=codec,
+                  template=tracer and url_template(url)) as event:
+            try:
+                content = self._retry.call(fetch)
+            finally:
+                event['retries'] = attempts[0] - 1
+            event['bytes_received'] = len(content)
+            with span(tracer, 'decode', codec=codec,
+                      bytes_received=len(content)):
+                try:
+                    if out is not None:
+                        return cutout_codecs.DECODERS_INTO[codec](
+                            content, channel, out)
+                    return cutout_codecs.DECODERS[codec](content, channel)
+                except Exception as e:
+                    six.raise_from(cutout_codecs.DecodeError(
+                        "Couldn't decode the {} cutout from {}: {}".format(
+                            codec, url, e)), e)
 
     # SECTION:
     # Data Upload
@@ -358,7 +1510,11 @@ class data(neuroRemote, metadata):
                     y_start,
                     z_start,
                     data,
-                    resolution=0):
+                    resolution=0,
+                    block_size=DEFAULT_BLOCK_SIZE,
+                    manifest=None,
+                    t_start=0,
+                    skip_empty=False):
         """
         Post a cutout to the server.
 
@@ -368,8 +1524,25 @@ class data(neuroRemote, metadata):
             x_start (int)
             y_start (int)
             z_start (int)
-            data (numpy.ndarray): A numpy array of data. Pass in (x, y, z)
+            data (numpy.ndarray): A numpy array of data. Pass in (x, y, z),
+                or (x, y, z, t) for a timeseries channel
             resolution (int : 0): Resolution at which to insert the data
+            block_size (int[3]): The largest xyz block to upload in one
+                request, if `data` is too big to upload at once. It is
+                rounded down to a multiple of the dataset's cube dimensions,
+                so that every request covers whole cubes. If None, uses the
+                cube dimensions themselves. A fourth entry sets how many
+                timepoints each block spans (default 1).
+            manifest (str : None): A file to record uploaded blocks in. If
+                the upload is interrupted, calling `post_cutout` again with
+                the same arguments uploads only the missing blocks. The
+                manifest is deleted once the upload is complete.
+            t_start (int : 0): The first timepoint of (x, y, z, t) data
+            skip_empty (bool : False): Don't upload blocks that are all
+                zeros, which saves most of the requests and bytes of a
+                sparse annotation upload. What the server already has in
+                those blocks is left as it is. Use a small `block_size`
+                (such as None) to skip more.
 
         Returns:
             bool: True on success
@@ -381,68 +1554,219 @@ class data(neuroRemote, metadata):
         if data.dtype.name != datatype:
             data = data.astype(datatype)
 
-        data = numpy.rollaxis(data, 1)
-        data = numpy.rollaxis(data, 2)
+        if data.ndim == 4:
+            # xyzt to tzyx
+            data = numpy.transpose(data)
+        else:
+            data = numpy.rollaxis(data, 1)
+            data = numpy.rollaxis(data, 2)
+            t_start = None
 
         if six.PY3 or data.nbytes > 1.5e9:
-            ul_func = self._post_cutout_no_chunking_npz
+            codec = cutout_codecs.NPZ
         else:
-            ul_func = self._post_cutout_no_chunking_blosc
+            codec = cutout_codecs.BLOSC
 
-        if data.size < self._chunk_threshold:
-            return ul_func(token, channel, x_start,
-                           y_start, z_start, data,
-                           resolution)
+        if skip_empty and not data.any():
+            return True
+
+        # Even a failed upload may have written some of the cubes.
+        try:
+            return self._post_cutout(token, channel,
+                                     x_start, y_start, z_start, data,
+                                     resolution, block_size, manifest,
+                                     t_start, skip_empty, codec)
+        finally:
+            start = (x_start, y_start, z_start)
+            self._invalidate_cached(
+                token, channel, resolution, start,
+                [s + n for s, n in zip(start, data.shape[::-1])],
+                t_start,
+                None if t_start is None else t_start + data.shape[0])
+
+    def _post_cutout(self, token, channel, x_start, y_start, z_start, data,
+                     resolution, block_size, manifest, t_start, skip_empty,
+                     codec):
+        """
+        Upload a zyx (or tzyx) cutout for `post_cutout`, at once or in
+        blocks.
+        """
+        if data.size < self._chunk_threshold and manifest is None \
+                and not skip_empty:
+            return self._post_cutout_encoded(
+                codec, token, channel, x_start, y_start, z_start,
+                data.shape, self._encoder(codec)(data), resolution, t_start)
+
+        cube = self.get_block_size(token, resolution)
+        if block_size is None:
+            block_size = cube
+        t_block = block_size[3] if len(block_size) > 3 else 1
+        block_size = [max(c, (b // c) * c) for b, c in zip(block_size, cube)]
+        if t_start is not None:
+            block_size.append(t_block)
+        origin = self.get_image_offset(token, resolution)
 
-        return self._post_cutout_with_chunking(token, channel,
-                                               x_start, y_start, z_start, data,
-                                               resolution, ul_func)
+        progress = None
+        if manifest is not None:
+            # The data itself is too big to compare, so the manifest only
+            # trusts the caller to pass the same array again.
+            progress = TransferManifest(manifest, {
+                'upload': self.url(),
+                'token': token,
+                'channel': channel,
+                'resolution': resolution,
+                'start': [x_start, y_start, z_start, t_start],
+                'shape': list(data.shape[::-1]),
+                'dtype': data.dtype.name,
+                'origin': list(origin),
+                'block_size': list(block_size)
+            })
+
+        self._post_cutout_with_chunking(token, channel,
+                                        x_start, y_start, z_start, data,
+                                        resolution, codec,
+                                        origin, block_size,
+                                        progress, t_start, skip_empty)
+        if progress is not None:
+            progress.remove()
+        return True
 
     def _post_cutout_with_chunking(self, token, channel, x_start,
                                    y_start, z_start, data,
-                                   resolution, ul_func):
-        # must chunk first
-        from ndio.utils.parallel import block_compute
-        blocks = block_compute(x_start, x_start + data.shape[2],
-                               y_start, y_start + data.shape[1],
-                               z_start, z_start + data.shape[0])
-        for b in blocks:
-            # data coordinate relative to the size of the arra
-            subvol = data[b[2][0] - z_start: b[2][1] - z_start,
-                          b[1][0] - y_start: b[1][1] - y_start,
-                          b[0][0] - x_start: b[0][1] - x_start]
-            # upload the chunk:
-            # upload coordinate relative to x_start, y_start, z_start
-            ul_func(token, channel, b[0][0],
-                    b[1][0], b[2][0], subvol,
-                    resolution)
+                                   resolution, codec,
+                                   origin, block_size,
+                                   progress=None, t_start=None,
+                                   skip_empty=False):
+        """
+        Upload a zyx volume (or a tzyx timeseries, if `t_start` is given)
+        block by block. Blocks are compressed by one pool of `max_workers`
+        threads and posted by another, so compression and network transfer
+        overlap. At most twice `max_workers` blocks are held (compressed or
+        not) at a time, on top of `data` itself.
+
+        Arguments:
+            codec (str): The upload format, 'npz' or 'blosc'
+            origin (int[3]): The image offset of the dataset
+            block_size (int[3]): The xyz size of the blocks to upload, and
+                their length in t for a timeseries
+            progress (TransferManifest : None): Blocks already listed in it
+                are skipped, and uploaded blocks are added to it
+            t_start (int : None): The first timepoint of a timeseries
+            skip_empty (bool : False): Skip blocks that are all zeros
+            (all others as in `post_cutout`)
+
+        Returns:
+            bool: True on success
+
+        Raises:
+            RemoteDataUploadError: if any block fails to upload.
+        """
+        from ndio.utils.planner import iter_blocks
+        start = (x_start, y_start, z_start)
+        grid = tuple(origin)
+        if t_start is not None:
+            start += (t_start,)
+            grid += (0,)
+        stop = [a + n for a, n in zip(start, data.shape[::-1])]
+        tuner = self._tuner
+        if tuner is not None and t_start is None and progress is None:
+            # Blocks of other sizes wouldn't match a manifest.
+            blocks = tuner.iter_blocks(start, stop, grid,
+                                       self.get_block_size(token, resolution),
+                                       initial=block_size)
+        else:
+            tuner = None
+            blocks = iter_blocks(start, stop, grid, block_size)
+        if progress is not None:
+            blocks = (b for b in blocks if b.bounds not in progress)
+        encode = self._encoder(codec)
+        workers = max(1, self._max_workers)
+        slots = threading.BoundedSemaphore(2 * workers)
+        failed = threading.Event()
+
+        def post(b, shape, payload):
+            if tuner is not None:
+                tuner.acquire()
+            started = time.time()
+            try:
+                self._post_cutout_encoded(codec, token, channel,
+                                          b[0][0], b[1][0], b[2][0],
+                                          shape, payload, resolution,
+                                          b[3][0] if len(b) > 3 else None)
+                if progress is not None:
+                    progress.mark(b)
+            except Exception:
+                if tuner is not None:
+                    tuner.release()
+                failed.set()
+                raise
+            finally:
+                slots.release()
+            if tuner is not None:
+                tuner.release(b, time.time() - started)
+
+        def compress(b, subvol):
+            try:
+                payload = encode(subvol)
+            except Exception:
+                failed.set()
+                slots.release()
+                raise
+            return posters.submit(post, b.bounds, subvol.shape, payload)
+
+        queued = []
+        with ThreadPoolExecutor(workers) as compressors, \
+                ThreadPoolExecutor(workers) as posters:
+            for b in blocks:
+                # data coordinate relative to the size of the array
+                subvol = data[b.slices[::-1]]
+                if skip_empty and not subvol.any():
+                    continue
+                slots.acquire()
+                if failed.is_set():
+                    slots.release()
+                    break
+                queued.append(compressors.submit(compress, b, subvol))
+
+            for f in queued:
+                f.result().result()
         return True
 
-    def _post_cutout_no_chunking_npz(self, token, channel,
-                                     x_start, y_start, z_start,
-                                     data, resolution):
+    def _encoder(self, codec):
+        """
+        Get the function that encodes uploads in a format, with this
+        remote's options.
+
+        Arguments:
+            codec (str): 'npz' or 'blosc'
 
-        data = numpy.expand_dims(data, axis=0)
-        tempfile = BytesIO()
-        numpy.save(tempfile, data)
-        compressed = zlib.compress(tempfile.getvalue())
+        Returns:
+            function: Takes a zyx array and returns the request body
+        """
+        encode = cutout_codecs.ENCODERS[codec]
+        options = {}
+        if codec == cutout_codecs.BLOSC:
+            options = self._blosc_options
+        if self._tracer is None:
+            return lambda data: encode(data, **options)
 
-        url = self.url("{}/{}/npz/{}/{},{}/{},{}/{},{}/".format(
-            token, channel,
-            resolution,
-            x_start, x_start + data.shape[3],
-            y_start, y_start + data.shape[2],
-            z_start, z_start + data.shape[1]
-        ))
+        def traced(data):
+            with span(self._tracer, 'encode', codec=codec) as event:
+                payload = encode(data, **options)
+                event['bytes_sent'] = len(payload)
+                return payload
 
-        req = self.remote_utils.post_url(url, data=compressed, headers={
-            'Content-Type': 'application/octet-stream'
-        })
+        return traced
 
-        if req.status_code is not 200:
-            raise RemoteDataUploadError(req.text)
-        else:
-            return True
+    def _post_cutout_no_chunking_npz(self, token, channel,
+                                     x_start, y_start, z_start,
+                                     data, resolution):
+        return self._post_cutout_encoded(cutout_codecs.NPZ,
+                                         token, channel,
+                                         x_start, y_start, z_start,
+                                         data.shape,
+                                         cutout_codecs.encode_npz(data),
+                                         resolution)
 
     def _post_cutout_no_chunking_blosc(self, token, channel,
                                        x_start, y_start, z_start,
@@ -450,21 +1774,96 @@ class data(neuroRemote, metadata):
         """
         Accepts data in zyx. !!!
         """
-        data = numpy.expand_dims(data, axis=0)
-        blosc_data = blosc.pack_array(data)
-        url = self.url("{}/{}/blosc/{}/{},{}/{},{}/{},{}/0,0/".format(
-            token, channel,
+        return self._post_cutout_encoded(cutout_codecs.BLOSC,
+                                         token, channel,
+                                         x_start, y_start, z_start,
+                                         data.shape,
+                                         self._encoder(
+                                             cutout_codecs.BLOSC)(data),
+                                         resolution)
+
+    def _upload_url(self, codec, token, channel,
+                    x_start, y_start, z_start,
+                    shape, resolution, t_start=None):
+        """
+        Get the url to upload a cutout to, in the given format.
+
+        Arguments:
+            (as in `_post_cutout_encoded`)
+
+        Returns:
+            str: The url
+        """
+        url = self.url("{}/{}/{}/{}/{},{}/{},{}/{},{}/".format(
+            token, channel, codec,
             resolution,
-            x_start, x_start + data.shape[3],
-            y_start, y_start + data.shape[2],
-            z_start, z_start + data.shape[1]
+            x_start, x_start + shape[-1],
+            y_start, y_start + shape[-2],
+            z_start, z_start + shape[-3]
         ))
+        if t_start is not None:
+            url += "{},{}/".format(t_start, t_start + shape[0])
+        elif codec == cutout_codecs.BLOSC:
+            url += "0,0/"
+        return url
+
+    def _post_cutout_encoded(self, codec, token, channel,
+                             x_start, y_start, z_start,
+                             shape, payload, resolution,
+                             t_start=None):
+        """
+        Post one already-encoded cutout.
+
+        Arguments:
+            codec (str): The format of `payload`, 'npz' or 'blosc'
+            token (str)
+            channel (str)
+            x_start (int)
+            y_start (int)
+            z_start (int)
+            shape (int[3]): The zyx (or tzyx) shape of the cutout
+            payload (bytes): The encoded cutout
+            resolution (int): Resolution at which to insert the data
+            t_start (int : None): The first timepoint of a tzyx cutout
 
-        req = self.remote_utils.post_url(url, data=blosc_data, headers={
-            'Content-Type': 'application/octet-stream'
-        })
+        Returns:
+            bool: True on success
 
-        if req.status_code is not 200:
-            raise RemoteDataUploadError(req.text)
-        else:
+        Raises:
+            RemoteDataUploadError: if the server rejects the upload.
+        """
+        url = self._upload_url(codec, token, channel,
+                               x_start, y_start, z_start,
+                               shape, resolution, t_start)
+        attempts = [0]
+
+        def post():
+            attempts[0] += 1
+            req = self.remote_utils.post_url(url, data=payload, headers={
+                'Content-Type': 'application/octet-stream'
+            })
+            if req.status_code is not 200:
+                raise status_error(RemoteDataUploadError, req.text,
+                                   req.status_code)
             return True
+
+        with span(self._tracer, 'upload', codec=codec,
+                  template=self._tracer and url_template(url),
+                  bytes_sent=len(payload)) as event:
+            try:
+                return self._retry.call(post)
+            finally:
+                event['retries'] = attempts[0] - 1
+
+
+class _zyx_view(object):
+    """
+    Lets an xyz-ordered array-like (such as an h5py dataset) be written to
+    with zyx-ordered indices and blocks.
+    """
+
+    def __init__(self, xyz):
+        self._xyz = xyz
+
+    def __setitem__(self, key, value):
+        self._xyz[tuple(reversed(key))] = numpy.asarray(value).transpose()
@@ -0,0 +1,246 @@
+"""
+Share cutout requests between threads. While a block is being downloaded,
+another request for the same block (the same token, channel, resolution,
+bounds and timepoints) waits for that download instead of sending its own,
+and gets a copy of the result:
+
+    nd = neurodata(coalesce=0.005)
+    # Viewer threads asking for the same or neighbouring cubes now send
+    # one request between them.
+
+With `coalesce` set, a request for a small block also waits that many
+seconds for requests for neighbouring blocks. Blocks that line up along an
+axis (the same extent along the other two, and touching) are merged into
+one request, as long as it stays under `max_voxels`.
+"""
+from __future__ import absolute_import
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy
+
+
+class _request(object):
+    """
+    One block that is being downloaded, and the threads waiting for it.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.future = Future()
+        self.waiters = 0
+        self.released = threading.Event()
+        # Set when the block's batch has been planned: a merged box this
+        # request should download for the batch, or None to just wait.
+        self.planned = threading.Event()
+        self.task = None
+
+
+class InFlightRequests(object):
+    """
+    The requests a remote has in flight, keyed by what they are for.
+    """
+
+    def __init__(self, coalesce=None, max_voxels=None):
+        """
+        Arguments:
+            coalesce (float : None): Seconds for a small request to wait
+                for neighbours to merge with. If None, requests are only
+                shared, never merged.
+            max_voxels (int : None): The biggest merged request, in voxels
+        """
+        self.coalesce = coalesce
+        self.max_voxels = max_voxels
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._batches = {}
+        self.stats = {'requests': 0, 'shared': 0, 'merged': 0}
+
+    def wrap(self, dl_func):
+        """
+        Wrap a no-chunking download function so that its requests are
+        shared (and merged) through this table.
+
+        Arguments:
+            dl_func (function): The download function
+
+        Returns:
+            function: A function with the same signature as `dl_func`
+        """
+        def shared(token, channel, resolution,
+                   x_start, x_stop, y_start, y_stop,
+                   z_start, z_stop, t_start, t_stop,
+                   neariso=False, out=None):
+            return self.get(dl_func, token, channel, resolution,
+                            ((x_start, x_stop), (y_start, y_stop),
+                             (z_start, z_stop)),
+                            (t_start, t_stop), neariso, out)
+
+        return shared
+
+    def get(self, dl_func, token, channel, resolution, bounds, t,
+            neariso=False, out=None):
+        """
+        Download a block, or wait for the download of the same block that
+        is already in flight.
+
+        Arguments:
+            dl_func (function): The no-chunking download function
+            token (str)
+            channel (str)
+            resolution (int)
+            bounds (tuple[3]): The (start, stop) of the block along x, y
+                and z
+            t (tuple): The (start, stop) timepoints
+            neariso (bool : False)
+            out (numpy.ndarray : None): Where to decode the block, as for
+                `dl_func`
+
+        Returns:
+            numpy.ndarray: The block, in zyx order (`out`, if given)
+        """
+        group = (token, channel, resolution, t, neariso)
+        key = group + (bounds,)
+        with self._lock:
+            request = self._requests.get(key)
+            leader = request is None
+            if leader:
+                request = self._requests[key] = _request(bounds)
+                self.stats['requests'] += 1
+            else:
+                request.waiters += 1
+                self.stats['shared'] += 1
+
+        if not leader:
+            try:
+                return _copy(request.future.result(), out)
+            finally:
+                with self._lock:
+                    request.waiters -= 1
+                    if not request.waiters:
+                        request.released.set()
+
+        try:
+            if self._can_merge(bounds):
+                data = self._get_merged(dl_func, group, request)
+                data = _copy(data, out)
+            else:
+                data = dl_func(token, channel, resolution,
+                               bounds[0][0], bounds[0][1],
+                               bounds[1][0], bounds[1][1],
+                               bounds[2][0], bounds[2][1],
+                               t[0], t[1], neariso=neariso, out=out)
+            if not request.future.done():
+                request.future.set_result(data)
+            return data
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._requests[key]
+                waiting = request.waiters
+            # The waiters copy `data`, which may be the caller's `out`, so
+            # it can't be handed back until they are done.
+            if waiting:
+                request.released.wait()
+
+    def _can_merge(self, bounds):
+        if not self.coalesce:
+            return False
+        return self.max_voxels is None or \
+            2 * _voxels(bounds) <= self.max_voxels
+
+    def _get_merged(self, dl_func, group, request):
+        """
+        Wait for neighbouring requests, then download the merged boxes of
+        the batch this request ended up in.
+
+        Returns:
+            numpy.ndarray: The block of `request` (not a copy)
+        """
+        with self._lock:
+            batch = self._batches.get(group)
+            opener = batch is None
+            if opener:
+                batch = self._batches[group] = []
+            batch.append(request)
+
+        if opener:
+            time.sleep(self.coalesce)
+            with self._lock:
+                batch = self._batches.pop(group)
+            for box, members in _merge(batch, self.max_voxels):
+                if len(members) > 1:
+                    with self._lock:
+                        self.stats['merged'] += len(members)
+                members[0].task = (box, members)
+            for member in batch:
+                member.planned.set()
+
+        request.planned.wait()
+        if request.task is not None:
+            box, members = request.task
+            token, channel, resolution, t, neariso = group
+            try:
+                data = dl_func(token, channel, resolution,
+                               box[0][0], box[0][1],
+                               box[1][0], box[1][1],
+                               box[2][0], box[2][1],
+                               t[0], t[1], neariso=neariso)
+            except Exception as e:
+                for member in members:
+                    member.future.set_exception(e)
+                raise
+            for member in members:
+                member.future.set_result(data[(Ellipsis,) + tuple(
+                    slice(b[0] - a[0], b[1] - a[0])
+                    for a, b in zip(box[::-1], member.bounds[::-1]))])
+        return request.future.result()
+
+
+def _voxels(bounds):
+    return int(numpy.prod([b[1] - b[0] for b in bounds]))
+
+
+def _copy(data, out):
+    if out is None:
+        return data.copy()
+    out[...] = data.reshape(out.shape)
+    return out
+
+
+def _merge(requests, max_voxels=None):
+    """
+    Merge blocks that line up into bigger boxes, along x, then y, then z.
+
+    Arguments:
+        requests (list): The requests, with their `bounds`
+        max_voxels (int : None): The biggest box to make
+
+    Returns:
+        list: (box, requests) pairs, where the requests tile the box
+    """
+    boxes = [(r.bounds, [r]) for r in requests]
+    for axis in range(3):
+        def others(box):
+            return tuple(b for i, b in enumerate(box) if i != axis)
+
+        boxes.sort(key=lambda b: (others(b[0]), b[0][axis]))
+        merged = []
+        for box, members in boxes:
+            if merged:
+                last, last_members = merged[-1]
+                grown = tuple((last[i][0], box[i][1]) if i == axis
+                              else last[i] for i in range(3))
+                if others(last) == others(box) and \
+                        last[axis][1] == box[axis][0] and \
+                        (max_voxels is None or
+                         _voxels(grown) <= max_voxels):
+                    merged[-1] = (grown, last_members + members)
+                    continue
+            merged.append((box, members))
+        boxes = merged
+    return boxes
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+import json
+import os
+import threading
+
+
+class TransferManifest(object):
+    """
+    An on-disk record of which blocks of a long transfer have finished, so
+    that an interrupted transfer can be restarted without repeating them.
+
+    The manifest is a text file. Its first line describes the transfer (the
+    token, channel, bounds, block size and so on), and every later line is
+    one finished block. A block is recorded only once it has been written,
+    and each line is flushed to disk straight away, so after a crash the
+    manifest never claims more than was actually done. If the description
+    in an existing manifest doesn't match the transfer being started, the
+    manifest belongs to some other transfer and is started over.
+    """
+
+    def __init__(self, path, transfer):
+        """
+        Arguments:
+            path (str): The manifest file. It is created if it doesn't exist.
+            transfer (dict): A description of the transfer. Only manifests
+                written with an equal description are resumed.
+        """
+        self.path = os.path.expanduser(path)
+        self.transfer = json.loads(json.dumps(transfer))
+        self._done = set()
+        self._lock = threading.Lock()
+
+        resumed = False
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+            try:
+                resumed = bool(lines) and \
+                    json.loads(lines[0]) == self.transfer
+            except ValueError:
+                resumed = False
+            if resumed:
+                for line in lines[1:]:
+                    try:
+                        self._done.add(self._key(json.loads(line)))
+                    except ValueError:
+                        # The last line may have been cut off by a crash.
+                        break
+
+        if not resumed:
+            with open(self.path, 'w') as f:
+                f.write(json.dumps(self.transfer) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    @property
+    def resumed(self):
+        """
+        Whether any blocks were already done when the manifest was opened.
+        """
+        return len(self._done) > 0
+
+    def _key(self, block):
+        return tuple(tuple(int(i) for i in b) for b in block)
+
+    def __contains__(self, block):
+        """
+        Whether a block has been marked as transferred.
+        """
+        return self._key(block) in self._done
+
+    def __len__(self):
+        """
+        The number of blocks marked as transferred.
+        """
+        return len(self._done)
+
+    def pending(self, blocks):
+        """
+        Filter out the blocks that are already done.
+
+        Arguments:
+            blocks (list): Blocks, as returned by `block_compute`
+
+        Returns:
+            list: The blocks that still have to be transferred
+        """
+        return [b for b in blocks if b not in self]
+
+    def mark(self, block):
+        """
+        Record that a block is done.
+
+        Arguments:
+            block (tuple): The ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the block
+
+        Returns:
+            None
+        """
+        key = self._key(block)
+        with self._lock:
+            if key in self._done:
+                return
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(key) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._done.add(key)
+
+    def remove(self):
+        """
+        Delete the manifest, once the transfer is complete.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._done.clear()
@@ -17,12 +17,185 @@ from six.moves import range
 import six
 
 from functools import wraps
+import atexit
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     import urllib.request as urllib2
 except ImportError:
     import urllib2
 
+DEFAULT_INFO_TTL = 300
+DEFAULT_PREFETCH_WORKERS = 8
+DEFAULT_SAVE_INTERVAL = 5
+
+# os.replace overwrites atomically on every platform, but is Python 3 only.
+_replace = getattr(os, 'replace', os.rename)
+
+
+class InfoCache(object):
+    """
+    A thread-safe, in-memory cache of project info, keyed by info URL. Entries
+    expire `ttl` seconds after they are fetched. If `path` is given, the cache
+    is also saved to (and loaded from) that JSON file, so that it outlives
+    the process.
+
+    The file is written at most once every `save_interval` seconds (and when
+    the process exits, or on `flush`). Each write merges this cache's
+    changes into what is in the file, and replaces the file atomically, so
+    several processes can share one file without corrupting it or losing
+    each other's entries.
+    """
+
+    def __init__(self, ttl=DEFAULT_INFO_TTL, path=None,
+                 save_interval=DEFAULT_SAVE_INTERVAL):
+        """
+        Arguments:
+            ttl (float : 300): Seconds that an entry stays fresh. Use 0 to
+                turn caching off.
+            path (str : None): A JSON file to persist the cache to
+            save_interval (float : 5): The fewest seconds between writes of
+                the file. Use 0 to write it on every change.
+        """
+        self.ttl = ttl
+        self.path = path
+        self.save_interval = save_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Changes not yet written: key -> entry, or None if dropped.
+        self._changes = {}
+        self._cleared = False
+        self._last_save = 0
+        if path is not None:
+            self._entries = self._load()
+            atexit.register(self.flush)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            # A missing or corrupt cache file is just an empty cache.
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, key):
+        """
+        Get a fresh entry from the cache.
+
+        Arguments:
+            key (str): The info URL
+
+        Returns:
+            dict: A copy of the entry, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+        # Callers are free to modify what they get back.
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """
+        Add an entry to the cache.
+
+        Arguments:
+            key (str): The info URL
+            value (dict): The project info
+
+        Returns:
+            None
+        """
+        if not self.ttl:
+            return
+        entry = (time.time() + self.ttl, copy.deepcopy(value))
+        with self._lock:
+            self._entries[key] = entry
+            self._changes[key] = entry
+        self._save()
+
+    def invalidate(self, key=None):
+        """
+        Drop an entry from the cache, or every entry if `key` is None.
+
+        Arguments:
+            key (str : None): The info URL to drop
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if key is None:
+                self._entries = {}
+                self._changes = {}
+                self._cleared = True
+            else:
+                self._entries.pop(key, None)
+                self._changes[key] = None
+        # Dropped entries are written at once, so that other processes
+        # stop using them.
+        self.flush()
+
+    def _save(self):
+        if self.path is None or \
+                time.time() - self._last_save < self.save_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        """
+        Write any changes to the cache file now.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                changes, cleared = self._changes, self._cleared
+                self._changes, self._cleared = {}, False
+                self._last_save = time.time()
+            if not changes and not cleared:
+                return
+
+            entries = {} if cleared else self._load()
+            for key, entry in changes.items():
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+            now = time.time()
+            entries = dict((k, e) for k, e in entries.items() if e[0] >= now)
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entries, f)
+                _replace(tmp, self.path)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+
+# The cache shared by every remote that isn't given its own.
+default_info_cache = InfoCache()
+
 
 class metadata():
     """
@@ -54,41 +227,67 @@ class metadata():
         r = self.remote_utils.get_url(self.url() + "public_tokens/")
         return r.json()
 
-    def get_public_datasets(self):
+    def get_public_datasets(self, max_workers=DEFAULT_PREFETCH_WORKERS):
         """
-        NOTE: VERY SLOW!
         Get a list of public datasets. Different than public tokens!
 
+        This needs the project info of every public token. It is fetched
+        `max_workers` at a time, and cached (see `InfoCache`).
+
         Arguments:
-            None
+            max_workers (int : 8): The number of requests to make at a time
 
         Returns:
             str[]: list of public datasets
         """
-        return list(self.get_public_datasets_and_tokens().keys())
+        return list(self.get_public_datasets_and_tokens(max_workers).keys())
 
-    def get_public_datasets_and_tokens(self):
+    def get_public_datasets_and_tokens(self,
+                                       max_workers=DEFAULT_PREFETCH_WORKERS):
         """
-        NOTE: VERY SLOW!
         Get a dictionary relating key:dataset to value:[tokens] that rely
         on that dataset.
 
+        This needs the project info of every public token. It is fetched
+        `max_workers` at a time, and cached (see `InfoCache`).
+
         Arguments:
-            None
+            max_workers (int : 8): The number of requests to make at a time
 
         Returns:
             dict: relating key:dataset to value:[tokens]
         """
-        datasets = {}
         tokens = self.get_public_tokens()
+        found = dict((t, d) for d, t in
+                     self.iter_public_datasets_and_tokens(max_workers,
+                                                          tokens))
+        # Tokens are listed in the server's order, however they resolved.
+        datasets = {}
         for t in tokens:
-            dataset = self.get_token_dataset(t)
-            if dataset in datasets:
-                datasets[dataset].append(t)
-            else:
-                datasets[dataset] = [t]
+            datasets.setdefault(found[t], []).append(t)
         return datasets
 
+    def iter_public_datasets_and_tokens(self,
+                                        max_workers=DEFAULT_PREFETCH_WORKERS,
+                                        tokens=None):
+        """
+        Like `get_public_datasets_and_tokens`, but yield each public token
+        with its dataset as soon as its project info arrives, so a catalog
+        can be shown while the rest is still loading.
+
+        Arguments:
+            max_workers (int : 8): The number of requests to make at a time
+            tokens (str[] : None): The tokens to look up. Defaults to all of
+                the public tokens.
+
+        Returns:
+            generator: of (dataset, token) pairs, in no particular order
+        """
+        if tokens is None:
+            tokens = self.get_public_tokens()
+        for token, info in self.iter_proj_info(tokens, max_workers):
+            yield info['dataset']['description'], token
+
     def get_token_dataset(self, token):
         """
         Get the dataset for a given token.
@@ -101,18 +300,80 @@ class metadata():
         """
         return self.get_proj_info(token)['dataset']['description']
 
-    def get_proj_info(self, token):
+    def get_proj_info(self, token, refresh=False):
         """
-        Return the project info for a given token.
+        Return the project info for a given token. Project info is cached for
+        a few minutes (see `InfoCache`), so repeated calls are cheap.
 
         Arguments:
             token (str): Token to return information for
+            refresh (bool : False): Skip the cache and ask the server
 
         Returns:
             JSON: representation of proj_info
         """
-        r = self.remote_utils.get_url(self.url() + "{}/info/".format(token))
-        return r.json()
+        url = self._info_url(token)
+        cache = self._info_cache()
+        if not refresh:
+            info = cache.get(url)
+            if info is not None:
+                return info
+
+        r = self.remote_utils.get_url(url)
+        info = r.json()
+        if r.status_code == 200:
+            cache.set(url, info)
+        return info
+
+    def prefetch_proj_info(self, tokens, max_workers=DEFAULT_PREFETCH_WORKERS):
+        """
+        Fetch the project info for many tokens at once, filling the cache.
+
+        Arguments:
+            tokens (str[]): The tokens to fetch info for
+            max_workers (int : 8): The number of requests to make at a time
+
+        Returns:
+            dict: relating key:token to value:proj_info
+        """
+        return dict(self.iter_proj_info(tokens, max_workers))
+
+    def iter_proj_info(self, tokens, max_workers=DEFAULT_PREFETCH_WORKERS):
+        """
+        Fetch the project info for many tokens at once, yielding each as soon
+        as it arrives. Info that is already cached is yielded first, without
+        a request.
+
+        Arguments:
+            tokens (str[]): The tokens to fetch info for
+            max_workers (int : 8): The number of requests to make at a time
+
+        Returns:
+            generator: of (token, proj_info) pairs, in no particular order
+        """
+        cache = self._info_cache()
+        missing = []
+        for token in tokens:
+            info = cache.get(self._info_url(token))
+            if info is None:
+                missing.append(token)
+            else:
+                yield token, info
+        if not missing:
+            return
+
+        executor = ThreadPoolExecutor(max(1, min(max_workers, len(missing))))
+        futures = dict((executor.submit(self.get_proj_info, t), t)
+                       for t in missing)
+        try:
+            for f in as_completed(futures):
+                yield futures[f], f.result()
+        finally:
+            # If the caller stops early, or a request fails, don't wait for
+            # the rest.
+            for f in futures:
+                f.cancel()
+            executor.shutdown(wait=False)
 
     def get_metadata(self, token):
         """
@@ -172,13 +433,15 @@ class metadata():
             RemoteDataUploadError: If the token is already populated, or if
                 there is an issue with your specified `secret` key.
         """
-        req = requests.post(self.meta_url("metadata/ocp/set/" + token),
-                            json=data, verify=False)
+        req = self.remote_utils.session().post(
+            self.meta_url("metadata/ocp/set/" + token),
+            json=data, verify=False)
 
         if req.status_code != 200:
             raise RemoteDataUploadError(
                 "Could not upload metadata: " + req.json()['message']
             )
+        self.invalidate_proj_info(token)
         return req.json()
 
     def get_subvolumes(self, token):
@@ -45,19 +45,22 @@ class NDIngest:
         else:
             self.oo = nd()
 
-        rd = requests.get('{}/dataset_schema.json'.format(SCHEMA_BASE))
+        rd = self.oo.remote_utils.session().get(
+            '{}/dataset_schema.json'.format(SCHEMA_BASE))
         if (rd.status_code < 300):
             self.DATASET_SCHEMA = load(eval(str(rd.text)))
         else:
             raise OSError("Dataset schema not available")
 
-        rc = requests.get('{}/channel_schema.json'.format(SCHEMA_BASE))
+        rc = self.oo.remote_utils.session().get(
+            '{}/channel_schema.json'.format(SCHEMA_BASE))
         if (rc.status_code < 300):
             self.CHANNEL_SCHEMA = load(eval(str(rc.text)))
         else:
             raise OSError("Channel schema not available")
 
-        rp = requests.get('{}/project_schema.json'.format(SCHEMA_BASE))
+        rp = self.oo.remote_utils.session().get(
+            '{}/project_schema.json'.format(SCHEMA_BASE))
         if (rp.status_code < 300):
             self.PROJECT_SCHEMA = load(eval(str(rp.text)))
         else:
@@ -348,10 +351,11 @@ specify the time steps?')
                     # Check for accessibility
                     try:
                         if (verifytype == VERIFY_BY_FOLDER):
-                            resp = requests.head(work_path)
+                            resp = self.oo.remote_utils.session().head(
+                                work_path)
                             assert(resp.status_code == 200)
                         elif (verifytype == VERIFY_BY_SLICE):
-                            resp = requests.get(
+                            resp = self.oo.remote_utils.session().get(
                                 work_path, stream=True, verify=False)
                             with open('/tmp/img.{}'.format(file_type),
                                       'wb') as out_file:
@@ -386,9 +390,10 @@ provided image size.')
                     raise TypeError('Incorrect verify method')
                 # Check for accessibility
                 if (verifytype == VERIFY_BY_FOLDER):
-                    resp = requests.head(work_path)
+                    resp = self.oo.remote_utils.session().head(work_path)
                 elif (verifytype == VERIFY_BY_SLICE):
-                    resp = requests.get(work_path, stream=True, verify=False)
+                    resp = self.oo.remote_utils.session().get(
+                        work_path, stream=True, verify=False)
                     with open('/tmp/img.{}'.format(file_type),
                               'wb') as out_file:
                         shutil.copyfileobj(resp.raw, out_file)
@@ -456,8 +461,8 @@ provided image size.')
         URLPath = self.oo.url("autoIngest/")
         # URLPath = 'https://{}/ca/autoIngest/'.format(self.oo.site_host)
         try:
-            response = requests.post(URLPath, data=json.dumps(data),
-                                     verify=False)
+            response = self.oo.remote_utils.session().post(
+                URLPath, data=json.dumps(data), verify=False)
             assert(response.status_code == 200)
             print("From ndio: {}".format(response.content))
         except:
@@ -9,9 +9,12 @@ import tempfile
 import blosc
 import h5py
 from .remote_utils import remote_utils
+from .remote_utils import DEFAULT_POOL_SIZE
+from .retry import Retry, DEFAULT_RETRIES, DEFAULT_BACKOFF
 
 from .Remote import Remote
 from .errors import *
+from .metadata import default_info_cache
 import ndio.ramon as ramon
 from six.moves import range
 import six
@@ -27,6 +30,7 @@ DEFAULT_HOSTNAME = "openconnecto.me"
 DEFAULT_SUFFIX = "nd"
 DEFAULT_PROTOCOL = "https"  # originally was https in master
 DEFAULT_BLOCK_SIZE = (1024, 1024, 16)
+DEFAULT_MAX_WORKERS = 8
 
 
 class neuroRemote(Remote):
@@ -64,10 +68,39 @@ class neuroRemote(Remote):
                 Default is 1e9 / 4, or a 0.25GiB.
             suffix (str: "ocp"): The URL suffix to specify ndstore/microns. If
                 you aren't sure what to do with this, don't specify one.
+            max_workers (int: 8): The number of blocks of a chunked cutout to
+                download at the same time. Set to 1 to download serially.
+            max_host_requests (int: None): The maximum number of requests
+                that may be in flight to a single host at a time. If None,
+                only `max_workers` limits concurrency.
+            pool_size (int: 16): The number of persistent connections to keep
+                open to each host. Remotes with the same `pool_size` and
+                `keep_alive` share their connections.
+            keep_alive (bool: True): Whether to reuse connections between
+                requests.
+            timeout (float: None): The number of seconds to wait for the
+                server on each request. If None, wait forever.
+            retries (int: 3): How many times to retry a request that failed
+                with a connection error, a timeout or a status code that
+                means "try again later" (such as 503). Retries back off
+                exponentially, with jitter.
+            backoff (float: 0.5): The longest wait, in seconds, before the
+                first retry. Each later retry may wait twice as long.
+            tracer (Tracer: None): An `ndio.remote.Tracer` to send events to
+                for every request, download, decode and upload, to find out
+                where the time goes. If None, nothing is traced.
+            info_cache (InfoCache: None): An `ndio.remote.metadata.InfoCache`
+                to keep project info in. If None, the cache shared by all
+                remotes is used.
         """
         self._check_tokens = kwargs.get('check_tokens', False)
         self._chunk_threshold = kwargs.get('chunk_threshold', 1E9 / 4)
         self._ext = kwargs.get('suffix', DEFAULT_SUFFIX)
+        self._max_workers = kwargs.get('max_workers', DEFAULT_MAX_WORKERS)
+        self._retry = Retry(kwargs.get('retries', DEFAULT_RETRIES),
+                            kwargs.get('backoff', DEFAULT_BACKOFF))
+        self._tracer = kwargs.get('tracer', None)
+        self._proj_info_cache = kwargs.get('info_cache', None)
         self._known_tokens = []
         self._user_token = user_token
 
@@ -79,7 +112,13 @@ class neuroRemote(Remote):
             self.meta_root = self.meta_root[self.meta_root.index('://') + 3:]
         self.meta_protocol = meta_protocol
 
-        self.remote_utils = remote_utils(self._user_token)
+        self.remote_utils = remote_utils(
+            self._user_token,
+            max_host_requests=kwargs.get('max_host_requests', None),
+            pool_size=kwargs.get('pool_size', DEFAULT_POOL_SIZE),
+            keep_alive=kwargs.get('keep_alive', True),
+            timeout=kwargs.get('timeout', None),
+            tracer=self._tracer)
         super(neuroRemote, self).__init__(hostname, protocol)
 
     # SECTION:
@@ -96,6 +135,29 @@ class neuroRemote(Remote):
         """
         return self.remote_utils.get_url(url)
 
+    def _info_cache(self):
+        return self._proj_info_cache or default_info_cache
+
+    def _info_url(self, token):
+        # The ndstore info url, even from remotes that override `url`.
+        return neuroRemote.url(self) + "/sd/{}/info/".format(token)
+
+    def invalidate_proj_info(self, token=None):
+        """
+        Forget the cached project info for a token, so that the next lookup
+        goes to the server. Call this after changing a project elsewhere.
+
+        Arguments:
+            token (str : None): The token to forget. If None, forget all.
+
+        Returns:
+            None
+        """
+        if token is None:
+            self._info_cache().invalidate()
+        else:
+            self._info_cache().invalidate(self._info_url(token))
+
     # SECTION:
     # Decorators
     def _check_token(f):
@@ -254,13 +316,14 @@ class neuroRemote(Remote):
                 "datatype": channel_new.dtype,
                 "readonly": channel_new.readonly * 1
             }
-        req = requests.post(self.url("/{}/project/".format(dataset) +
-                                     "{}".format(token)),
-                            json={"channels": {channels}}, verify=False)
+        req = self.remote_utils.session().post(
+            self.url("/{}/project/".format(dataset) + "{}".format(token)),
+            json={"channels": {channels}}, verify=False)
 
         if req.status_code is not 201:
             raise RemoteDataUploadError('Could not upload {}'.format(req.text))
         else:
+            self.invalidate_proj_info(token)
             return True
 
     # Propagation
@@ -64,6 +64,27 @@ class neurodata(neuroRemote):
                 Default is 1e9 / 4, or a 0.25GiB.
             suffix (str: "ocp"): The URL suffix to specify ndstore/microns. If
                 you aren't sure what to do with this, don't specify one.
+            max_workers (int: 8): The number of blocks of a chunked cutout to
+                download at the same time. Set to 1 to download serially.
+            max_host_requests (int: None): The maximum number of requests
+                that may be in flight to a single host at a time. If None,
+                only `max_workers` limits concurrency.
+            pool_size (int: 16): The number of persistent connections to keep
+                open to each host. Remotes with the same `pool_size` and
+                `keep_alive` share their connections.
+            keep_alive (bool: True): Whether to reuse connections between
+                requests.
+            timeout (float: None): The number of seconds to wait for the
+                server on each request. If None, wait forever.
+            retries (int: 3): How many times to retry a request that failed
+                with a connection error, a timeout or a status code that
+                means "try again later" (such as 503). Retries back off
+                exponentially, with jitter.
+            backoff (float: 0.5): The longest wait, in seconds, before the
+                first retry. Each later retry may wait twice as long.
+            tracer (Tracer: None): An `ndio.remote.Tracer` to send events to
+                for every request, download, decode and upload, to find out
+                where the time goes. If None, nothing is traced.
         """
         self.data = data(user_token,
                          hostname,
@@ -159,6 +180,39 @@ class neurodata(neuroRemote):
                                    y_start, y_stop,
                                    z_index, resolution)
 
+    def get_xy_slices(self, token, channel, bbox_xy, z_indices,
+                      resolution=0,
+                      block_size=None,
+                      neariso=False):
+        """
+        Get several xy slices at once, in any order. The server sends at
+        least a cube's depth of z for every cutout, so the slices are
+        grouped by the cube-aligned slab of z they fall in, and each slab
+        is downloaded once (the slabs side by side, up to `max_workers` at a
+        time) instead of once per slice.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            bbox_xy (tuple): ((x_start, x_stop), (y_start, y_stop)) of the
+                slices
+            z_indices (int[]): The z-slices to get. They may repeat.
+            resolution (int : 0): Resolution level
+            block_size (int[3] : None): The size of the blocks to download
+                each slab in, along x and y. Slabs are always one cube deep.
+                If None, the slabs are downloaded a cube at a time.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            numpy.ndarray: The slices, in (x, y, i) order, where slice `i`
+                is `z_indices[i]`
+        """
+        return self.data.get_xy_slices(token, channel, bbox_xy, z_indices,
+                                       resolution,
+                                       block_size,
+                                       neariso)
+
     def get_volume(self, token, channel,
                    x_start, x_stop,
                    y_start, y_stop,
@@ -188,6 +242,63 @@ class neurodata(neuroRemote):
                                     z_start, z_stop,
                                     resolution, block_size, neariso)
 
+    def pick_resolution(self, token, shape, bbox=None):
+        """
+        Find the coarsest resolution that still has at least `shape` voxels
+        in a box, so that the box can be downloaded at that resolution and
+        shrunk to `shape` without losing any detail that `shape` can show.
+
+        Arguments:
+            token (str): The token to inspect
+            shape (int[3]): The xyz shape wanted
+            bbox (tuple : None): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the box, at the finest resolution of
+                the dataset. Defaults to the whole dataset.
+
+        Returns:
+            (int, tuple): The resolution, and the bbox at that resolution
+
+        Raises:
+            ValueError: If `shape` is bigger than the box
+        """
+        return self.data.pick_resolution(token, shape, bbox)
+
+    def get_overview(self, token, channel,
+                     shape=None,
+                     max_bytes=None,
+                     bbox=None,
+                     method=None,
+                     block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Get a box (by default, the whole dataset) shrunk to a given shape or
+        size, for overviews and thumbnails. The box is downloaded at the
+        coarsest resolution that has enough voxels (see `pick_resolution`),
+        and shrunk the rest of the way here.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            shape (int[3] : None): The xyz shape of the result
+            max_bytes (int : None): Instead of `shape`, the most bytes the
+                result may take. The box is shrunk evenly along every axis.
+            bbox (tuple : None): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the box, at the finest resolution of
+                the dataset. Defaults to the whole dataset.
+            method (str : None): 'mean' or 'mode', as for
+                `ndio.utils.downsample.downsample`. Defaults to 'mode' for
+                annotation channels and 'mean' for the rest.
+            block_size (int[3]): As for `get_cutout`
+
+        Returns:
+            numpy.ndarray: The overview, in (x, y, z) order
+        """
+        return self.data.get_overview(token, channel,
+                                      shape,
+                                      max_bytes,
+                                      bbox,
+                                      method,
+                                      block_size)
+
     def get_cutout(self, token, channel,
                    x_start, x_stop,
                    y_start, y_stop,
@@ -208,12 +319,14 @@ class neurodata(neuroRemote):
             block_size (int[3]): Block size of this dataset. If not provided,
                 ndio uses the metadata of this tokenchannel to set. If you find
                 that your downloads are timing out or otherwise failing, it may
-                be wise to start off by making this smaller.
+                be wise to start off by making this smaller. A fourth entry
+                sets how many timepoints each block spans (default 1).
             neariso (bool : False): Passes the 'neariso' param to the cutout.
                 If you don't know what this means, ignore it!
 
         Returns:
-            numpy.ndarray: Downloaded data.
+            numpy.ndarray: Downloaded data, in (x, y, z) order, or in
+                (x, y, z, t) order if more than one timepoint was requested.
         """
         return self.data.get_cutout(token, channel,
                                     x_start, x_stop,
@@ -224,6 +337,224 @@ class neurodata(neuroRemote):
                                     block_size,
                                     neariso)
 
+    def get_cutouts(self, token, channels,
+                    x_start, x_stop,
+                    y_start, y_stop,
+                    z_start, z_stop,
+                    resolution=1,
+                    block_size=DEFAULT_BLOCK_SIZE,
+                    neariso=False,
+                    stack=False):
+        """
+        Get the same cutout from several channels of a token at once. The
+        cutout is planned once, and the blocks of every channel share one
+        pool of `max_workers` downloads, so the channels download side by
+        side instead of one after the other.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channels (str[]): The channels to download
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            resolution (int : 1): Resolution level
+            block_size (int[3]): As for `get_cutout`
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+            stack (bool : False): Return one (x, y, z, channel) array instead
+                of a dict. All of the channels must have the same datatype.
+
+        Returns:
+            dict: Each channel's cutout, in (x, y, z) order, by channel name
+                (or a numpy.ndarray, if `stack` is True)
+
+        Raises:
+            ValueError: if `stack` is True and the datatypes don't match.
+        """
+        return self.data.get_cutouts(token, channels,
+                                     x_start, x_stop,
+                                     y_start, y_stop,
+                                     z_start, z_stop,
+                                     resolution,
+                                     block_size,
+                                     neariso,
+                                     stack)
+
+    def get_sparse_cutout(self, token, channel,
+                          x_start, x_stop,
+                          y_start, y_stop,
+                          z_start, z_stop,
+                          resolution=1,
+                          block_size=None,
+                          neariso=False):
+        """
+        Get a cutout of a mostly empty channel (such as an annotation
+        channel) without ever holding it densely. It is downloaded block by
+        block, and each block is kept only if it has any non-zero voxels, so
+        memory grows with the labelled part of the cutout, not its size.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            resolution (int : 1): Resolution level
+            block_size (int[3] : None): The size of the blocks to download
+                and keep. Smaller blocks make the result sparser, but take
+                more requests. If None, uses the cube dimensions of the
+                dataset.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            ndio.remote.SparseCutout: The non-empty blocks, and an occupancy
+                mask of the block grid
+        """
+        return self.data.get_sparse_cutout(token, channel,
+                                           x_start, x_stop,
+                                           y_start, y_stop,
+                                           z_start, z_stop,
+                                           resolution,
+                                           block_size,
+                                           neariso)
+
+    def iter_timepoints(self, token, channel,
+                        x_start, x_stop,
+                        y_start, y_stop,
+                        z_start, z_stop,
+                        t_start, t_stop,
+                        t_batch=1,
+                        resolution=1,
+                        block_size=DEFAULT_BLOCK_SIZE,
+                        read_ahead=1,
+                        neariso=False):
+        """
+        Download a timeseries a few timepoints at a time, yielding each batch
+        of frames as soon as it is ready, so that a long movie can be
+        processed without holding all of it. The next `read_ahead` batches
+        are downloaded while the consumer works on the current one.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            t_batch (int : 1): How many timepoints to yield at a time
+            resolution (int : 1): Resolution level
+            block_size (int[3]): As for `get_cutout`, for each batch
+            read_ahead (int : 1): How many batches to download ahead of the
+                consumer
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            generator: of (t_start, t_stop, numpy.ndarray) for each batch.
+                The arrays are in (x, y, z, t) order, even for a batch of
+                one timepoint.
+        """
+        return self.data.iter_timepoints(token, channel,
+                                         x_start, x_stop,
+                                         y_start, y_stop,
+                                         z_start, z_stop,
+                                         t_start, t_stop,
+                                         t_batch,
+                                         resolution,
+                                         block_size,
+                                         read_ahead,
+                                         neariso)
+
+    def iter_cutout_blocks(self, token, channel, bbox,
+                           resolution=1,
+                           block_shape=DEFAULT_BLOCK_SIZE,
+                           order='zyx',
+                           read_ahead=None,
+                           neariso=False):
+        """
+        Download a cutout one block at a time, yielding each block as soon as
+        it is ready instead of assembling the whole volume. At most
+        `read_ahead` blocks are downloaded or held at once, so this can walk
+        volumes much larger than memory.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            bbox (tuple): ((x_start, x_stop), (y_start, y_stop),
+                (z_start, z_stop)) of the whole cutout
+            resolution (int : 1): Resolution level
+            block_shape (int[3]): The xyz size of the blocks to download. If
+                None, uses the cube dimensions of the dataset.
+            order (str : 'zyx'): The order to yield blocks in. 'zyx' walks z
+                slowest (slab by slab) and 'xyz' walks x slowest. 'arrival'
+                yields blocks in whatever order they finish downloading.
+            read_ahead (int : None): The most blocks to download ahead of the
+                consumer. Defaults to twice `max_workers`.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+
+        Returns:
+            generator: of (bbox, numpy.ndarray) pairs. Each array is in
+                (x, y, z) order, like `get_cutout`.
+        """
+        return self.data.iter_cutout_blocks(token, channel, bbox,
+                                            resolution,
+                                            block_shape,
+                                            order,
+                                            read_ahead,
+                                            neariso)
+
+    def download_to_file(self, token, channel,
+                         x_start, x_stop,
+                         y_start, y_stop,
+                         z_start, z_stop,
+                         filename,
+                         resolution=1,
+                         block_size=DEFAULT_BLOCK_SIZE,
+                         neariso=False,
+                         file_format=None,
+                         dataset_name='CUTOUT',
+                         manifest=None):
+        """
+        Download a cutout straight into a file, one block at a time, so that
+        cutouts much larger than memory can be downloaded. The file holds the
+        data in (x, y, z) order, like `get_cutout` returns it.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            filename (str): The file to write to. It is overwritten, unless
+                the download is being resumed.
+            resolution (int : 1): Resolution level
+            block_size (int[3]): The xyz size of the blocks to download. If
+                None, uses the cube dimensions of the dataset.
+            neariso (bool : False): Passes the 'neariso' param to the cutout.
+                If you don't know what this means, ignore it!
+            file_format (str : None): 'npy' for a numpy .npy file (open it
+                with `numpy.load(filename, mmap_mode='r')`), 'hdf5' for a
+                chunked HDF5 dataset, or 'raw' for a headerless
+                Fortran-ordered `numpy.memmap`. If None, it is guessed from
+                the extension of `filename` ('raw' if unrecognized).
+            dataset_name (str : 'CUTOUT'): The HDF5 dataset to write to
+            manifest (str : None): A file to record finished blocks in. If
+                the download is interrupted, calling `download_to_file` again
+                with the same arguments downloads only the missing blocks.
+                The manifest is deleted once the download is complete.
+
+        Returns:
+            str: The filename
+        """
+        return self.data.download_to_file(token, channel,
+                                          x_start, x_stop,
+                                          y_start, y_stop,
+                                          z_start, z_stop,
+                                          filename,
+                                          resolution,
+                                          block_size,
+                                          neariso,
+                                          file_format,
+                                          dataset_name,
+                                          manifest)
+
     # SECTION:
     # Data Upload
 
@@ -232,7 +563,11 @@ class neurodata(neuroRemote):
                     y_start,
                     z_start,
                     data,
-                    resolution=0):
+                    resolution=0,
+                    block_size=DEFAULT_BLOCK_SIZE,
+                    manifest=None,
+                    t_start=0,
+                    skip_empty=False):
         """
         Post a cutout to the server.
 
@@ -242,8 +577,25 @@ class neurodata(neuroRemote):
             x_start (int)
             y_start (int)
             z_start (int)
-            data (numpy.ndarray): A numpy array of data. Pass in (x, y, z)
+            data (numpy.ndarray): A numpy array of data. Pass in (x, y, z),
+                or (x, y, z, t) for a timeseries channel
             resolution (int : 0): Resolution at which to insert the data
+            block_size (int[3]): The largest xyz block to upload in one
+                request, if `data` is too big to upload at once. It is
+                rounded down to a multiple of the dataset's cube dimensions,
+                so that every request covers whole cubes. If None, uses the
+                cube dimensions themselves. A fourth entry sets how many
+                timepoints each block spans (default 1).
+            manifest (str : None): A file to record uploaded blocks in. If
+                the upload is interrupted, calling `post_cutout` again with
+                the same arguments uploads only the missing blocks. The
+                manifest is deleted once the upload is complete.
+            t_start (int : 0): The first timepoint of (x, y, z, t) data
+            skip_empty (bool : False): Don't upload blocks that are all
+                zeros, which saves most of the requests and bytes of a
+                sparse annotation upload. What the server already has in
+                those blocks is left as it is. Use a small `block_size`
+                (such as None) to skip more.
 
         Returns:
             bool: True on success
@@ -256,7 +608,11 @@ class neurodata(neuroRemote):
                                      y_start,
                                      z_start,
                                      data,
-                                     resolution)
+                                     resolution,
+                                     block_size,
+                                     manifest,
+                                     t_start,
+                                     skip_empty)
 
     # SECTION:
     # Ramon
@@ -1,4 +1,80 @@
+import threading
+import time
+from contextlib import contextmanager
+
 import requests
+from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlparse
+
+from .tracing import span, url_template
+
+DEFAULT_POOL_SIZE = 16
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _session_pool(object):
+    """
+    A pool of persistent HTTP connections, shared by every thread that uses
+    it. Each thread gets its own `requests.Session` (sessions are not safe to
+    share between threads), but all of the sessions are mounted on the same
+    connection adapter, so connections are reused across threads.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keep_alive=True):
+        """
+        Arguments:
+            pool_size (int : 16): Connections to keep open per host
+            keep_alive (bool : True): Whether to reuse connections at all
+        """
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self._adapter = HTTPAdapter(pool_connections=pool_size,
+                                    pool_maxsize=pool_size)
+        self._local = threading.local()
+
+    def session(self):
+        """
+        Get the session belonging to the calling thread.
+
+        Arguments:
+            None
+
+        Returns:
+            requests.Session: A session backed by the shared pool
+        """
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            s = requests.Session()
+            s.mount('http://', self._adapter)
+            s.mount('https://', self._adapter)
+            s.headers.update({
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive' if self.keep_alive else 'close'
+            })
+            self._local.session = s
+        return s
+
+
+def session(pool_size=DEFAULT_POOL_SIZE, keep_alive=True):
+    """
+    Get a session from the connection pool shared by all remotes with the
+    same pool settings.
+
+    Arguments:
+        pool_size (int : 16): Connections to keep open per host
+        keep_alive (bool : True): Whether to reuse connections at all
+
+    Returns:
+        requests.Session: A session for the calling thread
+    """
+    key = (pool_size, keep_alive)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = _session_pool(pool_size, keep_alive)
+        pool = _pools[key]
+    return pool.session()
 
 
 class remote_utils:
@@ -7,30 +83,141 @@ class remote_utils:
     """
 
     def __init__(self,
-                 user_token):
+                 user_token,
+                 max_host_requests=None,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 keep_alive=True,
+                 timeout=None,
+                 tracer=None):
         """
         Initializes for remote_utils.
 
         Arguments:
             user_token (str): Authentication token for user.
+            max_host_requests (int : None): The maximum number of requests
+                that may be in flight to any one host at a time. If None,
+                requests are not limited.
+            pool_size (int : 16): The number of connections to keep open to
+                each host. All remote_utils with the same `pool_size` and
+                `keep_alive` share one pool.
+            keep_alive (bool : True): Whether to reuse connections between
+                requests.
+            timeout (float : None): Default number of seconds to wait for the
+                server on each request. If None, wait forever.
+            tracer (Tracer : None): An `ndio.remote.Tracer` to send an
+                'http' event to for every request.
         """
         self._user_token = user_token
+        self._auth_headers = {
+            'Authorization': 'Token {}'.format(user_token)
+        }
+        self._max_host_requests = max_host_requests
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._timeout = timeout
+        self._tracer = tracer
 
-    def get_url(self, url):
+    def session(self):
+        """
+        Get the pooled session this remote_utils sends its requests through.
+
+        Arguments:
+            None
+
+        Returns:
+            requests.Session: A session for the calling thread
+        """
+        return session(self._pool_size, self._keep_alive)
+
+    def _headers(self, token):
+        if token == '' or token == self._user_token:
+            return self._auth_headers
+        return {'Authorization': 'Token {}'.format(token)}
+
+    @contextmanager
+    def _host_slot(self, url, event=None):
+        """
+        Hold one of the in-flight request slots for the host of `url`,
+        blocking until one is free.
+
+        Arguments:
+            url (str): The url that is about to be requested
+            event (dict : None): A trace event to record the wait in
+        """
+        if not self._max_host_requests:
+            yield
+            return
+
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(
+                    self._max_host_requests)
+            slot = self._host_slots[host]
+
+        waited = time.time()
+        with slot:
+            if event is not None:
+                event['wait'] = time.time() - waited
+            yield
+
+    @contextmanager
+    def _traced(self, method, url, data=None):
+        """
+        Time one request as an 'http' event, if this remote_utils has a
+        tracer. The block records the response with `_record`.
+
+        Arguments:
+            method (str): The HTTP method
+            url (str): The url
+            data (bytes : None): The request body
+        """
+        if self._tracer is None:
+            yield None
+            return
+        with span(self._tracer, 'http', method=method, url=url,
+                  template=url_template(url),
+                  bytes_sent=len(data) if data else 0) as event:
+            yield event
+
+    @staticmethod
+    def _record(event, response):
+        """
+        Add a response's status, size and timings to its 'http' event.
+        """
+        if event is None:
+            return response
+        event['status'] = response.status_code
+        event['bytes_received'] = len(response.content)
+        elapsed = getattr(response, 'elapsed', None)
+        if elapsed is not None:
+            event['server'] = elapsed.total_seconds()
+            event['transfer'] = max(0.0, time.time() - event['start'] -
+                                    event.get('wait', 0) - event['server'])
+        return response
+
+    def get_url(self, url, timeout=None):
         """
         Get a response object for a given url.
 
         Arguments:
             url (str): The url make a get to
-            token (str): The authentication token
+            timeout (float : None): Seconds to wait for the server. Defaults
+                to the timeout this remote_utils was created with.
 
         Returns:
             obj: The response object
         """
         try:
-            req = requests.get(url, headers={
-                'Authorization': 'Token {}'.format(self._user_token)
-            }, verify=False)
+            with self._traced('GET', url) as event, \
+                    self._host_slot(url, event):
+                req = self._record(event, self.session().get(
+                    url,
+                    headers=self._auth_headers,
+                    timeout=timeout or self._timeout,
+                    verify=False))
             if req.status_code is 403:
                 raise ValueError("Access Denied")
             else:
@@ -41,7 +228,8 @@ class remote_utils:
             else:
                 raise e
 
-    def post_url(self, url, token='', json=None, data=None, headers=None):
+    def post_url(self, url, token='', json=None, data=None, headers=None,
+                 timeout=None):
         """
         Returns a post resquest object taking in a url, user token, and
         possible json information.
@@ -50,51 +238,61 @@ class remote_utils:
             url (str): The url to make post to
             token (str): The authentication token
             json (dict): json info to send
+            timeout (float : None): Seconds to wait for the server. Defaults
+                to the timeout this remote_utils was created with.
 
         Returns:
             obj: Post request object
         """
-        if (token == ''):
-            token = self._user_token
-
         if headers:
-            headers.update({'Authorization': 'Token {}'.format(token)})
+            headers.update(self._headers(token))
         else:
-            headers = {'Authorization': 'Token {}'.format(token)}
+            headers = self._headers(token)
 
-        if json:
-            return requests.post(url,
-                                 headers=headers,
-                                 json=json,
-                                 verify=False)
-        if data:
-            return requests.post(url,
-                                 headers=headers,
-                                 data=data,
-                                 verify=False)
+        timeout = timeout or self._timeout
+        with self._traced('POST', url, data) as event, \
+                self._host_slot(url, event):
+            if json:
+                return self._record(event, self.session().post(
+                    url,
+                    headers=headers,
+                    json=json,
+                    timeout=timeout,
+                    verify=False))
+            if data:
+                return self._record(event, self.session().post(
+                    url,
+                    headers=headers,
+                    data=data,
+                    timeout=timeout,
+                    verify=False))
 
-        return requests.post(url,
-                             headers=headers,
-                             verify=False)
+            return self._record(event, self.session().post(
+                url,
+                headers=headers,
+                timeout=timeout,
+                verify=False))
 
-    def delete_url(self, url, token=''):
+    def delete_url(self, url, token='', timeout=None):
         """
         Returns a delete resquest object taking in a url and user token.
 
         Arguments:
             url (str): The url to make post to
             token (str): The authentication token
+            timeout (float : None): Seconds to wait for the server. Defaults
+                to the timeout this remote_utils was created with.
 
         Returns:
             obj: Delete request object
         """
-        if (token == ''):
-            token = self._user_token
-
-        return requests.delete(url,
-                               headers={
-                                   'Authorization': 'Token {}'.format(token)},
-                               verify=False,)
+        with self._traced('DELETE', url) as event, \
+                self._host_slot(url, event):
+            return self._record(event, self.session().delete(
+                url,
+                headers=self._headers(token),
+                timeout=timeout or self._timeout,
+                verify=False))
 
     def ping(self, url, endpoint=''):
         """
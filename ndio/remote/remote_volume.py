@@ -0,0 +1,256 @@
+from __future__ import absolute_import
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import six
+
+from .errors import *
+
+DEFAULT_CACHED_BLOCKS = 64
+
+
+class RemoteVolume(object):
+    """
+    A lazy, numpy-like view of one channel of a remote dataset.
+
+    Slicing a RemoteVolume downloads only the cube-aligned blocks that the
+    slice touches, and keeps the most recently used blocks in memory, so
+    nearby slices are served without going back to the server:
+
+        vol = RemoteVolume(nd, 'kasthuri11', 'image', resolution=3)
+        vol.shape               # (x, y, z), from the project info
+        vol[100:400, 100:400, 50]
+
+    Indices are (x, y, z) and are relative to the dataset's offset: index 0
+    is the first voxel of the dataset, so `vol[:, :, 0]` is the first slice
+    even for datasets (like kasthuri11) whose slices are numbered from 1.
+    """
+
+    def __init__(self, remote, token, channel, resolution=0,
+                 block_shape=None,
+                 cached_blocks=DEFAULT_CACHED_BLOCKS,
+                 neariso=False):
+        """
+        Arguments:
+            remote (neurodata): The remote to download from. An
+                `ndio.remote.data` works too.
+            token (str): Token of the dataset
+            channel (str): Channel to view
+            resolution (int : 0): Resolution to view
+            block_shape (int[3] : None): The xyz size of the blocks to
+                download. Defaults to the cube dimensions of the dataset.
+            cached_blocks (int : 64): How many blocks to keep in memory
+            neariso (bool : False): Passes the 'neariso' param to cutouts.
+                If you don't know what this means, ignore it!
+        """
+        self._data = getattr(remote, 'data', remote)
+        self.token = token
+        self.channel = channel
+        self.resolution = resolution
+        self.neariso = neariso
+        self.cached_blocks = cached_blocks
+
+        info = self._data.get_proj_info(token)
+        res = str(resolution)
+        if res not in info['dataset']['imagesize']:
+            raise RemoteDataNotFoundError("Resolution " + res +
+                                          " is not available.")
+        if channel not in info['channels']:
+            raise RemoteDataNotFoundError("Channel " + channel +
+                                          " is not available.")
+
+        self.shape = tuple(info['dataset']['imagesize'][res])
+        self.offset = tuple(info['dataset']['offset'][res])
+        self.dtype = numpy.dtype(info['channels'][channel]['datatype'])
+        if block_shape is None:
+            block_shape = info['dataset']['cube_dimension'][res]
+        self.block_shape = tuple(block_shape)
+
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ndim(self):
+        """
+        The number of dimensions of the volume (always 3).
+        """
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """
+        The number of voxels in the volume.
+        """
+        return int(numpy.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes the whole volume would take in memory.
+        """
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        """
+        The length of the volume along x, like a numpy array's.
+        """
+        return self.shape[0]
+
+    def __repr__(self):
+        """
+        Describe the volume, without downloading any of it.
+        """
+        return "RemoteVolume('{}', '{}', resolution={}, shape={}, " \
+               "dtype={})".format(self.token, self.channel, self.resolution,
+                                  self.shape, self.dtype)
+
+    def __getitem__(self, key):
+        """
+        Download (or read from memory) a region of the volume.
+
+        Arguments:
+            key: Up to three ints or slices, in (x, y, z) order
+
+        Returns:
+            numpy.ndarray: The region, in (x, y, z) order
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > self.ndim:
+            raise IndexError("RemoteVolume only has {} dimensions.".format(
+                             self.ndim))
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        bounds = []
+        steps = []
+        squeeze = []
+        for axis, (k, n) in enumerate(zip(key, self.shape)):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(n)
+                if step < 0:
+                    raise IndexError("Negative steps are not supported.")
+                bounds.append((start, max(start, stop)))
+                steps.append(step)
+            elif isinstance(k, six.integer_types + (numpy.integer,)):
+                i = k + n if k < 0 else k
+                if not 0 <= i < n:
+                    raise IndexError("Index {} is out of bounds for axis {} "
+                                     "with size {}.".format(k, axis, n))
+                bounds.append((i, i + 1))
+                steps.append(1)
+                squeeze.append(axis)
+            else:
+                raise TypeError("RemoteVolume indices must be ints or "
+                                "slices, not {}.".format(type(k).__name__))
+
+        out = self._read(bounds)
+        out = out[tuple(slice(None, None, s) for s in steps)]
+        if squeeze:
+            out = numpy.squeeze(out, axis=tuple(squeeze))
+        return out
+
+    def _read(self, bounds):
+        """
+        Assemble a region from its blocks, downloading the missing ones.
+
+        Arguments:
+            bounds (tuple[3]): (start, stop) of each axis, in index space
+
+        Returns:
+            numpy.ndarray: The region, in (x, y, z) order
+        """
+        out = numpy.zeros([b[1] - b[0] for b in bounds], dtype=self.dtype)
+        if out.size == 0:
+            return out
+
+        ranges = [range(b[0] // bs, (b[1] - 1) // bs + 1)
+                  for b, bs in zip(bounds, self.block_shape)]
+        indices = [(i, j, k) for i in ranges[0]
+                   for j in ranges[1]
+                   for k in ranges[2]]
+
+        blocks = self._get_blocks(indices)
+        for index, block in zip(indices, blocks):
+            src = []
+            dst = []
+            for axis, (b, bs) in enumerate(zip(bounds, self.block_shape)):
+                block_start = index[axis] * bs
+                lo = max(b[0], block_start)
+                hi = min(b[1], block_start + block.shape[axis])
+                src.append(slice(lo - block_start, hi - block_start))
+                dst.append(slice(lo - b[0], hi - b[0]))
+            out[tuple(dst)] = block[tuple(src)]
+        return out
+
+    def _get_blocks(self, indices):
+        """
+        Get blocks by their index in the block grid, from memory when
+        possible and otherwise from the server (several at a time).
+
+        Arguments:
+            indices (tuple[]): The (i, j, k) grid index of each block
+
+        Returns:
+            numpy.ndarray[]: The blocks, in (x, y, z) order
+        """
+        found = {}
+        with self._lock:
+            for index in indices:
+                if index in self._blocks:
+                    self._blocks[index] = self._blocks.pop(index)
+                    found[index] = self._blocks[index]
+
+        missing = [i for i in indices if i not in found]
+        if len(missing) == 1:
+            found[missing[0]] = self._download(missing[0])
+        elif missing:
+            workers = min(len(missing), max(1, self._data._max_workers))
+            with ThreadPoolExecutor(workers) as executor:
+                for index, block in zip(missing,
+                                        executor.map(self._download,
+                                                     missing)):
+                    found[index] = block
+
+        with self._lock:
+            for index in missing:
+                self._blocks[index] = found[index]
+            while len(self._blocks) > self.cached_blocks:
+                self._blocks.popitem(last=False)
+
+        return [found[i] for i in indices]
+
+    def _download(self, index):
+        """
+        Download one block of the grid, clipped to the edge of the dataset.
+
+        Arguments:
+            index (tuple): The (i, j, k) grid index of the block
+
+        Returns:
+            numpy.ndarray: The block, in (x, y, z) order
+        """
+        lo = [i * bs for i, bs in zip(index, self.block_shape)]
+        hi = [min(start + bs, n) for start, bs, n in zip(lo, self.block_shape,
+                                                         self.shape)]
+        o = self.offset
+        return self._data.get_cutout(self.token, self.channel,
+                                     o[0] + lo[0], o[0] + hi[0],
+                                     o[1] + lo[1], o[1] + hi[1],
+                                     o[2] + lo[2], o[2] + hi[2],
+                                     resolution=self.resolution,
+                                     neariso=self.neariso)
+
+    def clear_cache(self):
+        """
+        Forget every block held in memory.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._blocks.clear()
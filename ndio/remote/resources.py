@@ -112,6 +112,7 @@ class resources(nd):
 
         if req.status_code is not 201:
             raise RemoteDataUploadError('Could not upload {}'.format(req))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
 
             return True
@@ -156,6 +157,7 @@ class resources(nd):
 
         if req.status_code is not 204:
             raise RemoteDataUploadError('Could not delete {}'.format(req.text))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -209,6 +211,7 @@ class resources(nd):
 
         if req.status_code is not 201:
             raise RemoteDataUploadError('Cout not upload {}:'.format(req.text))
+        self.invalidate_proj_info(token_name)
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -258,6 +261,7 @@ class resources(nd):
 
         if req.status_code is not 204:
             raise RemoteDataUploadError("Could not delete {}".format(req.text))
+        self.invalidate_proj_info(token_name)
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -337,6 +341,7 @@ class resources(nd):
 
         if req.status_code is not 201:
             raise RemoteDataUploadError('Could not upload {}'.format(req.text))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -399,6 +404,7 @@ class resources(nd):
 
         if req.status_code is not 204:
             raise RemoteDataUploadError('Could not delete {}'.format(req.text))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -481,6 +487,7 @@ class resources(nd):
 
         if req.status_code is not 201:
             raise RemoteDataUploadError('Could not upload {}'.format(req.text))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -531,6 +538,7 @@ class resources(nd):
 
         if req.status_code is not 204:
             raise RemoteDataUploadError('Could not delete {}'.format(req.text))
+        self.invalidate_proj_info()
         if req.content == "" or req.content == b'':
             return True
         else:
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+import random
+import time
+
+import requests
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+
+# Responses that mean "try again later", rather than "this request is wrong".
+RETRY_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+# Connection resets, refused connections, timeouts and truncated responses.
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError
+)
+
+
+def status_error(error_class, message, status_code):
+    """
+    Make an error that remembers the HTTP status code that caused it, so
+    that `is_retryable` can tell whether it is worth trying again.
+
+    Arguments:
+        error_class (type): The exception class to make
+        message (str): The error message
+        status_code (int): The status code of the failed response
+
+    Returns:
+        Exception: The error (not raised)
+    """
+    e = error_class(message)
+    e.status_code = status_code
+    return e
+
+
+def is_retryable(e, status_codes=RETRY_STATUS_CODES):
+    """
+    Decide whether a failed request should be tried again.
+
+    Arguments:
+        e (Exception): The error the request raised
+        status_codes (int[]): The status codes that are worth retrying
+
+    Returns:
+        bool: True if the failure is (probably) temporary
+    """
+    if isinstance(e, RETRY_EXCEPTIONS):
+        return True
+    return getattr(e, 'status_code', None) in status_codes
+
+
+class Retry(object):
+    """
+    A retry policy: how many times to retry a failed request, and how long
+    to wait in between.
+
+    Waits grow exponentially (`backoff`, 2 * `backoff`, 4 * `backoff`, ...,
+    up to `max_backoff` seconds), and each one is drawn uniformly from zero
+    to that bound ("full jitter"), so that many workers that failed at the
+    same moment don't all come back at the same moment too.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF,
+                 max_backoff=MAX_BACKOFF,
+                 status_codes=RETRY_STATUS_CODES,
+                 on_retry=None):
+        """
+        Arguments:
+            retries (int : 3): How many times to retry. 0 never retries.
+            backoff (float : 0.5): The bound, in seconds, on the first wait
+            max_backoff (float : 30): The bound, in seconds, on any wait
+            status_codes (int[]): The HTTP status codes that are retried.
+                Connection errors and timeouts are always retried.
+            on_retry (function : None): Called with the error and the
+                number of the attempt that failed, before each retry
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_codes = frozenset(status_codes)
+        self.on_retry = on_retry
+
+    def delay(self, attempt):
+        """
+        Get how long to wait after a failed attempt.
+
+        Arguments:
+            attempt (int): The number of the attempt that failed, from 0
+
+        Returns:
+            float: Seconds to wait
+        """
+        bound = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, bound)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call `func` until it succeeds, it fails in a way that isn't worth
+        retrying, or it runs out of retries. The last error is raised.
+
+        Arguments:
+            func (function): The function to call
+            *args, **kwargs: Passed to `func`
+
+        Returns:
+            Whatever `func` returns
+        """
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retries or \
+                        not is_retryable(e, self.status_codes):
+                    raise
+                if self.on_retry is not None:
+                    self.on_retry(e, attempt)
+            time.sleep(self.delay(attempt))
+            attempt += 1
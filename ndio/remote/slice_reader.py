@@ -0,0 +1,309 @@
+from __future__ import absolute_import
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from .errors import *
+
+DEFAULT_PREFETCH_BYTES = 256 * 1024 ** 2
+DEFAULT_SLABS_AHEAD = 2
+
+
+class SliceReader(object):
+    """
+    Serve xy slices from whole slabs of z, for tools that walk a dataset
+    slice by slice.
+
+    The server sends at least a cube's depth of z for every cutout, so
+    asking for one slice at a time throws most of each download away.
+    A SliceReader downloads the whole cube-aligned slab around the slice
+    instead, and answers the next slices of the slab from memory. Once it
+    has seen which way the scan goes (up or down in z), it downloads the
+    next `slabs_ahead` slabs in the background, so they are usually ready
+    by the time they are needed. Slabs are kept, least recently used first
+    out, until they take more than `max_bytes`:
+
+        reader = SliceReader(nd)
+        for z in range(1, 1000):
+            img = reader.get_xy_slice('kasthuri11', 'image',
+                                      0, 1024, 0, 1024, z, resolution=3)
+
+    A remote can make one for itself: pass `slice_prefetch=<max_bytes>` to
+    `neurodata`, and its `get_xy_slice` and `get_image` use it.
+    """
+
+    def __init__(self, remote,
+                 max_bytes=DEFAULT_PREFETCH_BYTES,
+                 slabs_ahead=DEFAULT_SLABS_AHEAD,
+                 slab_depth=None):
+        """
+        Arguments:
+            remote (neurodata): The remote to download from. An
+                `ndio.remote.data` works too.
+            max_bytes (int : 256MiB): How much memory the slabs (including
+                the ones being downloaded) may take. The slab being read is
+                always downloaded, even if it is bigger than this.
+            slabs_ahead (int : 2): How many slabs to download ahead of the
+                scan. 0 turns prefetching off.
+            slab_depth (int : None): The z depth of a slab. Defaults to the
+                cube depth of the dataset.
+        """
+        self._data = getattr(remote, 'data', remote)
+        self.max_bytes = max_bytes
+        self.slabs_ahead = slabs_ahead
+        self.slab_depth = slab_depth
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+        # slab key -> (future, nbytes), least recently used first
+        self._slabs = collections.OrderedDict()
+        self._bytes = 0
+        # scan key -> (last z, direction)
+        self._scans = {}
+        # slab key -> the number of threads waiting for the slab
+        self._waiters = collections.Counter()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get_xy_slice(self, token, channel,
+                     x_start, x_stop,
+                     y_start, y_stop,
+                     z_index,
+                     resolution=0):
+        """
+        Get an xy slice, from memory if its slab has been downloaded.
+
+        Arguments:
+            token (str): Token to identify data to download
+            channel (str): Channel
+            resolution (int): Resolution level
+            Q_start (int): The lower bound of dimension 'Q'
+            Q_stop (int): The upper bound of dimension 'Q'
+            z_index (int): The z-slice to image
+
+        Returns:
+            numpy.ndarray: The slice, as from `get_xy_slice`
+        """
+        scan = (token, channel, resolution, x_start, x_stop, y_start, y_stop)
+        z_range, depth, itemsize = self._geometry(token, channel, resolution)
+        if not z_range[0] <= z_index < z_range[1]:
+            # Let the server say what's wrong with it.
+            return numpy.squeeze(self._data.get_cutout(
+                token, channel, x_start, x_stop, y_start, y_stop,
+                z_index, z_index + 1, resolution=resolution))
+
+        slab_nbytes = (x_stop - x_start) * (y_stop - y_start) * itemsize
+        z0 = z_range[0] + (z_index - z_range[0]) // depth * depth
+
+        with self._lock:
+            last, direction = self._scans.get(scan, (None, 0))
+            if last is not None and z_index != last:
+                direction = 1 if z_index > last else -1
+            self._scans[scan] = (z_index, direction)
+
+            ahead = []
+            if direction:
+                for i in range(1, self.slabs_ahead + 1):
+                    z = z0 + direction * i * depth
+                    if not z_range[0] <= z < z_range[1]:
+                        break
+                    ahead.append(z)
+            # Downloads may push out slabs the scan has left behind, but
+            # never the one being read or the ones ahead of it.
+            keep = set(scan + (z,) for z in [z0] + ahead)
+
+            key = scan + (z0,)
+            f, started = self._slab(scan, z0, z_range, depth, slab_nbytes,
+                                    keep)
+            self._waiters[key] += 1
+            if started:
+                self.misses += 1
+            else:
+                self.hits += 1
+            for z in ahead:
+                if scan + (z,) in self._slabs:
+                    continue
+                nbytes = slab_nbytes * (min(z + depth, z_range[1]) - z)
+                if not self._make_room(self.max_bytes - nbytes, keep):
+                    break
+                self._slab(scan, z, z_range, depth, slab_nbytes, keep)
+                self.prefetched += 1
+
+        try:
+            slab = f.result()
+        except Exception:
+            with self._lock:
+                if self._slabs.get(key, (None,))[0] is f:
+                    self._forget(key)
+            raise
+        finally:
+            with self._lock:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    del self._waiters[key]
+        return numpy.squeeze(slab[:, :, z_index - z0]).copy()
+
+    def get_image(self, token, channel,
+                  x_start, x_stop,
+                  y_start, y_stop,
+                  z_index,
+                  resolution=0):
+        """
+        Alias for the `get_xy_slice` function for backwards compatibility.
+        """
+        return self.get_xy_slice(token, channel,
+                                 x_start, x_stop,
+                                 y_start, y_stop,
+                                 z_index,
+                                 resolution)
+
+    def _geometry(self, token, channel, resolution):
+        """
+        Get the z extent and slab depth of a dataset, and the itemsize of
+        one of its channels.
+
+        Returns:
+            ((int, int), int, int): (z_start, z_stop), slab depth, itemsize
+        """
+        info = self._data.get_proj_info(token)
+        res = str(resolution)
+        if res not in info['dataset']['imagesize']:
+            raise RemoteDataNotFoundError("Resolution " + res +
+                                          " is not available.")
+        if channel not in info['channels']:
+            raise RemoteDataNotFoundError("Channel " + channel +
+                                          " is not available.")
+        z_start = info['dataset']['offset'][res][2]
+        z_stop = z_start + info['dataset']['imagesize'][res][2]
+        depth = self.slab_depth or info['dataset']['cube_dimension'][res][2]
+        itemsize = numpy.dtype(info['channels'][channel]['datatype']).itemsize
+        return (z_start, z_stop), depth, itemsize
+
+    def _slab(self, scan, z0, z_range, depth, slab_nbytes, keep=()):
+        """
+        Get the future of a slab, starting its download if it isn't already
+        in memory. Room is made for it as for `_make_room`, but it is
+        downloaded even if there isn't enough. Call with the lock held.
+
+        Returns:
+            (Future, bool): The slab, and whether its download just started
+        """
+        key = scan + (z0,)
+        if key in self._slabs:
+            self._slabs[key] = self._slabs.pop(key)
+            return self._slabs[key][0], False
+
+        z1 = min(z0 + depth, z_range[1])
+        nbytes = slab_nbytes * (z1 - z0)
+        self._make_room(self.max_bytes - nbytes, keep)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max(1, self.slabs_ahead + 1))
+
+        token, channel, resolution, x_start, x_stop, y_start, y_stop = scan
+        f = self._executor.submit(self._data.get_cutout, token, channel,
+                                  x_start, x_stop,
+                                  y_start, y_stop,
+                                  z0, z1,
+                                  resolution=resolution)
+        self._slabs[key] = (f, nbytes)
+        self._bytes += nbytes
+        return f, True
+
+    def _make_room(self, max_bytes, keep):
+        """
+        Forget least recently used slabs, except those in `keep` and those
+        that a thread is waiting for, until the rest take at most
+        `max_bytes`. Call with the lock held.
+
+        Returns:
+            bool: Whether that was possible
+        """
+        for key in list(self._slabs):
+            if self._bytes <= max_bytes:
+                break
+            if key not in keep and not self._waiters[key]:
+                self._forget(key)
+        return self._bytes <= max_bytes
+
+    def _forget(self, key):
+        """
+        Forget one slab, cancelling it if it hasn't started downloading.
+        Call with the lock held.
+        """
+        if key in self._slabs:
+            f, nbytes = self._slabs.pop(key)
+            f.cancel()
+            self._bytes -= nbytes
+
+    def clear(self):
+        """
+        Forget every slab (except the ones being read) and scan, and reset
+        the statistics.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._make_room(0, ())
+            self._scans.clear()
+            self.hits = 0
+            self.misses = 0
+            self.prefetched = 0
+
+    def close(self):
+        """
+        Forget every slab, and stop the background downloads.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self.clear()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self):
+        """
+        Get the hit/miss statistics of this reader. Every slice read is a
+        hit if its slab was already in memory (or on its way), and a miss
+        otherwise.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: hits, misses, hit_rate, prefetched (the number of slabs
+                downloaded ahead of the scan) and bytes (the memory the slabs
+                take, or will once they are downloaded)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'prefetched': self.prefetched,
+                'bytes': self._bytes
+            }
+
+    def __enter__(self):
+        """
+        Use the reader for the length of a `with` block.
+        """
+        return self
+
+    def __exit__(self, *exc):
+        """
+        Close the reader at the end of a `with` block.
+        """
+        self.close()
@@ -0,0 +1,144 @@
+from __future__ import absolute_import
+
+import numpy
+
+
+class SparseCutout(object):
+    """
+    A cutout that holds only its non-empty blocks, for channels (like
+    annotations) that are mostly zeros:
+
+        sparse = nd.get_sparse_cutout('tok', 'annotation',
+                                      0, 4096, 0, 4096, 1, 257,
+                                      resolution=0)
+        sparse.occupancy.mean()     # the fraction of blocks with any data
+        coords, values = sparse.to_coo()
+        dense = sparse.todense()
+
+    Blocks are keyed by their ((x_start, x_stop), (y_start, y_stop),
+    (z_start, z_stop)) bounds, in dataset coordinates, and hold (x, y, z)
+    arrays. A block that is not in `blocks` is all zeros.
+    """
+
+    def __init__(self, bounds, dtype, edges, blocks=None):
+        """
+        Arguments:
+            bounds (tuple[3]): (start, stop) of the whole cutout along x, y
+                and z
+            dtype (numpy.dtype): The datatype of the channel
+            edges (numpy.ndarray[3]): The block edges along each axis, as
+                from `ndio.utils.planner.plan_edges`
+            blocks (dict : None): Non-empty blocks to start with
+        """
+        self.bounds = tuple(tuple(b) for b in bounds)
+        self.dtype = numpy.dtype(dtype)
+        self.edges = edges
+        self.blocks = dict(blocks or {})
+
+    @property
+    def shape(self):
+        """
+        The (x, y, z) shape of the whole cutout.
+        """
+        return tuple(b[1] - b[0] for b in self.bounds)
+
+    @property
+    def nnz(self):
+        """
+        The number of non-zero voxels.
+        """
+        return sum(int(numpy.count_nonzero(b)) for b in self.blocks.values())
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes the non-empty blocks take.
+        """
+        return sum(b.nbytes for b in self.blocks.values())
+
+    @property
+    def occupancy(self):
+        """
+        A boolean (x, y, z) array with one entry per block, True where the
+        block has any non-zero voxels.
+        """
+        mask = numpy.zeros([max(len(e) - 1, 0) for e in self.edges],
+                           dtype=bool)
+        for bounds in self.blocks:
+            mask[self.block_index(bounds)] = True
+        return mask
+
+    def block_index(self, bounds):
+        """
+        Get the position of a block in the `occupancy` grid.
+
+        Arguments:
+            bounds (tuple[3]): The block's (start, stop) along x, y and z
+
+        Returns:
+            (int, int, int): The index of the block
+        """
+        return tuple(int(numpy.searchsorted(e, b[0]))
+                     for e, b in zip(self.edges, bounds))
+
+    def add(self, bounds, block):
+        """
+        Keep a downloaded block, if it has any non-zero voxels.
+
+        Arguments:
+            bounds (tuple[3]): The block's (start, stop) along x, y and z
+            block (numpy.ndarray): The block, in (x, y, z) order
+
+        Returns:
+            bool: Whether the block was kept
+        """
+        if not block.any():
+            return False
+        self.blocks[tuple(tuple(b) for b in bounds)] = block
+        return True
+
+    def todense(self):
+        """
+        Assemble the whole cutout.
+
+        Arguments:
+            None
+
+        Returns:
+            numpy.ndarray: The cutout, in (x, y, z) order
+        """
+        out = numpy.zeros(self.shape, dtype=self.dtype)
+        for bounds, block in self.blocks.items():
+            out[tuple(slice(b[0] - a[0], b[1] - a[0])
+                      for b, a in zip(bounds, self.bounds))] = block
+        return out
+
+    def to_coo(self):
+        """
+        List the non-zero voxels, in coordinate (COO) format.
+
+        Arguments:
+            None
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): An (n, 3) array of the (x, y, z)
+                dataset coordinates of every non-zero voxel, and an (n,)
+                array of their values
+        """
+        coords = [numpy.zeros((0, 3), dtype=numpy.int64)]
+        values = [numpy.zeros(0, dtype=self.dtype)]
+        for bounds in sorted(self.blocks):
+            block = self.blocks[bounds]
+            nonzero = numpy.nonzero(block)
+            coords.append(numpy.stack(nonzero, axis=-1) +
+                          [b[0] for b in bounds])
+            values.append(block[nonzero])
+        return numpy.concatenate(coords), numpy.concatenate(values)
+
+    def __repr__(self):
+        """
+        Describe the cutout's bounds and how many of its blocks are stored.
+        """
+        return "SparseCutout(bounds={}, dtype={}, blocks={}/{})".format(
+            self.bounds, self.dtype, len(self.blocks),
+            int(numpy.prod([max(len(e) - 1, 0) for e in self.edges])))
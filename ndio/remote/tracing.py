@@ -0,0 +1,419 @@
+"""
+Structured events for every request and decode a remote makes, to find out
+where the time of a slow transfer goes:
+
+    tracer = Tracer()
+    nd = neurodata(tracer=tracer)
+    nd.get_cutout('tok', 'image', 0, 4096, 0, 4096, 0, 64)
+
+    tracer.counters()['http']       # requests, bytes, errors, seconds...
+    tracer.histogram('decode', 'duration').percentile(95)
+    tracer.dump_chrome_trace('cutout.json')     # open in chrome://tracing
+
+Events are plain dicts. Every event has a `kind`, the `start` time (from
+`time.time()`), its `duration` in seconds, and the `thread` it ran on. The
+kinds and their other fields are:
+
+    http: One HTTP request, for each attempt. `method`, `url`, `template`
+        (the url with its numbers replaced, to group requests by),
+        `status`, `bytes_sent`, `bytes_received`, `wait` (seconds spent
+        waiting for a free slot on the host), `server` (seconds until the
+        response headers arrived, which includes connecting) and
+        `transfer` (seconds spent reading the response body).
+    download: One cutout request, including its retries and its decoding.
+        `template`, `codec`, `bytes_received`, `retries`.
+    decode: Decoding one downloaded cutout. `codec`, `bytes_received`.
+    encode: Encoding one upload. `codec`, `bytes_sent`.
+    upload: One upload request, including its retries. `template`,
+        `codec`, `bytes_sent`, `retries`.
+    assemble: Copying a decoded block into its place in a larger volume,
+        when it couldn't be decoded there directly.
+
+An event that failed has an `error` field with the error message.
+"""
+from __future__ import absolute_import
+import collections
+import copy
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_MAX_EVENTS = 100000
+
+# The numeric fields that are summed in `counters` and kept as histograms.
+MEASURES = ('duration', 'wait', 'server', 'transfer',
+            'bytes_sent', 'bytes_received', 'retries')
+
+_RANGE = re.compile(r'(?<=/)\d+,\d+(?=/)')
+_NUMBER = re.compile(r'(?<=/)\d+(?=/)')
+
+
+def url_template(url):
+    """
+    Replace the ranges and numbers in the path of a url with placeholders,
+    so that requests for different blocks of the same channel can be
+    grouped together.
+
+    Arguments:
+        url (str): The url
+
+    Returns:
+        str: The url, with '{range}' for each 'start,stop' and '{n}' for
+            each other number between slashes
+    """
+    return _NUMBER.sub('{n}', _RANGE.sub('{range}', url))
+
+
+class Histogram(object):
+    """
+    A histogram of non-negative values, in buckets that double in size, so
+    that it stays small whatever the range of the values.
+    """
+
+    def __init__(self):
+        """
+        Start an empty histogram.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = collections.Counter()
+
+    @staticmethod
+    def bucket(value):
+        """
+        Get the bucket a value falls in: bucket `i` holds the values from
+        2 ** (i - 1) to 2 ** i, and bucket None holds zeros.
+        """
+        if value <= 0:
+            return None
+        return int(math.ceil(math.log(value, 2)))
+
+    def add(self, value):
+        """
+        Count one value.
+
+        Arguments:
+            value (float): The value
+
+        Returns:
+            None
+        """
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[self.bucket(value)] += 1
+
+    @property
+    def mean(self):
+        """
+        The mean of the values, or None if there are none.
+        """
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        Estimate a percentile, from the upper bound of the bucket it falls
+        in (so it is at most twice too big).
+
+        Arguments:
+            p (float): The percentile, from 0 to 100
+
+        Returns:
+            float: The estimate, or None if there are no values
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = self.buckets[None]
+        if seen >= rank and seen:
+            return 0.0
+        for i in sorted(b for b in self.buckets if b is not None):
+            seen += self.buckets[i]
+            if seen >= rank:
+                return min(2.0 ** i, self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Get the histogram as a dict, with the bucket upper bounds as keys.
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'buckets': dict((0.0 if b is None else 2.0 ** b, n)
+                            for b, n in self.buckets.items())
+        }
+
+    def __repr__(self):
+        """
+        Summarize the histogram, without its buckets.
+        """
+        return "Histogram(count={}, mean={}, min={}, max={})".format(
+            self.count, self.mean, self.min, self.max)
+
+
+class Tracer(object):
+    """
+    Collects the events of one or more remotes (pass it as their `tracer`
+    argument), and passes each one on to any callbacks.
+
+    All of its methods are safe to call from any thread. Callbacks are
+    called on the thread that made the event, so they should be quick.
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        """
+        Arguments:
+            max_events (int : 100000): How many of the latest events to keep
+                for `events` and the timeline dumps. Counters and histograms
+                count every event. If 0, no events are kept.
+        """
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._events = collections.deque(maxlen=max_events)
+        self._counters = {}
+        self._histograms = {}
+
+    def add_callback(self, callback):
+        """
+        Call a function with every event from now on.
+
+        Arguments:
+            callback (function): Called with the event dict
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._callbacks = self._callbacks + [callback]
+
+    def remove_callback(self, callback):
+        """
+        Stop calling a function added with `add_callback`.
+
+        Arguments:
+            callback (function): The callback
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._callbacks = [c for c in self._callbacks if c != callback]
+
+    def emit(self, event):
+        """
+        Record an event and pass it to the callbacks.
+
+        Arguments:
+            event (dict): The event, with at least a `kind`
+
+        Returns:
+            None
+        """
+        kind = event['kind']
+        with self._lock:
+            self._events.append(event)
+            counts = self._counters.setdefault(
+                kind, collections.Counter())
+            counts['count'] += 1
+            if 'error' in event:
+                counts['errors'] += 1
+            for name in MEASURES:
+                value = event.get(name)
+                if value is None:
+                    continue
+                counts[name] += value
+                key = (kind, name)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram()
+                self._histograms[key].add(value)
+            callbacks = self._callbacks
+        for callback in callbacks:
+            callback(event)
+
+    @contextmanager
+    def span(self, kind, **fields):
+        """
+        Time a block of code, and emit it as an event once it is done. The
+        block may add fields to the event it is given.
+
+            with tracer.span('decode', codec='blosc') as event:
+                event['bytes_received'] = len(content)
+
+        Arguments:
+            kind (str): The kind of event
+            **fields: Fields of the event
+
+        Returns:
+            dict: The event
+        """
+        event = fields
+        event['kind'] = kind
+        event['thread'] = threading.current_thread().name
+        event['start'] = time.time()
+        try:
+            yield event
+        except Exception as e:
+            event['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            event['duration'] = time.time() - event['start']
+            self.emit(event)
+
+    @property
+    def events(self):
+        """
+        The latest events, oldest first.
+        """
+        with self._lock:
+            return list(self._events)
+
+    def counters(self):
+        """
+        Get the totals of each kind of event: how many there were, how many
+        failed, and the sums of their durations, bytes and other measures.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: {kind: {'count': int, 'errors': int, 'duration': float,
+                ...}}
+        """
+        with self._lock:
+            return dict((kind, dict(counts))
+                        for kind, counts in self._counters.items())
+
+    def histogram(self, kind, name='duration'):
+        """
+        Get the histogram of one measure of one kind of event.
+
+        Arguments:
+            kind (str): The kind of event, such as 'http' or 'decode'
+            name (str : 'duration'): The measure, one of `MEASURES`
+
+        Returns:
+            Histogram: The histogram (empty, if there were no such events)
+        """
+        with self._lock:
+            return copy.deepcopy(self._histograms.get((kind, name),
+                                                      Histogram()))
+
+    def histograms(self):
+        """
+        Get every histogram, as dicts.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: {kind: {measure: dict}}, as from `Histogram.to_dict`
+        """
+        out = {}
+        with self._lock:
+            for (kind, name), h in self._histograms.items():
+                out.setdefault(kind, {})[name] = h.to_dict()
+        return out
+
+    def reset(self):
+        """
+        Forget every event, counter and histogram. Callbacks are kept.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._events.clear()
+            self._counters = {}
+            self._histograms = {}
+
+    def chrome_trace(self):
+        """
+        Get the kept events in the Chrome trace event format, which
+        chrome://tracing and https://ui.perfetto.dev can show as a
+        timeline, with a row for each thread.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: The trace
+        """
+        pid = os.getpid()
+        trace = []
+        for event in self.events:
+            args = dict((k, v) for k, v in event.items()
+                        if k not in ('kind', 'start', 'duration', 'thread'))
+            trace.append({
+                'name': event.get('template', event['kind']),
+                'cat': event['kind'],
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': event.get('duration', 0) * 1e6,
+                'pid': pid,
+                'tid': event.get('thread'),
+                'args': args
+            })
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, filename):
+        """
+        Write the kept events to a file, as from `chrome_trace`.
+
+        Arguments:
+            filename (str): The file to write
+
+        Returns:
+            None
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def dump_json(self, filename):
+        """
+        Write the kept events to a file, as one JSON object per line.
+
+        Arguments:
+            filename (str): The file to write
+
+        Returns:
+            None
+        """
+        with open(filename, 'w') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+
+
+@contextmanager
+def _untraced(fields):
+    yield fields
+
+
+def span(tracer, kind, **fields):
+    """
+    Time a block of code with `tracer.span`, or do nothing if `tracer` is
+    None.
+
+    Arguments:
+        tracer (Tracer): The tracer, or None
+        kind (str): The kind of event
+        **fields: Fields of the event
+
+    Returns:
+        A context manager that gives the event dict
+    """
+    if tracer is None:
+        return _untraced(fields)
+    return tracer.span(kind, **fields)
@@ -0,0 +1,8 @@
+"""
+Utilities for testing and benchmarking code that uses ndio, without the
+live neurodata services.
+"""
+
+
+from __future__ import absolute_import
+from .ndstore import FakeNDStore
@@ -0,0 +1,390 @@
+from __future__ import absolute_import
+import json
+import random
+import threading
+import time
+import zlib
+from io import BytesIO
+
+import blosc
+import h5py
+import numpy
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlparse
+
+# How much of a throttled response is written between pauses.
+_THROTTLE_CHUNK = 64 * 1024
+
+
+class FakeNDStore(object):
+    """
+    A stand-in for an ndstore server, running on localhost, for testing and
+    benchmarking ndio without the real service.
+
+    It serves project info (`<token>/info/`), the public token list and
+    cutouts (`<token>/<channel>/blosc|hdf5|npz/<res>/x0,x1/y0,y1/z0,z1/`,
+    plus `t0,t1/` for timeseries), and accepts blosc and npz uploads, all
+    backed by numpy arrays that you provide. Arrays can be numpy memmaps, for
+    datasets larger than memory.
+
+    To make it behave more like a server at the other end of a real network,
+    every request can be delayed (`latency`), responses can be throttled
+    (`bandwidth`), and a fraction of cutout requests can fail
+    (`error_rate`):
+
+        with FakeNDStore(latency=0.02) as server:
+            server.add_channel('tok', 'image', numpy.zeros((512, 512, 32),
+                                                           numpy.uint8))
+            nd = neurodata(hostname=server.hostname, protocol='http')
+            nd.get_cutout('tok', 'image', 0, 512, 0, 512, 0, 32,
+                          resolution=0)
+    """
+
+    def __init__(self, latency=0, bandwidth=None,
+                 error_rate=0, error_code=503,
+                 seed=None, host='127.0.0.1', port=0,
+                 suffix='nd'):
+        """
+        Arguments:
+            latency (float : 0): Seconds to wait before answering a request
+            bandwidth (float : None): Bytes per second to send responses at.
+                If None, responses are sent as fast as possible.
+            error_rate (float : 0): The fraction of cutout requests (down or
+                up) that fail. Info requests never fail.
+            error_code (int : 503): The status code of failed requests
+            seed (int : None): Seed for choosing which requests fail
+            host (str : '127.0.0.1'): The address to listen on
+            port (int : 0): The port to listen on. 0 picks a free one.
+            suffix (str : 'nd'): The first part of every path, like the
+                `suffix` option of `neurodata`
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.suffix = suffix
+
+        self._random = random.Random(seed)
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.store = self
+        self._thread = None
+
+    @property
+    def hostname(self):
+        """
+        The host:port to pass to a remote as its `hostname`.
+        """
+        host, port = self._server.server_address[:2]
+        return "{}:{}".format(host, port)
+
+    def add_channel(self, token, channel, volume,
+                    resolution=0,
+                    offset=(0, 0, 0),
+                    cube_dimension=(64, 64, 16),
+                    channel_type=None,
+                    public=True):
+        """
+        Serve a volume as one channel of a token, at one resolution. Call it
+        once per resolution to serve several.
+
+        Arguments:
+            token (str): The token
+            channel (str): The channel name
+            volume (numpy.ndarray): The data, in (x, y, z) order, or
+                (x, y, z, t) for a timeseries. Uploads write into it.
+            resolution (int : 0): The resolution to serve it at
+            offset (int[3] : (0, 0, 0)): The xyz coordinate of the first voxel
+            cube_dimension (int[3] : (64, 64, 16)): The cube dimensions to
+                report in the project info
+            channel_type (str : None): The channel type to report. Defaults
+                to 'timeseries' for 4D volumes and 'image' otherwise.
+            public (bool : True): Whether to list the token in
+                `public_tokens/`
+
+        Returns:
+            None
+        """
+        if volume.ndim not in (3, 4):
+            raise ValueError("volume must be (x, y, z) or (x, y, z, t).")
+        if channel_type is None:
+            channel_type = 'timeseries' if volume.ndim == 4 else 'image'
+        with self._lock:
+            project = self._tokens.setdefault(token, {
+                'public': public,
+                'resolutions': {},
+                'channels': {}
+            })
+            project['public'] = project['public'] and public
+            project['resolutions'][str(resolution)] = {
+                'imagesize': list(volume.shape[:3]),
+                'offset': list(offset),
+                'cube_dimension': list(cube_dimension)
+            }
+            project['channels'].setdefault(channel, {
+                'channel_type': channel_type,
+                'datatype': volume.dtype.name,
+                'volumes': {}
+            })['volumes'][str(resolution)] = volume
+
+    def volume(self, token, channel, resolution=0):
+        """
+        Get the array backing a channel.
+
+        Arguments:
+            token (str): The token
+            channel (str): The channel name
+            resolution (int : 0): The resolution
+
+        Returns:
+            numpy.ndarray: The data, in (x, y, z) or (x, y, z, t) order
+        """
+        return self._tokens[token]['channels'][channel]['volumes'][
+            str(resolution)]
+
+    def info(self, token):
+        """
+        Get the project info of a token, as `get_proj_info` would return it.
+
+        Arguments:
+            token (str): The token
+
+        Returns:
+            dict: The project info
+        """
+        project = self._tokens[token]
+        res = project['resolutions']
+        timepoints = [v.shape[3] for c in project['channels'].values()
+                      for v in c['volumes'].values() if v.ndim == 4]
+        return {
+            'dataset': {
+                'description': token,
+                'resolutions': sorted(int(r) for r in res),
+                'imagesize': dict((r, v['imagesize']) for r, v in res.items()),
+                'offset': dict((r, v['offset']) for r, v in res.items()),
+                'cube_dimension': dict((r, v['cube_dimension'])
+                                       for r, v in res.items()),
+                'neariso_scaledown': dict((r, 1) for r in res),
+                'timerange': [0, max(timepoints) if timepoints else 0]
+            },
+            'channels': dict((name, {
+                'channel_type': c['channel_type'],
+                'datatype': c['datatype'],
+                'description': name,
+                'readonly': 0,
+                'resolution': min(int(r) for r in c['volumes'])
+            }) for name, c in project['channels'].items()),
+            'project': {
+                'name': token,
+                'description': token
+            },
+            'metadata': {}
+        }
+
+    def reset_stats(self):
+        """
+        Zero the request counters.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.stats = {
+                'requests': 0,
+                'errors': 0,
+                'bytes_sent': 0,
+                'bytes_received': 0
+            }
+
+    def _count(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                self.stats[k] += v
+
+    def _fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def start(self):
+        """
+        Start serving, in a background thread.
+
+        Arguments:
+            None
+
+        Returns:
+            FakeNDStore: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serve in the calling thread, until `stop` is called from another.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stop serving and close the socket.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        """
+        Start serving, for the length of a `with` block.
+        """
+        return self.start()
+
+    def __exit__(self, *exc):
+        """
+        Stop serving at the end of a `with` block.
+        """
+        self.stop()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        store = self.server.store
+        body = b''
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+        store._count(requests=1, bytes_received=len(body))
+
+        if store.latency:
+            time.sleep(store.latency)
+
+        # The client joins its url parts with doubled slashes in places.
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        if parts[:2] != [store.suffix, 'sd']:
+            return self._send(404, b'Not found', 'text/plain')
+        parts = parts[2:]
+
+        try:
+            if method == 'GET' and parts == ['public_tokens']:
+                tokens = [t for t, p in store._tokens.items() if p['public']]
+                return self._send_json(sorted(tokens))
+            if method == 'GET' and len(parts) == 2 and parts[1] == 'info':
+                return self._send_json(store.info(parts[0]))
+            if len(parts) >= 7:
+                if store.error_rate and store._fail():
+                    store._count(errors=1)
+                    return self._send(store.error_code, b'Injected failure',
+                                      'text/plain')
+                return self._cutout(method, parts, body)
+        except (KeyError, ValueError, IndexError) as e:
+            return self._send(404, str(e).encode('utf-8'), 'text/plain')
+        return self._send(404, b'Not found', 'text/plain')
+
+    def _cutout(self, method, parts, body):
+        store = self.server.store
+        token, channel, codec, res = parts[:4]
+        project = store._tokens[token]
+        volume = project['channels'][channel]['volumes'][res]
+        offset = project['resolutions'][res]['offset']
+        bounds = [[int(i) for i in p.split(',')] for p in parts[4:7]]
+        offset = list(offset)
+        if volume.ndim == 4:
+            # Timeseries cutouts default to the first timepoint.
+            t = [0, 1]
+            if len(parts) > 7 and ',' in parts[7] and parts[7] != '0,0':
+                t = [int(i) for i in parts[7].split(',')]
+            bounds.append(t)
+            offset.append(0)
+        index = []
+        for (start, stop), o, n in zip(bounds, offset, volume.shape):
+            if not o <= start < stop <= o + n:
+                raise ValueError("Bounds {} are outside of the dataset."
+                                 .format(bounds))
+            index.append(slice(start - o, stop - o))
+        # The volume is xyz(t), and cutouts travel as (t)zyx.
+        index = tuple(index)
+
+        if method == 'POST':
+            if codec == 'blosc':
+                data = blosc.unpack_array(body)
+            elif codec == 'npz':
+                data = numpy.load(BytesIO(zlib.decompress(body)))
+            else:
+                raise ValueError("Can't upload {}.".format(codec))
+            volume[index] = data[0].T
+            return self._send(200, b'', 'text/plain')
+
+        cutout = numpy.ascontiguousarray(volume[index].T)
+        if codec == 'blosc':
+            payload = blosc.pack_array(cutout[numpy.newaxis])
+        elif codec == 'npz':
+            buf = BytesIO()
+            numpy.save(buf, cutout[numpy.newaxis])
+            payload = zlib.compress(buf.getvalue())
+        elif codec == 'hdf5':
+            buf = BytesIO()
+            with h5py.File(buf, 'w') as h5file:
+                h5file.create_group(channel).create_dataset('CUTOUT',
+                                                            data=cutout)
+            payload = buf.getvalue()
+        else:
+            raise ValueError("Unknown format {}.".format(codec))
+        return self._send(200, payload, 'application/octet-stream')
+
+    def _send_json(self, obj):
+        return self._send(200, json.dumps(obj).encode('utf-8'),
+                          'application/json')
+
+    def _send(self, code, payload, content_type):
+        store = self.server.store
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if not store.bandwidth:
+            self.wfile.write(payload)
+        else:
+            for i in range(0, len(payload), _THROTTLE_CHUNK):
+                chunk = payload[i:i + _THROTTLE_CHUNK]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / float(store.bandwidth))
+        store._count(bytes_sent=len(payload))
@@ -0,0 +1,141 @@
+"""
+Shrink arrays to a given shape on the client, for overviews and thumbnails
+of channels that the server has no resolution small enough for.
+
+Each output voxel summarises a bin of input voxels. Bins split every axis
+as evenly as they can (their sizes differ by at most one), so any shape
+can be shrunk to any smaller one. Image channels are averaged ('mean').
+Annotation channels take the most common label in each bin ('mode'), so
+that no label is made up by averaging two others.
+"""
+from __future__ import absolute_import
+import numpy
+
+METHODS = ('mean', 'mode')
+
+
+def bin_edges(n, m):
+    """
+    Split `n` voxels into `m` bins, as evenly as possible.
+
+    Arguments:
+        n (int): The number of voxels
+        m (int): The number of bins, at most `n`
+
+    Returns:
+        numpy.ndarray: The `m + 1` edges of the bins
+    """
+    return (numpy.arange(m + 1) * n) // m
+
+
+def fit_shape(shape, max_voxels):
+    """
+    Shrink a shape evenly along every axis until it has at most
+    `max_voxels` voxels. No axis shrinks below one voxel.
+
+    Arguments:
+        shape (int[]): The shape
+        max_voxels (int): The most voxels to keep
+
+    Returns:
+        int[]: The shrunk shape (or `shape`, if it is small enough)
+    """
+    shape = [int(s) for s in shape]
+    if numpy.prod(shape) <= max_voxels:
+        return shape
+
+    def scaled(factor):
+        return [max(1, int(s * factor)) for s in shape]
+
+    lo, hi = 0.0, 1.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if numpy.prod(scaled(mid)) <= max_voxels:
+            lo = mid
+        else:
+            hi = mid
+    return scaled(lo)
+
+
+def downsample(array, shape, method='mean'):
+    """
+    Shrink an array to a shape.
+
+    Arguments:
+        array (numpy.ndarray): The array
+        shape (int[]): The shape to shrink it to, no bigger than the array
+            along any axis
+        method (str : 'mean'): 'mean' to average each bin, or 'mode' to
+            take its most common value
+
+    Returns:
+        numpy.ndarray: An array of `shape`, with the dtype of `array`
+    """
+    shape = tuple(int(s) for s in shape)
+    if len(shape) != array.ndim:
+        raise ValueError("shape must have one entry per axis of the array.")
+    if any(s < 1 or s > n for s, n in zip(shape, array.shape)):
+        raise ValueError("Can't downsample {} to {}.".format(array.shape,
+                                                             shape))
+    if method not in METHODS:
+        raise ValueError("method must be one of {}.".format(METHODS))
+    if shape == array.shape:
+        return array
+    if method == 'mean':
+        return _mean(array, shape)
+    return _mode(array, shape)
+
+
+def _mean(array, shape):
+    """
+    Average each bin, summing one axis at a time with `reduceat`.
+    """
+    out = array.astype(numpy.float64)
+    for axis, (n, m) in enumerate(zip(array.shape, shape)):
+        if n == m:
+            continue
+        edges = bin_edges(n, m)
+        out = numpy.add.reduceat(out, edges[:-1], axis=axis)
+        counts = numpy.diff(edges).reshape(
+            [-1 if a == axis else 1 for a in range(array.ndim)])
+        out /= counts
+    if numpy.issubdtype(array.dtype, numpy.integer):
+        out = numpy.rint(out)
+    return out.astype(array.dtype)
+
+
+def _mode(array, shape):
+    """
+    Take the most common value of each bin. Every bin is sampled with the
+    size of the smallest bin along each axis (so a voxel at the end of a
+    bigger bin may be left out), which lets all of the bins be gathered
+    into one array and sorted at once. Ties go to the smallest value.
+    """
+    index = []
+    width = []
+    for axis, (n, m) in enumerate(zip(array.shape, shape)):
+        edges = bin_edges(n, m)
+        w = int(numpy.diff(edges).min())
+        index.append(edges[:-1, None] + numpy.arange(w))
+        width.append(w)
+
+    # (bins along each axis, then offsets within the bin along each axis)
+    grid = numpy.ix_(*[i.ravel() for i in index])
+    bins = array[grid].reshape([x for m, w in zip(shape, width)
+                                for x in (m, w)])
+    ndim = array.ndim
+    bins = bins.transpose(list(range(0, 2 * ndim, 2)) +
+                          list(range(1, 2 * ndim, 2)))
+    bins = bins.reshape(shape + (-1,))
+
+    values = numpy.sort(bins, axis=-1)
+    positions = numpy.arange(values.shape[-1])
+    starts = numpy.ones(values.shape, dtype=bool)
+    starts[..., 1:] = values[..., 1:] != values[..., :-1]
+    # How far into its run of equal values each position is.
+    run_start = numpy.maximum.accumulate(numpy.where(starts, positions, 0),
+                                         axis=-1)
+    run_length = positions - run_start
+    best = numpy.argmax(run_length, axis=-1).ravel()
+    values = values.reshape(-1, values.shape[-1])
+    return values[numpy.arange(len(best)), best].reshape(shape)
@@ -0,0 +1,179 @@
+"""
+Plan how to split a large box (a cutout, an upload, a time series) into
+blocks that line up with a dataset's cubes.
+
+A box is given by its `start` and `stop` corners, with one entry per axis:
+(x, y, z) or (x, y, z, t). Blocks are cut along a grid of `block_size`
+steps that starts at `origin`, so every block lies within one grid cell,
+and the blocks at the edges of the box are cut short. The edges of the
+grid along each axis are computed with numpy, and blocks are produced
+lazily from them, so planning is instant and takes almost no memory even
+for boxes that span terabytes.
+
+    for block in iter_blocks((0, 0, 1), (10000, 10000, 1001),
+                             origin=(0, 0, 1), block_size=(512, 512, 16)):
+        block.bounds   # ((x_start, x_stop), (y_start, y_stop), ...)
+        block.slices   # where it goes in an array that holds the box
+"""
+from __future__ import absolute_import
+import collections
+import itertools
+
+import numpy
+from six.moves import range
+
+
+class Block(collections.namedtuple('Block', ['bounds', 'slices'])):
+    """
+    One block of a plan.
+
+    Attributes:
+        bounds (tuple): (start, stop) of the block along each axis, in
+            dataset coordinates
+        slices (tuple): slice of the block along each axis, relative to the
+            start of the box. Index an array that holds the box with these
+            (or with `slices[::-1]` if it is zyx-ordered) to read or write
+            the block in place.
+    """
+
+    __slots__ = ()
+
+
+def _check(start, stop, origin, block_size):
+    if block_size is None:
+        raise ValueError("block_size is required.")
+    if origin is None:
+        origin = (0,) * len(start)
+    if not len(start) == len(stop) == len(origin) == len(block_size):
+        raise ValueError("start, stop, origin and block_size must have "
+                         "one entry per axis.")
+    if any(b < 1 for b in block_size):
+        raise ValueError("block_size must be positive.")
+    return origin
+
+
+def axis_edges(start, stop, origin=0, size=1):
+    """
+    Get the edges of the blocks along one axis: `start`, every multiple of
+    `size` (counting from `origin`) strictly between `start` and `stop`,
+    and `stop`.
+
+    Arguments:
+        start (int): The lower bound of the box along the axis
+        stop (int): The upper bound of the box along the axis
+        origin (int : 0): Any edge of the grid (usually the dataset's offset)
+        size (int : 1): The grid spacing along the axis
+
+    Returns:
+        numpy.ndarray: The edges, or an empty array if the box is empty
+    """
+    if stop <= start:
+        return numpy.zeros(0, dtype=numpy.int64)
+    # The first grid line above start. Floor division makes this right for
+    # starts below the origin too.
+    first = origin + ((start - origin) // size + 1) * size
+    inner = numpy.arange(first, stop, size, dtype=numpy.int64)
+    return numpy.concatenate(([start], inner, [stop])).astype(numpy.int64)
+
+
+def plan_edges(start, stop, origin=None, block_size=None):
+    """
+    Get the block edges along every axis of a box.
+
+    Arguments:
+        start (int[]): The lower corner of the box
+        stop (int[]): The upper corner of the box (exclusive)
+        origin (int[] : None): A corner of the grid. Defaults to all zeros.
+        block_size (int[]): The grid spacing along each axis
+
+    Returns:
+        numpy.ndarray[]: The edges along each axis, as from `axis_edges`
+    """
+    origin = _check(start, stop, origin, block_size)
+    return [axis_edges(int(a), int(b), int(o), int(s))
+            for a, b, o, s in zip(start, stop, origin, block_size)]
+
+
+def count_blocks(start, stop, origin=None, block_size=None):
+    """
+    Count the blocks in a plan, without making them.
+
+    Arguments:
+        (as for `iter_blocks`)
+
+    Returns:
+        int: The number of blocks
+    """
+    counts = [max(len(e) - 1, 0)
+              for e in plan_edges(start, stop, origin, block_size)]
+    total = 1
+    for c in counts:
+        total *= c
+    return total
+
+
+def iter_blocks(start, stop, origin=None, block_size=None):
+    """
+    Plan the blocks of a box, one at a time. The first axis varies
+    slowest, so (x, y, z) boxes come out in the same order as from
+    `block_compute`.
+
+    Arguments:
+        start (int[]): The lower corner of the box, e.g. (x, y, z) or
+            (x, y, z, t)
+        stop (int[]): The upper corner of the box (exclusive)
+        origin (int[] : None): A corner of the grid, e.g. the image offset
+            of the dataset at this resolution. Defaults to all zeros.
+        block_size (int[]): The grid spacing along each axis, e.g. the cube
+            dimensions of the dataset at this resolution (or a multiple)
+
+    Returns:
+        generator of Block: The blocks, with their bounds and their slices
+            relative to `start`
+    """
+    edges = [e.tolist() for e in plan_edges(start, stop, origin, block_size)]
+    starts = [int(s) for s in start]
+    axes = []
+    for e, s in zip(edges, starts):
+        axes.append([((e[i], e[i + 1]), slice(e[i] - s, e[i + 1] - s))
+                     for i in range(len(e) - 1)])
+    for cell in itertools.product(*axes):
+        yield Block(tuple(c[0] for c in cell), tuple(c[1] for c in cell))
+
+
+def block_array(start, stop, origin=None, block_size=None):
+    """
+    Plan every block of a box at once, as a numpy array, for callers that
+    want to filter or sort blocks in bulk.
+
+    Arguments:
+        (as for `iter_blocks`)
+
+    Returns:
+        numpy.ndarray: An (n_blocks, n_axes, 2) array of the (start, stop)
+            of each block along each axis, in the order of `iter_blocks`
+    """
+    edges = plan_edges(start, stop, origin, block_size)
+    if any(len(e) < 2 for e in edges):
+        return numpy.zeros((0, len(edges), 2), dtype=numpy.int64)
+    lo = numpy.meshgrid(*[e[:-1] for e in edges], indexing='ij')
+    hi = numpy.meshgrid(*[e[1:] for e in edges], indexing='ij')
+    return numpy.stack([numpy.stack([a.ravel(), b.ravel()], axis=-1)
+                        for a, b in zip(lo, hi)], axis=1)
+
+
+def grid(info, resolution):
+    """
+    Get the grid that blocks of a dataset should line up with, from its
+    project info.
+
+    Arguments:
+        info (dict): The project info, from `get_proj_info`
+        resolution (int): The resolution the blocks are at
+
+    Returns:
+        (int[3], int[3]): The origin and cube dimensions at that resolution
+    """
+    res = str(resolution)
+    return (info['dataset']['offset'][res],
+            info['dataset']['cube_dimension'][res])
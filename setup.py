@@ -20,6 +20,7 @@ setup(
         'ndio.convert',
         'ndio.ramon',
         'ndio.remote',
+        'ndio.testing',
         'ndio.utils'
     ],
     version=VERSION,
@@ -57,11 +58,12 @@ manipulation.',
     install_requires=[
         "pillow>=3.2.0",
         "numpy>=1.0.0",
-        "h5py>=2.6.0",
+        "h5py>=2.9.0",
         "requests",
-        "blosc==1.3.2",
+        "blosc==1.6.2",
         "jsonschema",
         "json-spec",
-        "tifffile"
+        "tifffile",
+        "futures; python_version < '3'"
     ]
 )
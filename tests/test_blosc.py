@@ -0,0 +1,85 @@
+import unittest
+import blosc
+import numpy
+from six.moves import reload_module
+import ndio.convert.blosc as ndblosc
+
+
+class TestBlosc(unittest.TestCase):
+
+    def setUp(self):
+        self.array = numpy.random.RandomState(0).randint(
+            0, 1000, size=(16, 64, 48)).astype(numpy.uint32)
+        self.options = ndblosc.get_options()
+
+    def tearDown(self):
+        ndblosc.set_options(**self.options)
+        ndblosc.MAX_PACK_BYTES = blosc.MAX_BUFFERSIZE - 64 * 1024
+        ndblosc.FRAME_BYTES = 2 ** 30
+
+    def test_round_trip(self):
+        packed = ndblosc.from_array(self.array)
+        numpy.testing.assert_array_equal(ndblosc.to_array(packed),
+                                         self.array)
+        # The servers read it with blosc itself.
+        numpy.testing.assert_array_equal(blosc.unpack_array(packed),
+                                         self.array)
+
+    def test_unframed(self):
+        # Payloads from servers and older versions of ndio.
+        for array in [self.array, self.array.astype(numpy.uint8),
+                      numpy.zeros((0, 4), dtype=numpy.uint64)]:
+            numpy.testing.assert_array_equal(
+                ndblosc.to_array(blosc.pack_array(array)), array)
+
+    def test_framed(self):
+        ndblosc.MAX_PACK_BYTES = 1000
+        ndblosc.FRAME_BYTES = 4096 + 12
+        for array in [self.array, self.array[:, :, ::3],
+                      self.array.astype(numpy.uint8)]:
+            packed = ndblosc.from_array(array)
+            self.assertEqual(packed[:len(ndblosc.FRAMED_MAGIC)],
+                             ndblosc.FRAMED_MAGIC)
+            unpacked = ndblosc.to_array(packed)
+            self.assertEqual(unpacked.dtype, array.dtype)
+            numpy.testing.assert_array_equal(unpacked, array)
+        self.assertRaises(ValueError, ndblosc.to_array,
+                          ndblosc.from_array(self.array)[:-10])
+
+    def test_options(self):
+        self.assertEqual(ndblosc.get_options()['clevel'], 9)
+        for cname in ['blosclz', 'lz4', 'zlib']:
+            if cname not in blosc.cnames:
+                continue
+            packed = ndblosc.from_array(self.array, cname=cname, clevel=5,
+                                        shuffle=blosc.NOSHUFFLE)
+            numpy.testing.assert_array_equal(ndblosc.to_array(packed),
+                                             self.array)
+        self.assertEqual(ndblosc.set_options(clevel=1)['clevel'], 1)
+        self.assertEqual(ndblosc.get_options()['cname'],
+                         self.options['cname'])
+
+        self.assertRaises(ValueError, ndblosc.set_options, clevel=10)
+        self.assertRaises(ValueError, ndblosc.set_options, cname='nope')
+        self.assertRaises(ValueError, ndblosc.set_options, level=1)
+        self.assertRaises(ValueError, ndblosc.from_array, self.array,
+                          nthreads=2)
+
+    def test_global_options(self):
+        old = blosc.set_nthreads(3)
+        try:
+            # Importing ndio leaves blosc's own settings alone...
+            reload_module(ndblosc)
+            ndblosc.set_options(cname='lz4' if 'lz4' in blosc.cnames
+                                else 'blosclz')
+            self.assertEqual(blosc.set_nthreads(3), 3)
+            # ...unless they are set explicitly.
+            ndblosc.set_options(nthreads=2)
+            self.assertEqual(blosc.set_nthreads(3), 2)
+        finally:
+            blosc.set_nthreads(old)
+            ndblosc.set_options(nthreads=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from ndio.remote.cache import BlockCache
+from ndio.remote.metadata import InfoCache
+
+
+class TestBlockCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.blocks = [numpy.random.RandomState(i).randint(
+            0, 255, size=(16, 64, 64)).astype(numpy.uint8) for i in range(4)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def key(self, cache, i):
+        return cache.key('host', 'token', 'image', 0,
+                         ((64 * i, 64 * i + 64), (0, 64), (0, 16)))
+
+    def test_hits(self):
+        cache = BlockCache(self.path)
+        key = self.key(cache, 0)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, self.blocks[0])
+        numpy.testing.assert_array_equal(cache.get(key), self.blocks[0])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        # Another cache on the same directory sees the same blocks.
+        numpy.testing.assert_array_equal(BlockCache(self.path).get(key),
+                                         self.blocks[0])
+
+    def test_overwrite(self):
+        cache = BlockCache(self.path)
+        key = self.key(cache, 0)
+        cache.put(key, self.blocks[0])
+        size = cache.stats()['bytes']
+        cache.put(key, self.blocks[0])
+        self.assertEqual(cache.stats()['bytes'], size)
+        self.assertTrue(cache.remove(key))
+        self.assertFalse(cache.remove(key))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_eviction(self):
+        cache = BlockCache(self.path)
+        cache.put(self.key(cache, 0), self.blocks[0])
+        size = cache.stats()['bytes']
+
+        cache = BlockCache(self.path, max_bytes=int(2.5 * size))
+        for i in range(1, 4):
+            cache.put(self.key(cache, i), self.blocks[i])
+            # Make the use times distinct, oldest first.
+            for j in range(i + 1):
+                filename = cache._file(self.key(cache, j))
+                if os.path.exists(filename):
+                    os.utime(filename, (j, j))
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+        self.assertIsNone(cache.get(self.key(cache, 0)))
+        self.assertIsNone(cache.get(self.key(cache, 1)))
+        numpy.testing.assert_array_equal(cache.get(self.key(cache, 3)),
+                                         self.blocks[3])
+
+    def test_low_water(self):
+        cache = BlockCache(self.path)
+        cache.put(self.key(cache, 0), self.blocks[0])
+        size = cache.stats()['bytes']
+        cache.clear()
+
+        # Filling the cache trims it well below max_bytes, so the next put
+        # doesn't need to look at the directory again.
+        cache = BlockCache(self.path, max_bytes=int(10.5 * size))
+        scans = []
+        scan = cache._scan
+        cache._scan = lambda: scans.append(1) or scan()
+        for i in range(12):
+            block = numpy.roll(self.blocks[i % 4], i)
+            cache.put(self.key(cache, i), block)
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+        self.assertEqual(len(scans), 1)
+
+
+class TestInfoCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'info.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_shared_file(self):
+        # Two processes' caches, writing to one file.
+        first = InfoCache(path=self.file, save_interval=60)
+        second = InfoCache(path=self.file, save_interval=60)
+        first.set('a', {'n': 1})
+        second.set('b', {'n': 2})
+        first.set('c', {'n': 3})
+        # Only the first change of each is written before the interval.
+        self.assertEqual(sorted(InfoCache(path=self.file)._entries),
+                         ['a', 'b'])
+        first.flush()
+        second.flush()
+        self.assertEqual(InfoCache(path=self.file).get('c'), {'n': 3})
+
+        second.invalidate('a')
+        self.assertEqual(sorted(InfoCache(path=self.file)._entries),
+                         ['b', 'c'])
+        self.assertEqual(os.listdir(self.path), ['info.json'])
+
+    def test_corrupt_file(self):
+        with open(self.file, 'w') as f:
+            f.write('{"a": ')
+        cache = InfoCache(path=self.file, save_interval=0)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'n': 1})
+        self.assertEqual(InfoCache(path=self.file).get('a'), {'n': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from io import BytesIO
+import blosc
+import h5py
+import numpy
+import six
+from six.moves import cPickle as pickle
+from ndio.remote import cutout_codecs
+
+
+def hdf5_cutout(channel, cutout):
+    """
+    Pack a cutout the way ndstore sends it as HDF5.
+    """
+    buf = BytesIO()
+    with h5py.File(buf, 'w') as h5file:
+        h5file.create_group(channel).create_dataset('CUTOUT', data=cutout)
+    return buf.getvalue()
+
+
+def blosc_cutout(cutout, protocol=2):
+    """
+    Pack a cutout the way ndstore sends it as blosc, pickled with the given
+    protocol. Python 2 writes an array's data with BINSTRING rather than
+    BINBYTES, so protocol 2 is written the way Python 2 would write it.
+    """
+    array = cutout[numpy.newaxis]
+    if protocol > 2 or six.PY2:
+        pickled = pickle.dumps(array, protocol)
+    else:
+        pickled = pickle.dumps(array, 3).replace(b'\x80\x03', b'\x80\x02', 1)
+        marker = b'B' + numpy.array(array.nbytes, '<u4').tobytes()
+        if array.nbytes > 255:
+            pickled = pickled.replace(marker, b'T' + marker[1:], 1)
+        else:
+            pickled = pickled.replace(b'C' + marker[1:2], b'U' + marker[1:2],
+                                      1)
+    return blosc.compress(pickled, typesize=array.dtype.itemsize)
+
+
+class TestBlosc(unittest.TestCase):
+
+    def setUp(self):
+        self.cutout = numpy.random.RandomState(0).randint(
+            0, 2 ** 15, size=(16, 32, 48)).astype(numpy.uint16)
+        self.decode_blosc = cutout_codecs.decode_blosc
+
+    def tearDown(self):
+        cutout_codecs.decode_blosc = self.decode_blosc
+
+    def fast_path(self):
+        """
+        Fail the test if a cutout is unpickled rather than read in place.
+        """
+        def decode_blosc(content, channel=None):
+            raise AssertionError("The cutout was unpickled")
+        cutout_codecs.decode_blosc = decode_blosc
+
+    def test_protocols(self):
+        self.fast_path()
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            for cutout in [self.cutout, self.cutout[:2, :4, :4]]:
+                content = blosc_cutout(cutout, protocol)
+                numpy.testing.assert_array_equal(
+                    pickle.loads(blosc.decompress(content), **(
+                        {} if six.PY2 else {'encoding': 'latin1'}))[0],
+                    cutout)
+                out = numpy.zeros_like(cutout)
+                self.assertIs(cutout_codecs.decode_blosc_into(content, out),
+                              out)
+                numpy.testing.assert_array_equal(out, cutout)
+
+    def test_views(self):
+        self.fast_path()
+        content = blosc_cutout(self.cutout)
+        volume = numpy.zeros((20, 40, 60), dtype=numpy.uint16)
+        cutout_codecs.decode_blosc_into(content, volume[2:18, 4:36, 6:54])
+        numpy.testing.assert_array_equal(volume[2:18, 4:36, 6:54],
+                                         self.cutout)
+        self.assertEqual(volume.sum(), self.cutout.sum(dtype=numpy.int64))
+
+        # A single timepoint of a timeseries fills a zyx array, and several
+        # fill a tzyx one.
+        out = numpy.zeros_like(self.cutout)
+        cutout_codecs.decode_blosc_into(
+            blosc_cutout(self.cutout[numpy.newaxis]), out)
+        numpy.testing.assert_array_equal(out, self.cutout)
+        movie = numpy.stack([self.cutout, self.cutout[::-1]])
+        out = numpy.zeros_like(movie)
+        cutout_codecs.decode_blosc_into(blosc_cutout(movie), out)
+        numpy.testing.assert_array_equal(out, movie)
+
+    def test_unpickled(self):
+        # Anything that isn't a C-ordered array of out's datatype is
+        # unpickled instead: Fortran order, another datatype, or a blosc
+        # without get_cbuffer_sizes.
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            content = blosc_cutout(numpy.asfortranarray(self.cutout),
+                                   protocol)
+            out = numpy.zeros_like(self.cutout)
+            cutout_codecs.decode_blosc_into(content, out)
+            numpy.testing.assert_array_equal(out, self.cutout)
+
+            content = blosc_cutout(self.cutout, protocol)
+            out = numpy.zeros(self.cutout.shape, dtype=numpy.int16)
+            cutout_codecs.decode_blosc_into(content, out)
+            numpy.testing.assert_array_equal(out, self.cutout)
+
+        sizes = blosc.get_cbuffer_sizes
+        del blosc.get_cbuffer_sizes
+        try:
+            out = numpy.zeros_like(self.cutout)
+            cutout_codecs.decode_blosc_into(blosc_cutout(self.cutout), out)
+        finally:
+            blosc.get_cbuffer_sizes = sizes
+        numpy.testing.assert_array_equal(out, self.cutout)
+
+
+class TestHDF5(unittest.TestCase):
+
+    def setUp(self):
+        self.cutout = numpy.random.RandomState(0).randint(
+            0, 255, size=(16, 32, 48)).astype(numpy.uint8)
+        self.content = hdf5_cutout('image', self.cutout)
+
+    def test_decode(self):
+        cutout = cutout_codecs.decode_hdf5(self.content, 'image')
+        self.assertEqual(cutout.dtype, self.cutout.dtype)
+        numpy.testing.assert_array_equal(cutout, self.cutout)
+
+    def test_decode_into(self):
+        # Straight into a contiguous array, into a view of a larger one, and
+        # into an array of another datatype.
+        out = numpy.zeros((16, 32, 48), dtype=numpy.uint8)
+        self.assertIs(cutout_codecs.decode_hdf5_into(self.content, 'image',
+                                                     out), out)
+        numpy.testing.assert_array_equal(out, self.cutout)
+
+        volume = numpy.zeros((20, 40, 60), dtype=numpy.uint8)
+        cutout_codecs.decode_hdf5_into(self.content, 'image',
+                                       volume[2:18, 4:36, 6:54])
+        numpy.testing.assert_array_equal(volume[2:18, 4:36, 6:54],
+                                         self.cutout)
+        self.assertEqual(volume.sum(), self.cutout.sum(dtype=numpy.int64))
+
+        out = numpy.zeros((16, 32, 48), dtype=numpy.uint16)
+        cutout_codecs.decode_hdf5_into(self.content, 'image', out)
+        numpy.testing.assert_array_equal(out, self.cutout)
+
+        # A single timepoint of a timeseries fills a zyx array.
+        content = hdf5_cutout('movie', self.cutout[numpy.newaxis])
+        out = numpy.zeros((16, 32, 48), dtype=numpy.uint8)
+        cutout_codecs.decode_hdf5_into(content, 'movie', out)
+        numpy.testing.assert_array_equal(out, self.cutout)
+
+
+class TestUnsupported(unittest.TestCase):
+
+    def error(self, status_code):
+        e = IOError("Bad server response")
+        e.status_code = status_code
+        return e
+
+    def test_unsupported(self):
+        self.assertTrue(cutout_codecs.unsupported(
+            cutout_codecs.DecodeError("Unknown blosc format")))
+        for status_code in [406, 415, 501]:
+            self.assertTrue(cutout_codecs.unsupported(
+                self.error(status_code)))
+        for status_code in [400, 403, 404, 500, 503]:
+            self.assertFalse(cutout_codecs.unsupported(
+                self.error(status_code)))
+        self.assertFalse(cutout_codecs.unsupported(ValueError("Bad bounds")))
+
+
+if __name__ == '__main__':
+    unittest.main()
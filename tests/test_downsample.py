@@ -0,0 +1,64 @@
+import unittest
+import numpy
+from ndio.utils.downsample import bin_edges, downsample, fit_shape
+
+
+def brute_force(array, shape, reduce):
+    """
+    Shrink an array the slow, obvious way: reduce every bin on its own.
+    """
+    edges = [bin_edges(n, m) for n, m in zip(array.shape, shape)]
+    out = numpy.zeros(shape, dtype=array.dtype)
+    for index in numpy.ndindex(*shape):
+        out[index] = reduce(array[tuple(slice(e[i], e[i + 1])
+                                        for e, i in zip(edges, index))])
+    return out
+
+
+def mode(values):
+    values, counts = numpy.unique(values, return_counts=True)
+    return values[numpy.argmax(counts)]
+
+
+class TestDownsample(unittest.TestCase):
+
+    def test_mean(self):
+        rng = numpy.random.RandomState(0)
+        array = rng.randint(0, 255, size=(37, 20, 9)).astype(numpy.uint8)
+        for shape in [(37, 20, 9), (10, 7, 3), (1, 1, 1), (36, 20, 2)]:
+            expected = brute_force(
+                array, shape,
+                lambda b: numpy.rint(b.astype(numpy.float64).mean()))
+            numpy.testing.assert_array_equal(
+                downsample(array, shape, 'mean'), expected)
+
+    def test_mode(self):
+        rng = numpy.random.RandomState(1)
+        # Blocks of labels, as in an annotation channel.
+        array = rng.randint(0, 4, size=(8, 6, 4)).astype(numpy.uint32)
+        array = array.repeat(4, 0).repeat(4, 1).repeat(2, 2)
+        downsampled = downsample(array, (8, 6, 4), 'mode')
+        numpy.testing.assert_array_equal(downsampled, array[::4, ::4, ::2])
+        self.assertEqual(downsampled.dtype, array.dtype)
+
+        # Bins of one size are sampled whole.
+        array = rng.randint(0, 3, size=(12, 9, 4)).astype(numpy.uint16)
+        numpy.testing.assert_array_equal(downsample(array, (4, 3, 2), 'mode'),
+                                         brute_force(array, (4, 3, 2), mode))
+
+    def test_bad_shape(self):
+        array = numpy.zeros((4, 4, 4))
+        self.assertRaises(ValueError, downsample, array, (8, 4, 4))
+        self.assertRaises(ValueError, downsample, array, (2, 2))
+        self.assertRaises(ValueError, downsample, array, (2, 2, 2), 'max')
+
+    def test_fit_shape(self):
+        self.assertEqual(fit_shape((100, 50, 10), 10 ** 6), [100, 50, 10])
+        shape = fit_shape((1000, 800, 40), 10 ** 5)
+        self.assertLessEqual(numpy.prod(shape), 10 ** 5)
+        self.assertGreater(numpy.prod(shape), 10 ** 5 / 2)
+        self.assertEqual(fit_shape((1000, 1, 1), 10), [10, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,714 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+import numpy
+import six
+from ndio.remote import AdaptiveTuner, RemoteVolume, Tracer
+from ndio.remote import cutout_codecs
+from ndio.remote.cache import BlockCache
+from ndio.remote.errors import RemoteDataUploadError
+from ndio.remote.metadata import InfoCache
+from ndio.remote.neurodata import neurodata
+from ndio.testing import FakeNDStore
+from ndio.utils.downsample import downsample
+
+
+class TestFakeNDStore(unittest.TestCase):
+    """
+    Round trips through a local stand-in server, so they run without a
+    network connection or an account.
+    """
+
+    def setUp(self):
+        self.volume = numpy.random.RandomState(0).randint(
+            0, 255, size=(200, 150, 40)).astype(numpy.uint8)
+        self.server = FakeNDStore(error_rate=0.2, seed=0).start()
+        self.server.add_channel('test_token', 'image', self.volume,
+                                offset=(0, 0, 1))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def remote(self, **kwargs):
+        return neurodata(hostname=self.server.hostname, protocol='http',
+                         backoff=0.001, retries=10, **kwargs)
+
+    def test_get_cutout(self):
+        for codec in ['blosc', 'hdf5']:
+            nd = self.remote(codec=codec, chunk_threshold=1000)
+            cutout = nd.get_cutout('test_token', 'image',
+                                   10, 190, 20, 150, 1, 41,
+                                   resolution=0, block_size=(64, 64, 16))
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[10:190, 20:150])
+
+    def test_concurrent_download(self):
+        self.server.latency = 0.02
+        for workers in [1, 4]:
+            tracer = Tracer()
+            nd = self.remote(codec='blosc', chunk_threshold=1000,
+                             max_workers=workers, tracer=tracer)
+            cutout = nd.get_cutout('test_token', 'image',
+                                   10, 190, 20, 150, 1, 41,
+                                   resolution=0, block_size=(64, 64, 16))
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[10:190, 20:150])
+
+            downloads = [e for e in tracer.events if e['kind'] == 'download']
+            self.assertEqual(len(downloads), 3 * 3 * 3)
+            edges = sorted([(e['start'], 1) for e in downloads] +
+                           [(e['start'] + e['duration'], -1)
+                            for e in downloads])
+            in_flight, most = 0, 0
+            for _, step in edges:
+                in_flight += step
+                most = max(most, in_flight)
+            self.assertLessEqual(most, workers)
+            if workers > 1:
+                self.assertGreater(most, 1)
+
+    def test_post_cutout(self):
+        nd = self.remote(chunk_threshold=1000)
+        original = self.volume.copy()
+        data = numpy.ones((100, 100, 20), dtype=numpy.uint8)
+        self.assertTrue(nd.post_cutout('test_token', 'image', 64, 0, 1,
+                                       data, resolution=0,
+                                       block_size=(64, 64, 16)))
+        stored = self.server.volume('test_token', 'image')
+        self.assertTrue((stored[64:164, :100, :20] == 1).all())
+        self.assertTrue((stored[:64] == original[:64]).all())
+        self.assertTrue((stored[:, 100:] == original[:, 100:]).all())
+
+    def test_pipelined_upload(self):
+        self.server.latency = 0.01
+        tracer = Tracer()
+        nd = self.remote(chunk_threshold=1000, max_workers=2, tracer=tracer)
+        nd.data.get_proj_info('test_token')
+        data = numpy.random.RandomState(1).randint(
+            0, 255, size=(200, 150, 40)).astype(numpy.uint8)
+        nd.post_cutout('test_token', 'image', 0, 0, 1, data, resolution=0,
+                       block_size=(64, 64, 16))
+        numpy.testing.assert_array_equal(
+            self.server.volume('test_token', 'image'), data)
+
+        # Blocks are compressed while others are being posted, and no more
+        # than twice max_workers are held at once.
+        encodes = [e for e in tracer.events if e['kind'] == 'encode']
+        posts = [e for e in tracer.events if e['kind'] == 'http' and
+                 e['method'] == 'POST' and e['status'] == 200]
+        self.assertEqual((len(encodes), len(posts)), (36, 36))
+        self.assertTrue(any(
+            p['start'] < e['start'] < p['start'] + p['duration']
+            for e in encodes for p in posts))
+        edges = sorted([(e['start'], 1) for e in encodes] +
+                       [(p['start'] + p['duration'], -1) for p in posts])
+        held, most = 0, 0
+        for _, step in edges:
+            held += step
+            most = max(most, held)
+        self.assertLessEqual(most, 4)
+
+        # The first failure stops the upload, without queueing the rest.
+        nd = neurodata(hostname=self.server.hostname, protocol='http',
+                       retries=0, max_workers=2)
+        self.server.error_rate = 1
+        self.server.reset_stats()
+        self.assertRaises(RemoteDataUploadError, nd.post_cutout,
+                          'test_token', 'image', 0, 0, 1, data,
+                          resolution=0, block_size=(64, 64, 16))
+        self.assertLess(self.server.stats['requests'], 36)
+
+    def test_timeseries(self):
+        movie = numpy.random.RandomState(1).randint(
+            0, 255, size=(100, 80, 16, 6)).astype(numpy.uint8)
+        self.server.add_channel('test_token', 'movie', movie)
+        nd = self.remote(chunk_threshold=1000)
+
+        cutout = nd.get_cutout('test_token', 'movie', 0, 100, 0, 80, 0, 16,
+                               1, 6, resolution=0,
+                               block_size=(64, 64, 16, 2))
+        numpy.testing.assert_array_equal(cutout, movie[..., 1:6])
+
+        frames = list(nd.iter_timepoints('test_token', 'movie',
+                                         0, 64, 0, 64, 0, 16, 0, 6,
+                                         t_batch=4, resolution=0))
+        self.assertEqual([(t0, t1) for t0, t1, _ in frames],
+                         [(0, 4), (4, 6)])
+        for t0, t1, frame in frames:
+            numpy.testing.assert_array_equal(frame,
+                                             movie[:64, :64, :, t0:t1])
+
+        data = numpy.zeros((100, 80, 16, 2), dtype=numpy.uint8)
+        nd.post_cutout('test_token', 'movie', 0, 0, 0, data,
+                       resolution=0, t_start=2)
+        self.assertTrue((movie[..., 2:4] == 0).all())
+
+    def test_single_timepoint(self):
+        movie = numpy.random.RandomState(1).randint(
+            0, 255, size=(100, 80, 16, 4)).astype(numpy.uint8)
+        self.server.add_channel('test_token', 'movie', movie)
+        nd = self.remote(chunk_threshold=1000)
+
+        cutout = nd.get_cutout('test_token', 'movie', 0, 100, 0, 80, 0, 16,
+                               2, 3, resolution=0, block_size=(64, 64, 16))
+        numpy.testing.assert_array_equal(cutout, movie[..., 2])
+
+        frames = list(nd.iter_timepoints('test_token', 'movie',
+                                         0, 100, 0, 80, 0, 16, 0, 4,
+                                         resolution=0,
+                                         block_size=(64, 64, 16)))
+        self.assertEqual([(t0, t1) for t0, t1, _ in frames],
+                         [(0, 1), (1, 2), (2, 3), (3, 4)])
+        for t0, t1, frame in frames:
+            numpy.testing.assert_array_equal(frame, movie[..., t0:t1])
+
+        # An HDF5 file is filled block by block, from the first timepoint.
+        path = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(path, 'movie.h5')
+            nd.download_to_file('test_token', 'movie', 0, 100, 0, 80, 0, 16,
+                                filename, resolution=0,
+                                block_size=(64, 64, 16))
+            with h5py.File(filename, 'r') as f:
+                numpy.testing.assert_array_equal(f['CUTOUT'][()],
+                                                 movie[..., 0])
+        finally:
+            shutil.rmtree(path)
+
+    def test_get_cutouts(self):
+        labels = (self.volume // 64).astype(numpy.uint8)
+        mask = (self.volume > 128).astype(numpy.uint32)
+        self.server.add_channel('test_token', 'labels', labels,
+                                offset=(0, 0, 1))
+        self.server.add_channel('test_token', 'mask', mask,
+                                offset=(0, 0, 1))
+        nd = self.remote(chunk_threshold=1000)
+
+        cutouts = nd.get_cutouts('test_token', ['image', 'labels', 'mask'],
+                                 10, 190, 20, 150, 1, 41, resolution=0,
+                                 block_size=(64, 64, 16))
+        for channel, expected in [('image', self.volume),
+                                  ('labels', labels), ('mask', mask)]:
+            self.assertEqual(cutouts[channel].dtype, expected.dtype)
+            numpy.testing.assert_array_equal(cutouts[channel],
+                                             expected[10:190, 20:150])
+
+        stacked = nd.get_cutouts('test_token', ['image', 'labels'],
+                                 0, 50, 0, 50, 1, 10, resolution=0,
+                                 stack=True)
+        self.assertEqual(stacked.shape, (50, 50, 9, 2))
+        numpy.testing.assert_array_equal(stacked[..., 1],
+                                         labels[:50, :50, :9])
+        with self.assertRaises(ValueError):
+            nd.get_cutouts('test_token', ['image', 'mask'],
+                           0, 50, 0, 50, 1, 10, resolution=0, stack=True)
+
+    def test_slice_prefetch(self):
+        nd = self.remote(slice_prefetch=10 ** 7)
+        for z in list(range(1, 41)) + list(range(40, 0, -1)):
+            numpy.testing.assert_array_equal(
+                nd.get_xy_slice('test_token', 'image', 0, 200, 0, 150, z,
+                                resolution=0),
+                self.volume[:, :, z - 1])
+        stats = nd.data._slice_reader.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 79)
+
+    def test_sparse(self):
+        labels = numpy.zeros((200, 150, 40), dtype=numpy.uint32)
+        labels[70:80, 10:20, 20:24] = 7
+        self.server.add_channel('test_token', 'labels', labels,
+                                offset=(0, 0, 1))
+        nd = self.remote()
+
+        sparse = nd.get_sparse_cutout('test_token', 'labels',
+                                      0, 200, 0, 150, 1, 41, resolution=0)
+        self.assertEqual(sparse.occupancy.shape, (4, 3, 3))
+        self.assertEqual(list(zip(*numpy.nonzero(sparse.occupancy))),
+                         [(1, 0, 1)])
+        numpy.testing.assert_array_equal(sparse.todense(), labels)
+        coords, values = sparse.to_coo()
+        self.assertEqual(len(values), 400)
+        self.assertTrue((values == 7).all())
+        self.assertEqual(coords.min(axis=0).tolist(), [70, 10, 21])
+
+        self.server.reset_stats()
+        update = numpy.zeros((200, 150, 32), dtype=numpy.uint32)
+        update[0:5, 0:5, 0:5] = 3
+        nd.post_cutout('test_token', 'labels', 0, 0, 1, update,
+                       resolution=0, block_size=None, skip_empty=True)
+        self.assertEqual(self.server.stats['requests'] -
+                         self.server.stats['errors'], 1)
+        self.assertTrue((labels[:5, :5, :5] == 3).all())
+        self.assertTrue((labels[70:80, 10:20, 20:24] == 7).all())
+
+    def test_tracing(self):
+        tracer = Tracer()
+        nd = self.remote(codec='blosc', chunk_threshold=1000, tracer=tracer)
+        nd.data.get_proj_info('test_token')
+        self.server.reset_stats()
+        tracer.reset()
+        events = []
+        tracer.add_callback(events.append)
+        cutout = nd.get_cutout('test_token', 'image', 0, 200, 0, 150, 1, 41,
+                               resolution=0, block_size=(64, 64, 16))
+        numpy.testing.assert_array_equal(cutout, self.volume)
+
+        counters = tracer.counters()
+        self.assertEqual(counters['download']['count'], 4 * 3 * 3)
+        self.assertEqual(counters['decode']['count'], 4 * 3 * 3)
+        self.assertEqual(counters['http']['count'],
+                         self.server.stats['requests'])
+        self.assertEqual(counters['download']['retries'],
+                         self.server.stats['errors'])
+        self.assertEqual(counters['decode']['bytes_received'],
+                         counters['download']['bytes_received'])
+        self.assertEqual(tracer.histogram('http').count,
+                         counters['http']['count'])
+        self.assertEqual(len(events), len(tracer.events))
+        self.assertEqual(
+            set(e['template'] for e in events if e['kind'] == 'download'),
+            set([nd.data.url() + 'test_token/image/blosc/{n}/{range}/'
+                 '{range}/{range}/{range}/']))
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            tracer.dump_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)['traceEvents']
+        finally:
+            os.remove(path)
+        self.assertEqual(len(trace), len(events))
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0
+                            for e in trace))
+
+    def test_adaptive(self):
+        tuner = AdaptiveTuner(max_workers=4, window=2, max_voxels=64 ** 3)
+        nd = self.remote(chunk_threshold=1000, adaptive=tuner)
+        for i in range(3):
+            cutout = nd.get_cutout('test_token', 'image',
+                                   10, 190, 20, 150, 1, 41,
+                                   resolution=0, block_size=None)
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[10:190, 20:150])
+        state = tuner.state()
+        self.assertGreater(state['requests'], 0)
+        self.assertEqual(state['in_flight'], 0)
+        self.assertLessEqual(numpy.prod(state['scale']) * 64 * 64 * 16,
+                             64 ** 3)
+
+        data = numpy.ones((100, 100, 20), dtype=numpy.uint8)
+        nd.post_cutout('test_token', 'image', 64, 0, 1, data, resolution=0,
+                       block_size=None)
+        stored = self.server.volume('test_token', 'image')
+        self.assertTrue((stored[64:164, :100, :20] == 1).all())
+        self.assertEqual(tuner.state()['in_flight'], 0)
+
+    def test_coalesce(self):
+        nd = self.remote(codec='blosc', coalesce=0.05)
+        nd.data.get_proj_info('test_token')
+        self.server.reset_stats()
+
+        def tile(i):
+            x, y = 64 * (i % 2), 64 * (i // 2 % 2)
+            return nd.get_cutout('test_token', 'image', x, x + 64, y, y + 64,
+                                 1, 17, resolution=0)
+
+        with ThreadPoolExecutor(8) as executor:
+            tiles = list(executor.map(tile, range(8)))
+        for i, cutout in enumerate(tiles):
+            x, y = 64 * (i % 2), 64 * (i // 2 % 2)
+            numpy.testing.assert_array_equal(
+                cutout, self.volume[x:x + 64, y:y + 64, :16])
+        stats = nd.data._inflight.stats
+        self.assertEqual(stats['shared'] + stats['requests'], 8)
+        self.assertLess(self.server.stats['requests'] -
+                        self.server.stats['errors'], 8)
+
+    def test_iter_cutout_blocks(self):
+        nd = self.remote()
+        bbox = ((10, 190), (20, 150), (1, 41))
+        for order in ['zyx', 'xyz', 'arrival']:
+            blocks = list(nd.iter_cutout_blocks(
+                'test_token', 'image', bbox, resolution=0,
+                block_shape=(64, 64, 16), order=order))
+            self.assertEqual(len(blocks), 27)
+            if order == 'zyx':
+                self.assertEqual([b[2] for b, _ in blocks[:9]],
+                                 [(1, 17)] * 9)
+            if order == 'xyz':
+                self.assertEqual([b[0] for b, _ in blocks[:9]],
+                                 [(10, 64)] * 9)
+            for b, block in blocks:
+                numpy.testing.assert_array_equal(
+                    block, self.volume[b[0][0]:b[0][1], b[1][0]:b[1][1],
+                                       b[2][0] - 1:b[2][1] - 1])
+
+        movie = numpy.random.RandomState(1).randint(
+            0, 255, size=(100, 80, 16, 3)).astype(numpy.uint8)
+        self.server.add_channel('test_token', 'movie', movie)
+        for b, block in nd.iter_cutout_blocks(
+                'test_token', 'movie', ((0, 100), (0, 80), (0, 16)),
+                resolution=0, block_shape=(64, 64, 16)):
+            numpy.testing.assert_array_equal(
+                block, movie[b[0][0]:b[0][1], b[1][0]:b[1][1],
+                             b[2][0]:b[2][1], 0])
+
+    def test_remote_volume(self):
+        nd = self.remote()
+        vol = RemoteVolume(nd, 'test_token', 'image', resolution=0,
+                           block_shape=(64, 64, 16))
+        self.assertEqual(vol.shape, (200, 150, 40))
+        self.assertEqual(vol.dtype, numpy.uint8)
+
+        # Indices start at the dataset's offset, which is z=1 here.
+        numpy.testing.assert_array_equal(vol[10:100, 5:50, 0],
+                                         self.volume[10:100, 5:50, 0])
+        numpy.testing.assert_array_equal(vol[::7, 100:, -3:],
+                                         self.volume[::7, 100:, -3:])
+        self.assertEqual(vol[199, 149, 39], self.volume[199, 149, 39])
+
+        # Blocks already downloaded are served from memory.
+        self.server.reset_stats()
+        numpy.testing.assert_array_equal(vol[20:60, 10:40, 3],
+                                         self.volume[20:60, 10:40, 3])
+        self.assertEqual(self.server.stats['requests'], 0)
+
+        self.assertRaises(IndexError, vol.__getitem__, (200, 0, 0))
+        self.assertRaises(IndexError, vol.__getitem__, (0, 0, 0, 0))
+        self.assertRaises(TypeError, vol.__getitem__, (0.5, 0, 0))
+
+    def test_download_to_file(self):
+        nd = self.remote()
+        path = tempfile.mkdtemp()
+        expected = self.volume[10:190, 20:150, 3:35]
+        try:
+            for name in ['cutout.npy', 'cutout.h5', 'cutout.raw']:
+                filename = os.path.join(path, name)
+                self.assertEqual(nd.download_to_file(
+                    'test_token', 'image', 10, 190, 20, 150, 4, 36,
+                    filename, resolution=0, block_size=(64, 64, 16)),
+                    filename)
+                if name.endswith('.npy'):
+                    stored = numpy.load(filename, mmap_mode='r')
+                elif name.endswith('.h5'):
+                    with h5py.File(filename, 'r') as f:
+                        stored = f['CUTOUT'][()]
+                else:
+                    stored = numpy.memmap(filename, mode='r',
+                                          dtype=numpy.uint8,
+                                          shape=expected.shape, order='F')
+                numpy.testing.assert_array_equal(stored, expected)
+                del stored
+        finally:
+            shutil.rmtree(path)
+
+    def test_resume(self):
+        # No retries, so the first injected failure stops each transfer.
+        nd = neurodata(hostname=self.server.hostname, protocol='http',
+                       retries=0, max_workers=1)
+        nd.data.get_proj_info('test_token')
+        path = tempfile.mkdtemp()
+        filename = os.path.join(path, 'cutout.npy')
+        manifest = os.path.join(path, 'manifest')
+
+        def done():
+            with open(manifest) as f:
+                # The first line describes the transfer.
+                return len(f.read().splitlines()) - 1
+
+        try:
+            self.assertRaises(IOError, nd.download_to_file,
+                              'test_token', 'image', 10, 190, 20, 150, 1, 41,
+                              filename, resolution=0,
+                              block_size=(64, 64, 16), manifest=manifest)
+            finished = done()
+            self.assertTrue(0 < finished < 27)
+
+            self.server.error_rate = 0
+            self.server.reset_stats()
+            nd.download_to_file('test_token', 'image',
+                                10, 190, 20, 150, 1, 41,
+                                filename, resolution=0,
+                                block_size=(64, 64, 16), manifest=manifest)
+            self.assertEqual(self.server.stats['requests'], 27 - finished)
+            self.assertFalse(os.path.exists(manifest))
+            numpy.testing.assert_array_equal(
+                numpy.load(filename), self.volume[10:190, 20:150])
+
+            data = numpy.ones((200, 150, 40), dtype=numpy.uint8)
+            self.server.error_rate = 0.2
+            self.assertRaises(RemoteDataUploadError, nd.post_cutout,
+                              'test_token', 'image', 0, 0, 1, data,
+                              resolution=0, block_size=(64, 64, 16),
+                              manifest=manifest)
+            finished = done()
+            self.assertTrue(0 < finished < 36)
+
+            self.server.error_rate = 0
+            self.server.reset_stats()
+            nd.post_cutout('test_token', 'image', 0, 0, 1, data,
+                           resolution=0, block_size=(64, 64, 16),
+                           manifest=manifest)
+            self.assertEqual(self.server.stats['requests'], 36 - finished)
+            self.assertFalse(os.path.exists(manifest))
+            self.assertTrue(
+                (self.server.volume('test_token', 'image') == 1).all())
+        finally:
+            shutil.rmtree(path)
+
+    def test_negotiated_codec(self):
+        nd = self.remote()
+        nd.data.get_proj_info('test_token')
+        self.server.reset_stats()
+        # A missing channel fails as blosc, without trying HDF5 as well.
+        self.assertRaises(IOError, nd.get_cutout, 'test_token', 'missing',
+                          0, 64, 0, 64, 1, 17, resolution=0)
+        self.assertEqual(self.server.stats['requests'], 1)
+        self.assertIsNone(nd.data._codec)
+
+        # A blosc cutout that can't be decoded falls back to HDF5.
+        decode = cutout_codecs.DECODERS[cutout_codecs.BLOSC]
+
+        def broken(content, channel=None):
+            raise ValueError("Unknown blosc format")
+
+        cutout_codecs.DECODERS[cutout_codecs.BLOSC] = broken
+        try:
+            cutout = nd.get_cutout('test_token', 'image',
+                                   0, 64, 0, 64, 1, 17, resolution=0)
+        finally:
+            cutout_codecs.DECODERS[cutout_codecs.BLOSC] = decode
+        numpy.testing.assert_array_equal(cutout, self.volume[:64, :64, :16])
+        self.assertEqual(nd.data._codec, cutout_codecs.HDF5)
+
+    def test_block_cache(self):
+        path = tempfile.mkdtemp()
+        try:
+            nd = self.remote(block_cache=BlockCache(path),
+                             chunk_threshold=1000)
+            cache = nd.data._block_cache
+            cutout = nd.get_cutout('test_token', 'image',
+                                   0, 128, 0, 128, 1, 17, resolution=0)
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[:128, :128, :16])
+            self.assertEqual(cache.stats()['misses'], 4)
+            nd.get_cutout('test_token', 'image',
+                          0, 128, 0, 128, 1, 17, resolution=0)
+            self.assertEqual(cache.stats()['hits'], 4)
+
+            data = numpy.ones((10, 10, 4), dtype=numpy.uint8)
+            nd.post_cutout('test_token', 'image', 70, 5, 3, data,
+                           resolution=0)
+            cutout = nd.get_cutout('test_token', 'image',
+                                   0, 128, 0, 128, 1, 17, resolution=0)
+            self.assertTrue((cutout[70:80, 5:15, 2:6] == 1).all())
+            numpy.testing.assert_array_equal(
+                cutout, self.server.volume('test_token', 'image')
+                [:128, :128, :16])
+            # Only the cube that was uploaded to is downloaded again.
+            self.assertEqual(cache.stats()['hits'], 7)
+        finally:
+            shutil.rmtree(path)
+
+    def test_slice_reader_threads(self):
+        # Room for about one slab, so slabs are pushed out while other
+        # threads are still waiting for them.
+        nd = self.remote(slice_prefetch=200 * 150 * 16 + 1)
+        z_indices = numpy.random.RandomState(3).randint(1, 41, size=64)
+
+        def read(z):
+            return nd.get_xy_slice('test_token', 'image',
+                                   0, 200, 0, 150, z, resolution=0)
+
+        with ThreadPoolExecutor(8) as executor:
+            slices = list(executor.map(read, z_indices))
+        for z, image in zip(z_indices, slices):
+            numpy.testing.assert_array_equal(image, self.volume[:, :, z - 1])
+
+    def test_xy_slices(self):
+        nd = self.remote()
+        nd.data.get_proj_info('test_token')
+        self.server.reset_stats()
+        z_indices = [40, 3, 17, 3, 20, 1]
+        slices = nd.get_xy_slices('test_token', 'image',
+                                  ((10, 190), (20, 150)), z_indices,
+                                  block_size=(256, 256, 16))
+        numpy.testing.assert_array_equal(
+            slices, self.volume[10:190, 20:150, [z - 1 for z in z_indices]])
+        # One request for each of the three slabs of 16 the slices are in.
+        self.assertEqual(self.server.stats['requests'] -
+                         self.server.stats['errors'], 3)
+
+        slices = nd.get_xy_slices('test_token', 'image',
+                                  ((10, 190), (20, 150)), [2, 39],
+                                  block_size=(64, 64, 16))
+        numpy.testing.assert_array_equal(slices,
+                                         self.volume[10:190, 20:150, [1, 38]])
+
+        # By default, slabs are downloaded a cube at a time.
+        self.server.reset_stats()
+        slices = nd.get_xy_slices('test_token', 'image',
+                                  ((10, 190), (20, 150)), [5])
+        numpy.testing.assert_array_equal(slices,
+                                         self.volume[10:190, 20:150, [4]])
+        self.assertEqual(self.server.stats['requests'] -
+                         self.server.stats['errors'], 3 * 3)
+
+    def test_overview(self):
+        half = numpy.random.RandomState(2).randint(
+            0, 255, size=(100, 75, 40)).astype(numpy.uint8)
+        self.server.add_channel('test_token', 'image', half, resolution=1,
+                                offset=(0, 0, 1))
+        nd = self.remote(chunk_threshold=1000)
+
+        self.assertEqual(nd.pick_resolution('test_token', (50, 40, 20)),
+                         (1, ((0, 100), (0, 75), (1, 41))))
+        self.assertEqual(nd.pick_resolution('test_token', (150, 40, 20))[0],
+                         0)
+        self.assertEqual(nd.pick_resolution(
+            'test_token', (20, 20, 10), bbox=((50, 100), (0, 60), (1, 21))),
+            (1, ((25, 50), (0, 30), (1, 21))))
+        self.assertRaises(ValueError, nd.pick_resolution,
+                          'test_token', (300, 40, 20))
+
+        overview = nd.get_overview('test_token', 'image', shape=(50, 40, 20))
+        numpy.testing.assert_array_equal(
+            overview, downsample(half, (50, 40, 20), 'mean'))
+        overview = nd.get_overview('test_token', 'image', max_bytes=10000)
+        self.assertLessEqual(overview.size, 10000)
+
+    @unittest.skipUnless(six.PY3, "asyncio needs Python 3")
+    def test_async(self):
+        import asyncio
+        from ndio.remote import async_neurodata
+        nd = async_neurodata(hostname=self.server.hostname, protocol='http',
+                             backoff=0.001, retries=10, transport='threads',
+                             chunk_threshold=1000)
+        loop = asyncio.new_event_loop()
+        try:
+            info = loop.run_until_complete(nd.get_proj_info('test_token'))
+            self.assertEqual(info['dataset']['imagesize']['0'],
+                             [200, 150, 40])
+            cutout = loop.run_until_complete(nd.get_cutout(
+                'test_token', 'image', 10, 190, 20, 150, 1, 41,
+                resolution=0, block_size=(64, 64, 16)))
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[10:190, 20:150])
+
+            data = numpy.ones((100, 100, 20), dtype=numpy.uint8)
+            self.assertTrue(loop.run_until_complete(nd.post_cutout(
+                'test_token', 'image', 64, 0, 1, data, resolution=0,
+                block_size=(64, 64, 16))))
+            stored = self.server.volume('test_token', 'image')
+            self.assertTrue((stored[64:164, :100, :20] == 1).all())
+        finally:
+            loop.run_until_complete(nd.close())
+            loop.close()
+
+    def test_async_blocks(self):
+        import asyncio
+        from ndio.remote import async_neurodata
+        path = tempfile.mkdtemp()
+        tracer = Tracer()
+        cache = BlockCache(path)
+        nd = async_neurodata(hostname=self.server.hostname, protocol='http',
+                             backoff=0.001, retries=10, transport='threads',
+                             chunk_threshold=1000, max_requests=4,
+                             tracer=tracer, block_cache=cache)
+        sync = self.remote(block_cache=cache)
+        loop = asyncio.new_event_loop()
+        try:
+            # A request that fails for its own sake isn't retried as HDF5.
+            with self.assertRaises(IOError):
+                loop.run_until_complete(nd.get_cutout(
+                    'test_token', 'image', 200, 264, 0, 64, 1, 17,
+                    resolution=0, block_size=(64, 64, 16)))
+            self.assertIsNone(nd.data._codec)
+            self.assertFalse(any('/hdf5/' in e['url'] for e in tracer.events
+                                 if e['kind'] == 'http'))
+
+            # A blosc cutout that can't be decoded is.
+            decode = cutout_codecs.DECODERS_INTO[cutout_codecs.BLOSC]
+
+            def broken(content, channel, out):
+                raise ValueError("Unknown blosc format")
+
+            cutout_codecs.DECODERS_INTO[cutout_codecs.BLOSC] = broken
+            try:
+                cutout = loop.run_until_complete(nd.get_cutout(
+                    'test_token', 'image', 0, 64, 0, 64, 1, 17,
+                    resolution=0, block_size=(64, 64, 16)))
+            finally:
+                cutout_codecs.DECODERS_INTO[cutout_codecs.BLOSC] = decode
+            numpy.testing.assert_array_equal(cutout,
+                                             self.volume[:64, :64, :16])
+            self.assertEqual(nd.data._codec, cutout_codecs.HDF5)
+
+            # Uploads drop what they overwrite from the block cache, and
+            # never have more than max_requests blocks in flight.
+            sync.get_cutout('test_token', 'image', 0, 64, 0, 64, 1, 17,
+                            resolution=0, block_size=(64, 64, 16))
+            tracer.reset()
+            data = numpy.ones((200, 150, 40), dtype=numpy.uint8)
+            loop.run_until_complete(nd.post_cutout(
+                'test_token', 'image', 0, 0, 1, data, resolution=0,
+                block_size=(64, 64, 16)))
+            cutout = sync.get_cutout('test_token', 'image',
+                                     0, 64, 0, 64, 1, 17, resolution=0,
+                                     block_size=(64, 64, 16))
+            self.assertTrue((cutout == 1).all())
+
+            posts = [e for e in tracer.events
+                     if e['kind'] == 'http' and e['method'] == 'POST']
+            self.assertGreaterEqual(len(posts), 36)
+            edges = sorted([(e['start'], 1) for e in posts] +
+                           [(e['start'] + e['duration'], -1) for e in posts])
+            in_flight, most = 0, 0
+            for _, step in edges:
+                in_flight += step
+                most = max(most, in_flight)
+            self.assertLessEqual(most, 4)
+        finally:
+            loop.run_until_complete(nd.close())
+            loop.close()
+            shutil.rmtree(path)
+
+    def test_project_info(self):
+        nd = self.remote()
+        self.assertEqual(nd.data.get_public_tokens(), ['test_token'])
+        self.assertEqual(nd.data.get_image_size('test_token', 0),
+                         [200, 150, 40])
+        self.assertEqual(nd.get_image_offset('test_token', 0), [0, 0, 1])
+
+        for i in range(10):
+            self.server.add_channel('token{}'.format(i), 'image',
+                                    self.volume[:10, :10, :10])
+        datasets = nd.data.get_public_datasets_and_tokens(max_workers=4)
+        self.assertEqual(len(datasets), 11)
+        self.assertEqual(datasets['token3'], ['token3'])
+        self.assertEqual(sorted(nd.data.iter_public_datasets_and_tokens())[0],
+                         ('test_token', 'test_token'))
+
+    def test_info_cache(self):
+        cache = InfoCache()
+        nd = self.remote(info_cache=cache)
+        self.assertIs(nd.resources._info_cache(), cache)
+        nd.data.get_proj_info('test_token')
+        self.server.reset_stats()
+        nd.data.get_proj_info('test_token')
+        self.assertEqual(self.server.stats['requests'], 0)
+
+        # Changing a token through resources drops its cached info.
+        nd.resources.invalidate_proj_info('test_token')
+        nd.data.get_proj_info('test_token')
+        self.assertEqual(self.server.stats['requests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
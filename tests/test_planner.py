@@ -0,0 +1,103 @@
+import random
+import time
+import unittest
+import numpy
+from ndio.utils.parallel import block_compute
+from ndio.utils import planner
+
+
+def brute_force_blocks(start, stop, origin, block_size):
+    """
+    Plan blocks the slow, obvious way: walk every coordinate along each
+    axis, and start a new block whenever the grid cell changes.
+    """
+    axes = []
+    for a, b, o, s in zip(start, stop, origin, block_size):
+        pieces = []
+        for c in range(a, b):
+            if pieces and (c - o) // s == (pieces[-1][0] - o) // s:
+                pieces[-1][1] = c + 1
+            else:
+                pieces.append([c, c + 1])
+        axes.append([tuple(p) for p in pieces])
+
+    blocks = [()]
+    for pieces in axes:
+        blocks = [b + (p,) for b in blocks for p in pieces]
+    return blocks if all(axes) else []
+
+
+def random_box(rng, n_axes):
+    origin = [rng.randint(-20, 20) for _ in range(n_axes)]
+    block_size = [rng.randint(1, 12) for _ in range(n_axes)]
+    start = [rng.randint(-30, 30) for _ in range(n_axes)]
+    stop = [s + rng.randint(-2, 40) for s in start]
+    return start, stop, origin, block_size
+
+
+class TestPlanner(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            n_axes = rng.choice([3, 4])
+            start, stop, origin, block_size = random_box(rng, n_axes)
+            expected = brute_force_blocks(start, stop, origin, block_size)
+
+            blocks = list(planner.iter_blocks(start, stop,
+                                              origin, block_size))
+            self.assertEqual([b.bounds for b in blocks], expected)
+            self.assertEqual(planner.count_blocks(start, stop, origin,
+                                                  block_size), len(expected))
+            array = planner.block_array(start, stop, origin, block_size)
+            self.assertEqual(array.shape, (len(expected), n_axes, 2))
+            self.assertEqual([tuple(tuple(ab) for ab in b)
+                              for b in array.tolist()], expected)
+
+    def test_slices_tile_the_box(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            n_axes = rng.choice([3, 4])
+            start, stop, origin, block_size = random_box(rng, n_axes)
+            shape = [max(b - a, 0) for a, b in zip(start, stop)]
+            hits = numpy.zeros(shape, dtype=int)
+            for block in planner.iter_blocks(start, stop,
+                                             origin, block_size):
+                hits[block.slices] += 1
+                for (lo, hi), s, a in zip(block.bounds, block.slices, start):
+                    self.assertEqual((s.start, s.stop), (lo - a, hi - a))
+            self.assertTrue((hits == 1).all())
+
+    def test_blocks_stay_in_one_cell(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            start, stop, origin, block_size = random_box(rng, 4)
+            for block in planner.iter_blocks(start, stop,
+                                             origin, block_size):
+                for (lo, hi), o, s in zip(block.bounds, origin, block_size):
+                    self.assertEqual((lo - o) // s, (hi - 1 - o) // s)
+
+    def test_block_compute(self):
+        # y used to be planned only up to x_stop
+        blocks = block_compute(0, 10, 0, 1000, 1, 17,
+                               origin=(0, 0, 1), block_size=(256, 256, 16))
+        self.assertEqual(blocks, [((0, 10), (0, 256), (1, 17)),
+                                  ((0, 10), (256, 512), (1, 17)),
+                                  ((0, 10), (512, 768), (1, 17)),
+                                  ((0, 10), (768, 1000), (1, 17))])
+
+    def test_huge_box(self):
+        # About 250TB of uint8, in 512x512x16 blocks
+        start = time.time()
+        blocks = planner.iter_blocks((0, 0, 0), (2 ** 20, 2 ** 20, 2 ** 8),
+                                     (0, 0, 0), (512, 512, 16))
+        first = next(blocks)
+        count = planner.count_blocks((0, 0, 0), (2 ** 20, 2 ** 20, 2 ** 8),
+                                     (0, 0, 0), (512, 512, 16))
+        self.assertEqual(first.bounds, ((0, 512), (0, 512), (0, 16)))
+        self.assertEqual(count, 2048 * 2048 * 16)
+        self.assertLess(time.time() - start, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
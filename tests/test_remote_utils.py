@@ -0,0 +1,84 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from ndio.remote import Tracer
+from ndio.remote.remote_utils import remote_utils, session
+from ndio.testing import FakeNDStore
+
+
+class TestRemoteUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeNDStore().start()
+        self.server.add_channel('test_token', 'image',
+                                numpy.zeros((64, 64, 16), numpy.uint8))
+        self.url = 'http://{}/nd/sd/test_token/info/'.format(
+            self.server.hostname)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_session_per_thread(self):
+        s = session(pool_size=3)
+        self.assertIs(session(pool_size=3), s)
+
+        others = []
+        t = threading.Thread(target=lambda: others.append(session(3)))
+        t.start()
+        t.join()
+        self.assertIsNot(others[0], s)
+        # Every thread's session sends through the same connections.
+        self.assertIs(others[0].get_adapter(self.url),
+                      s.get_adapter(self.url))
+        self.assertIsNot(session(pool_size=4).get_adapter(self.url),
+                         s.get_adapter(self.url))
+
+    def test_connection_reuse(self):
+        utils = remote_utils('token', pool_size=5)
+        for i in range(5):
+            r = utils.get_url(self.url)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.request.headers['Connection'], 'keep-alive')
+        pools = utils.session().get_adapter(self.url).poolmanager.pools
+        port = int(self.server.hostname.split(':')[1])
+        self.assertEqual(sum(pools[k].num_connections for k in pools.keys()
+                             if k.key_port == port), 1)
+
+        utils = remote_utils('token', pool_size=5, keep_alive=False)
+        r = utils.get_url(self.url)
+        self.assertEqual(r.request.headers['Connection'], 'close')
+
+    def test_max_host_requests(self):
+        self.server.latency = 0.02
+        tracer = Tracer()
+        utils = remote_utils('token', max_host_requests=2, tracer=tracer)
+        with ThreadPoolExecutor(6) as executor:
+            codes = list(executor.map(lambda i: utils.get_url(self.url),
+                                      range(12)))
+        self.assertEqual([r.status_code for r in codes], [200] * 12)
+
+        events = tracer.events
+        self.assertEqual(len(events), 12)
+        self.assertTrue(any(e['wait'] > 0 for e in events))
+        edges = sorted([(e['start'] + e['wait'], 1) for e in events] +
+                       [(e['start'] + e['duration'], -1) for e in events])
+        in_flight, most = 0, 0
+        for _, step in edges:
+            in_flight += step
+            most = max(most, in_flight)
+        self.assertEqual(most, 2)
+
+    def test_tokens(self):
+        tracer = Tracer()
+        utils = remote_utils('token', tracer=tracer)
+        r = utils.post_url(self.url, token='other')
+        self.assertEqual(r.request.headers['Authorization'], 'Token other')
+        r = utils.delete_url(self.url)
+        self.assertEqual(r.request.headers['Authorization'], 'Token token')
+        self.assertEqual([e['method'] for e in tracer.events],
+                         ['POST', 'DELETE'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import random
+import unittest
+import requests
+from ndio.remote.retry import Retry, is_retryable, status_error
+
+
+class TestRetry(unittest.TestCase):
+
+    def failing(self, errors):
+        """
+        Make a function that raises each of `errors` in turn, then returns
+        the number of calls.
+        """
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return len(calls)
+        return func
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(requests.exceptions.ConnectionError()))
+        self.assertTrue(is_retryable(requests.exceptions.Timeout()))
+        self.assertTrue(is_retryable(status_error(IOError, "busy", 503)))
+        self.assertFalse(is_retryable(status_error(IOError, "missing", 404)))
+        self.assertFalse(is_retryable(ValueError("bad bounds")))
+        self.assertTrue(is_retryable(status_error(IOError, "missing", 404),
+                                     status_codes=[404]))
+
+    def test_call(self):
+        retries = []
+        retry = Retry(retries=2, backoff=0.001,
+                      on_retry=lambda e, attempt: retries.append(attempt))
+        busy = status_error(IOError, "busy", 503)
+        self.assertEqual(retry.call(self.failing([busy, busy])), 3)
+        self.assertEqual(retries, [0, 1])
+
+        # Out of retries, or not worth retrying: the error is raised.
+        self.assertRaises(IOError, retry.call,
+                          self.failing([busy, busy, busy]))
+        missing = status_error(IOError, "missing", 404)
+        self.assertRaises(IOError, retry.call, self.failing([missing]))
+        self.assertEqual(retries, [0, 1, 0, 1])
+        self.assertRaises(IOError, Retry(retries=0).call,
+                          self.failing([busy]))
+
+    def test_delay(self):
+        random.seed(0)
+        retry = Retry(backoff=0.5, max_backoff=4)
+        for attempt, bound in enumerate([0.5, 1, 2, 4, 4, 4]):
+            delays = [retry.delay(attempt) for i in range(100)]
+            self.assertTrue(all(0 <= d <= bound for d in delays))
+            # Full jitter: the waits are spread over the whole range.
+            self.assertGreater(max(delays), bound / 2)
+            self.assertLess(min(delays), bound / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()